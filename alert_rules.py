@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Tuple
+from metrics import metrics
+from models import Token
+
+# Rules used when no rules file exists: the original hardcoded threshold of more than 2000 followers and a Neynar score of at least 0.95
+DEFAULT_RULES = {
+    "rules": [
+        {"name": "notable-creator", "action": "alert", "conditions": {"creator_present": True, "min_followers": 2001, "min_neynar_score": 0.95}},
+    ]
+}
+
+ACTIONS = ("alert", "skip")
+
+# Condition costs: local ones only read the parsed card, remote ones need the creator's Neynar profile
+LOCAL = 0
+REMOTE = 1
+
+_RULE_NAME = re.compile(r"^[\w-]+$")
+
+
+def _creator_present(expected):
+    return lambda facts: bool(facts.get("username")) == bool(expected)
+
+
+def _creator_in(usernames, negate=False):
+    if isinstance(usernames, str):
+        usernames = [usernames]
+    usernames = {username.lower().lstrip("@") for username in usernames}
+    return lambda facts: ((facts.get("username") or "").lower() in usernames) != negate
+
+
+def _field_matches(pattern, fields, negate=False):
+    compiled = re.compile(pattern, re.IGNORECASE)
+    return lambda facts: any(compiled.search(facts.get(name) or "") for name in fields) != negate
+
+
+def _at_least(field_name, threshold):
+    threshold = float(threshold)
+    return lambda facts: (facts.get(field_name) or 0) >= threshold
+
+
+# Condition name -> (cost, factory turning the configured value into a predicate over a token's facts)
+CONDITIONS: Dict[str, Tuple[int, Callable]] = {
+    "creator_present": (LOCAL, _creator_present),
+    "creators": (LOCAL, _creator_in),
+    "exclude_creators": (LOCAL, lambda usernames: _creator_in(usernames, negate=True)),
+    "name_pattern": (LOCAL, lambda pattern: _field_matches(pattern, ("name",))),
+    "symbol_pattern": (LOCAL, lambda pattern: _field_matches(pattern, ("symbol",))),
+    "pattern": (LOCAL, lambda pattern: _field_matches(pattern, ("name", "symbol"))),
+    "exclude_pattern": (LOCAL, lambda pattern: _field_matches(pattern, ("name", "symbol"), negate=True)),
+    "min_followers": (REMOTE, lambda threshold: _at_least("follower_count", threshold)),
+    "min_neynar_score": (REMOTE, lambda threshold: _at_least("neynar_score", threshold)),
+}
+
+
+def username_from_link(link: str | None) -> str | None:
+    """The Warpcast username at the end of a creator link"""
+    return link.rstrip("/").split("/")[-1] if link else None
+
+
+def token_facts(token: Dict, creator_details: Dict | None = None) -> Dict:
+    """
+    The fields rules are evaluated against
+
+    Args:
+        token: Token dict with at least name and symbol
+        creator_details: username, follower_count and neynar_score (as from scraper.creator_details_from_token)
+    """
+    creator_details = creator_details or {}
+    return {
+        "name": token.get("name"),
+        "symbol": token.get("symbol"),
+        "username": creator_details.get("username"),
+        "follower_count": creator_details.get("follower_count"),
+        "neynar_score": creator_details.get("neynar_score"),
+    }
+
+
+@dataclass
+class AlertRule:
+    """One compiled rule: all of its conditions must hold, cheapest first"""
+
+    name: str
+    action: str
+    # (condition name, cost, predicate), sorted by cost
+    conditions: List[Tuple[str, int, Callable]]
+    stats: Dict = field(init=False)
+
+    def __post_init__(self):
+        self.stats = {"evaluated": 0, "matched": 0, "rejected": {name: 0 for name, _, _ in self.conditions}}
+
+    @property
+    def needs_profile(self) -> bool:
+        return any(cost > LOCAL for _, cost, _ in self.conditions)
+
+    def local_match(self, facts: Dict) -> bool:
+        """Whether every condition that doesn't need the creator's profile holds"""
+        return all(predicate(facts) for _, cost, predicate in self.conditions if cost == LOCAL)
+
+    def matches(self, facts: Dict) -> bool:
+        """Whether every condition holds, without touching the rule's counts"""
+        return all(predicate(facts) for _, _, predicate in self.conditions)
+
+
+@dataclass
+class AlertDecision:
+    alert: bool
+    # Name of the rule that decided, None when no rule matched
+    rule: str | None = None
+
+
+class AlertRuleEngine:
+    """
+    Decides which tokens are announced, from an ordered list of rules loaded from a JSON file.
+
+    The first rule whose conditions all hold decides: "alert" announces the token, "skip" drops it.
+    A token that no rule matches is not announced. Conditions are compiled once and evaluated
+    cheapest first, so a rule fails on a name pattern or a deny list before its follower and score
+    thresholds are checked. needs_lookup() runs only the local conditions on a freshly parsed card,
+    plus the profile conditions when the creator's profile is already cached, so tokens that can't
+    be announced skip the Neynar lookup entirely.
+
+    Rule matches are counted here; whether a matching token is actually announced (it may already
+    have been) is counted by the announcer. Per-rule hit counts and per-condition rejection counts are kept so thresholds can be tuned.
+    """
+
+    def __init__(self, rules: List[AlertRule], source: str | None = None):
+        """
+        Args:
+            rules: Compiled rules, in evaluation order
+            source: Where the rules came from, for messages
+        """
+        self.rules = rules
+        self.source = source or "built-in rules"
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "lookups_skipped": 0, "matches": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict, source: str | None = None) -> "AlertRuleEngine":
+        """
+        Compile rules from their configuration
+
+        Raises:
+            ValueError: For an unknown action or condition, a duplicate or malformed rule name, or an invalid pattern
+        """
+        rules = []
+        for index, rule_config in enumerate(config.get("rules", [])):
+            name = rule_config.get("name") or f"rule-{index + 1}"
+            if not _RULE_NAME.match(name) or any(rule.name == name for rule in rules):
+                raise ValueError(f"Alert rule name {name!r} must be unique and only use letters, digits, _ and -")
+            action = rule_config.get("action", "alert")
+            if action not in ACTIONS:
+                raise ValueError(f"Alert rule {name}: action must be one of {', '.join(ACTIONS)}, not {action!r}")
+            conditions = []
+            for condition, value in (rule_config.get("conditions") or {}).items():
+                if condition not in CONDITIONS:
+                    raise ValueError(f"Alert rule {name}: unknown condition {condition!r} (expected one of {', '.join(CONDITIONS)})")
+                cost, factory = CONDITIONS[condition]
+                try:
+                    conditions.append((condition, cost, factory(value)))
+                except (re.error, TypeError, ValueError) as e:
+                    raise ValueError(f"Alert rule {name}: invalid {condition} {value!r}: {e}") from None
+            conditions.sort(key=lambda condition: condition[1])
+            rules.append(AlertRule(name, action, conditions))
+        return cls(rules, source=source)
+
+    @classmethod
+    def load(cls, path: str | None) -> "AlertRuleEngine":
+        """Compile the rules in a JSON file, or DEFAULT_RULES when there's no such file"""
+        if not path or not os.path.exists(path):
+            return cls.from_config(DEFAULT_RULES)
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                config = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Can't parse alert rules in {path}: {e}") from None
+        return cls.from_config(config, source=path)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+        metrics.increment(f"alert_{key}")
+
+    def needs_lookup(self, token: Token, cached: Dict | None = None) -> bool:
+        """
+        Whether a parsed token could still be announced, so its creator's profile is worth fetching
+
+        Without a cached profile only local conditions are evaluated. Returns False when no alert rule
+        can match, or when a skip rule that needs no profile matches before any alert rule could.
+
+        Args:
+            token: Freshly parsed token
+            cached: The creator's follower_count and neynar_score from a fresh cached profile, which
+                makes the profile conditions as cheap as the local ones
+        """
+        facts = {"name": token.name, "symbol": token.symbol, "username": username_from_link(token.creator_link)}
+        if cached:
+            facts.update(follower_count=cached.get("follower_count"), neynar_score=cached.get("neynar_score"))
+        possible = False
+        for rule in self.rules:
+            if not (rule.matches(facts) if cached else rule.local_match(facts)):
+                continue
+            if rule.action == "alert":
+                possible = True
+                break
+            if cached or not rule.needs_profile:
+                break
+        self._count("lookups" if possible else "lookups_skipped")
+        return possible
+
+    def evaluate(self, facts: Dict) -> AlertDecision:
+        """Run the rules over one token's facts (see token_facts) until one matches"""
+        for rule in self.rules:
+            rejected_by = next((name for name, _, predicate in rule.conditions if not predicate(facts)), None)
+            with self._lock:
+                rule.stats["evaluated"] += 1
+                if rejected_by is None:
+                    rule.stats["matched"] += 1
+                else:
+                    rule.stats["rejected"][rejected_by] += 1
+            if rejected_by is None:
+                metrics.increment(f"alert_rule_{rule.name}_matched")
+                if rule.action == "alert":
+                    self._count("matches")
+                return AlertDecision(rule.action == "alert", rule.name)
+        return AlertDecision(False)
+
+    def evaluate_many(self, facts_list: Iterable[Dict]) -> List[AlertDecision]:
+        """Evaluate a whole page (or any batch) of tokens"""
+        return [self.evaluate(facts) for facts in facts_list]
+
+    def rule_stats(self) -> List[Dict]:
+        """Per-rule counts: tokens evaluated, matched, and rejected by each condition"""
+        with self._lock:
+            return [
+                {"name": rule.name, "action": rule.action, "evaluated": rule.stats["evaluated"], "matched": rule.stats["matched"], "rejected": dict(rule.stats["rejected"])}
+                for rule in self.rules
+            ]
+
+    def summary(self) -> str:
+        """One-line description of how many lookups were skipped and which rules fired"""
+        with self._lock:
+            stats = dict(self.stats)
+        matched = ", ".join(f"{rule['name']} {rule['matched']}/{rule['evaluated']}" for rule in self.rule_stats())
+        return f"Alert rules ({self.source}): {stats['matches']} alert matches, {stats['lookups_skipped']} of {stats['lookups'] + stats['lookups_skipped']} lookups skipped; matched {matched or 'nothing'}"
@@ -1,43 +1,88 @@
 from typing import Dict, List
 import click
 from neynar_api import NeynarAPIManager
+from database import DatabaseManager
+from cast_queue import CastQueue
+from metrics import metrics
 from pync import Notifier
 import json
 import os
 
 
 class TokenAnnouncer:
-    def __init__(self, notified_tokens_cache_file: str):
+    def __init__(self, notified_tokens_cache_file: str, db_manager: DatabaseManager | None = None, cast_queue: CastQueue | None = None):
+        """
+        Args:
+            notified_tokens_cache_file: Legacy JSON list of announced tokens, imported into the database once
+            db_manager: Database holding the announced_tokens table
+            cast_queue: If given, casts are queued for a CastQueueWorker instead of posted inline
+        """
         self.neynar = NeynarAPIManager()
         self.cache_file = notified_tokens_cache_file
-        self._cache = self._load_cache()
+        self.db_manager = db_manager or DatabaseManager()
+        self.cast_queue = cast_queue
+        self._import_json_cache()
+        # In-memory index of announced tokens; the database stays the source of truth across processes
+        self._cache = self.db_manager.get_announced_token_ids()
 
-    def _load_cache(self):
-        """Load the cache of notified tokens."""
-        if os.path.exists(self.cache_file):
+    def _import_json_cache(self):
+        """One-time import of the old JSON cache into the announced_tokens table."""
+        if not os.path.exists(self.cache_file):
+            return
+
+        try:
             with open(self.cache_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+                token_ids = json.load(f)
+        except FileNotFoundError:
+            # Another process imported and moved it first
+            return
 
-    def _save_cache(self):
-        """Save the cache of notified tokens."""
-        with open(self.cache_file, "w", encoding="utf-8") as f:
-            json.dump(self._cache, f, indent=2)
+        imported = self.db_manager.import_announced_tokens(token_ids)
+        try:
+            os.replace(self.cache_file, self.cache_file + ".imported")
+        except FileNotFoundError:
+            pass
+        click.echo(f"Imported {imported} announced tokens from {self.cache_file}")
 
     def is_token_announced(self, token_id: str) -> bool:
         """Check if a token has already been announced."""
-        return token_id in self._cache
+        if token_id in self._cache:
+            return True
+        # An overlapping run may have announced it since we loaded the index
+        if self.db_manager.is_token_announced(token_id):
+            self._cache.add(token_id)
+            return True
+        return False
+
+    def mark_token_announced(self, token_id: str) -> bool:
+        """
+        Mark a token as announced.
 
-    def mark_token_announced(self, token_id: str) -> None:
-        """Mark a token as announced and save to cache."""
-        if token_id not in self._cache:
-            self._cache.append(token_id)
-            self._save_cache()
+        The insert is atomic, so when overlapping processes race to announce the same token only
+        one of them gets True back.
+
+        Returns:
+            bool: True if this call claimed the token, False if it was already announced
+        """
+        claimed = self.db_manager.mark_token_announced(token_id)
+        self._cache.add(token_id)
+        return claimed
+
+    def _post_cast(self, text: str, frame_url: str | None = None, token_id: str | None = None) -> None:
+        """Queue the cast if there's an outbound queue, otherwise post it right away and record the token's post time."""
+        with metrics.span("announce.post_cast"):
+            if self.cast_queue:
+                self.cast_queue.enqueue(text, frame_url=frame_url, token_id=token_id)
+            else:
+                self.neynar.post_cast(text, frame_url=frame_url)
+                if token_id:
+                    self.db_manager.mark_token_posted(token_id)
 
     def send_mac_notification(self, title: str, message: str, url: str, dryrun: bool = False):
         """Send a macOS notification that opens the Dexscreener link when clicked."""
         if not dryrun:
-            Notifier.notify(message, title=title, open=url)
+            with metrics.span("announce.notification"):
+                Notifier.notify(message, title=title, open=url)
 
     def announce_token(self, token: Dict, dryrun: bool = False) -> None:
         """
@@ -47,6 +92,7 @@ class TokenAnnouncer:
             token: Dictionary containing token information
             dryrun: If True, suppresses notifications and console output
         """
+        metrics.increment("alerts")
         creator_data = token.get("creator", {}) or {}
         neynar_data = creator_data.get("neynar_data", {}) or {}
         user_data = neynar_data.get("user", {}) or {}
@@ -97,7 +143,7 @@ class TokenAnnouncer:
         try:
             if not dryrun:
                 click.echo(text)
-            self.neynar.post_cast(text, frame_url=banyan_frame_link)
+            self._post_cast(text, frame_url=banyan_frame_link, token_id=contract_address)
             if not dryrun:
                 click.echo(f"Successfully announced token: {token.get('name')}")
         except Exception as e:
@@ -125,7 +171,7 @@ class TokenAnnouncer:
             # Post the narrative cast
             if not dryrun:
                 click.echo(text)
-            self.neynar.post_cast(text)
+            self._post_cast(text)
             if not dryrun:
                 click.echo("Successfully announced top themes.")
         except Exception as e:
@@ -1,44 +1,114 @@
+import json
+import time
 import anthropic
 from database import DatabaseManager  # Import the DatabaseManager class
+from token_clustering import TokenClusters
+from metrics import metrics
+
+
+# Static prompt prefix, identical on every call so it can be served from Anthropic's prompt cache
+EXAMPLES_PROMPT = '<examples>\n<example>\n<TOKEN_LIST>\nAIMEME,HELLYEAH,Unknown,HACIENDA,AUTISTIC WIGGER INTERNET MONIES,BRICS Currency,DAOAshe,Hello December,Tamvan,GINGY,One Shot,bankr,KOALITION,ORB,$Off-Grid,uzi,Torre LATAM,huh dog,Arcane,I\'ll be back,univers,Houdini AI,JEWINYU,Heartbreak,Bictoin,bigbaseballs,DWN,DEGEGEN,FreeHouse,Mexican Coke,AADRAWING,SquiMeme,Noodle,bee,From the director of comic sans,GAWX,Bath Time,crows zero,David Mayer,Clank Griswold,ADCEDOK,Kinetix,Science Acceleration,LOL,$SISCO,Gang Bang,Gamestop on Clanker,based inu,Pigeon,DJmodli,Don\'t buy This,A BiLLON CCARELLA,Move2Earn,Doom,ChickenDog,VirtualsClankerSpectralAIagentlayerFarcastAIFUNSimmi,Carfaster,duma,WE OUTSIDE,Spice Melange,For The Culture,Hot Pockets and Coconut Water,✩₊˚.⋆☾⋆⁺₊✧,Lwo,AIMEME,HELLYEAH,CLANKER,HACIENDA,AUTISTICWIGGER,BRICS,DAOAshe,DECEMBER,TMVN,5G,ONESHOT,bankr,KOAL,ORB,OG,UZI,LATAM,DHUH,ARC,BACK,univers,HOUDINI,JEWINYU,HEARTBREAK,BCT,BIGBASEBALLS,DWN,DGN,FrHo,COMX,AADWR,SQME,$Noodle,BUZZ,PAPYRUS,GAWX,BATH,crows zero,TABOO,clankgriswold,ADCEDOK,KINETIX,SCI/ACC,LOL,SISCO,BANG,GME,binu,Pg,DJmo,DBT,ABC,M2E,IDDQD,CHID,BASEAI,LAMBO,duma,OUTSIDE,SPICE,FTC,HPCW,✩˚☾⋆✧,LWO\n</TOKEN_LIST>\n<ideal_output>\nI\'ll analyze the tokens and group them into specific themes. Here\'s my categorization:\n\n<themed_dictionary>\n{\n    "AI-focused Drawing and Creation": ["AADRAWING", "AADWR", "Houdini AI", "HOUDINI"],\n    \n    "Dog-themed Meme Tokens": ["ChickenDog", "CHID", "huh dog", "DHUH"],\n    \n    "Food and Beverage References": ["Mexican Coke", "Hot Pockets and Coconut Water", "HPCW", "Noodle", "$Noodle"],\n    \n    "Gaming Reference Tokens": ["Doom", "IDDQD", "Gamestop on Clanker", "GME"],\n    \n    "Cultural Movement Tokens": ["For The Culture", "FTC", "WE OUTSIDE", "OUTSIDE"],\n    \n    "Science and Technology Innovation": ["Science Acceleration", "SCI/ACC", "5G"],\n    \n    "Typography and Font References": ["From the director of comic sans", "PAPYRUS", "COMX"],\n    \n    "Latin American Focused": ["Torre LATAM", "LATAM", "HACIENDA"],\n    \n    "Classic Movie References": ["I\'ll be back", "BACK", "Clank Griswold", "clankgriswold"],\n    \n    "Alternative Digital Currency": ["BRICS Currency", "BRICS", "Bictoin", "BCT"]\n}\n</themed_dictionary>\n\nI\'ve focused on creating specific themes that group closely related tokens while avoiding overly broad categories. Each group contains tokens that share unique characteristics or references. I\'ve excluded many tokens that didn\'t fit into clear, specific themes rather than forcing them into broader, less meaningful categories.\n</ideal_output>\n</example>\n</examples>\n\n'
+
+INSTRUCTIONS_PROMPT = 'You will be given a list of token names and symbols in <token_list> tags at the end of this message. Your task is to identify specific themes among these tokens and group them accordingly.\n\nYour goal is to create a dictionary where the keys are themes and the values are lists of tokens that fit those themes. Follow these guidelines:\n\n1. Themes should be as specific as possible, not broad categories.\n2. Each theme should contain only a few items (typically 2-4).\n3. Not every token needs to be categorized if it doesn\'t fit a specific theme.\n4. Focus on unique or niche themes that accurately represent the grouped tokens.\n\nAvoid overly broad themes such as "internet meme," "finance," "artificial intelligence," or "animals." Instead, aim for more specific themes like "space exploration cryptocurrencies," "food-based meme tokens," or "blockchain gaming assets."\n\nExamples of good themes:\n- "Canine-inspired meme tokens"\n- "Decentralized file storage projects"\n- "Metaverse real estate tokens"\n\nExamples of bad (too broad) themes:\n- "Cryptocurrency"\n- "Technology"\n- "Entertainment"\n\nThink carefully about the connections between the tokens and identify the most specific themes possible. Then, provide your themed dictionary output in the following format:\n\n<themed_dictionary>\n{\n    "Theme 1": ["Token1", "Token2", "Token3"],\n    "Theme 2": ["Token4", "Token5"],\n    "Theme 3": ["Token6", "Token7", "Token8"]\n}\n</themed_dictionary>\n\nEnsure that your themes are specific and that each group contains only a few closely related tokens.'
+
+# USD per million tokens: (input, output, cache write, cache read), matched on model name prefix
+MODEL_PRICING = {
+    "claude-3-5-sonnet": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-5-haiku": (0.80, 4.00, 1.00, 0.08),
+}
+
+CLUSTERS_PROMPT = "In the token list below, most entries are a token name followed by its symbol in parentheses, and each entry stands for every near-duplicate launch of that name. Copy entries into your themed dictionary exactly as they are written.\n\n"
 
 
 class TokenAnalyzer:
-    def __init__(self):
-        self.client = anthropic.Anthropic()
-        self.db_manager = DatabaseManager()  # Instantiate the DatabaseManager
+    MODEL = "claude-3-5-sonnet-latest"  # claude-3-5-haiku-20241022
+
+    def __init__(self, db_manager: DatabaseManager | None = None, client: anthropic.Anthropic | None = None):
+        # The default client honours ANTHROPIC_BASE_URL, so a local fake endpoint can stand in for the API
+        self.client = client or anthropic.Anthropic()
+        self.db_manager = db_manager or DatabaseManager()  # Share the caller's connection when given one
+
+    @staticmethod
+    def _previous_themes_prompt(previous_themes: dict) -> dict:
+        return {
+            "type": "text",
+            "text": "These themes were identified in an earlier analysis of this time window:\n\n<previous_themes>\n"
+            + json.dumps(previous_themes, ensure_ascii=False, indent=4)
+            + "\n</previous_themes>\n\nThe token list below only contains tokens launched since that analysis. Add new tokens to the previous themes where they fit and create new themes for the rest, following the guidelines above. Your themed dictionary must include the previous themes as well as any new ones.\n\n",
+        }
+
+    def _record_usage(self, message, latency: float, prompt_chars: int) -> None:
+        usage = message.usage
+        metrics.increment("llm_calls")
+        metrics.increment("llm_input_tokens", usage.input_tokens)
+        metrics.increment("llm_output_tokens", usage.output_tokens)
+        metrics.increment("llm_cache_read_tokens", getattr(usage, "cache_read_input_tokens", None) or 0)
+        metrics.increment("llm_cache_write_tokens", getattr(usage, "cache_creation_input_tokens", None) or 0)
+        self.db_manager.record_llm_usage(
+            model=message.model,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+            cache_write_tokens=getattr(usage, "cache_creation_input_tokens", None) or 0,
+            latency=latency,
+            prompt_chars=prompt_chars,
+        )
 
-    def analyze_tokens(self, token_list: str, top_x: int) -> dict:
+    def analyze_tokens(self, token_list: str, top_x: int, previous_themes: dict | None = None) -> dict:
         """
         Analyzes a list of tokens using Claude to identify themes and patterns.
 
         Args:
             token_list (str): Comma-separated list of tokens to analyze
+            top_x (int): Number of themes to return
+            previous_themes (dict): Themes from an earlier analysis to extend, when token_list only holds new tokens
 
         Returns:
             dict: Dictionary containing the theme analysis and themes list
         """
-        message = self.client.messages.create(
-            model="claude-3-5-sonnet-latest",  # claude-3-5-haiku-20241022
-            max_tokens=1000,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": '<examples>\n<example>\n<TOKEN_LIST>\nAIMEME,HELLYEAH,Unknown,HACIENDA,AUTISTIC WIGGER INTERNET MONIES,BRICS Currency,DAOAshe,Hello December,Tamvan,GINGY,One Shot,bankr,KOALITION,ORB,$Off-Grid,uzi,Torre LATAM,huh dog,Arcane,I\'ll be back,univers,Houdini AI,JEWINYU,Heartbreak,Bictoin,bigbaseballs,DWN,DEGEGEN,FreeHouse,Mexican Coke,AADRAWING,SquiMeme,Noodle,bee,From the director of comic sans,GAWX,Bath Time,crows zero,David Mayer,Clank Griswold,ADCEDOK,Kinetix,Science Acceleration,LOL,$SISCO,Gang Bang,Gamestop on Clanker,based inu,Pigeon,DJmodli,Don\'t buy This,A BiLLON CCARELLA,Move2Earn,Doom,ChickenDog,VirtualsClankerSpectralAIagentlayerFarcastAIFUNSimmi,Carfaster,duma,WE OUTSIDE,Spice Melange,For The Culture,Hot Pockets and Coconut Water,✩₊˚.⋆☾⋆⁺₊✧,Lwo,AIMEME,HELLYEAH,CLANKER,HACIENDA,AUTISTICWIGGER,BRICS,DAOAshe,DECEMBER,TMVN,5G,ONESHOT,bankr,KOAL,ORB,OG,UZI,LATAM,DHUH,ARC,BACK,univers,HOUDINI,JEWINYU,HEARTBREAK,BCT,BIGBASEBALLS,DWN,DGN,FrHo,COMX,AADWR,SQME,$Noodle,BUZZ,PAPYRUS,GAWX,BATH,crows zero,TABOO,clankgriswold,ADCEDOK,KINETIX,SCI/ACC,LOL,SISCO,BANG,GME,binu,Pg,DJmo,DBT,ABC,M2E,IDDQD,CHID,BASEAI,LAMBO,duma,OUTSIDE,SPICE,FTC,HPCW,✩˚☾⋆✧,LWO\n</TOKEN_LIST>\n<ideal_output>\nI\'ll analyze the tokens and group them into specific themes. Here\'s my categorization:\n\n<themed_dictionary>\n{\n    "AI-focused Drawing and Creation": ["AADRAWING", "AADWR", "Houdini AI", "HOUDINI"],\n    \n    "Dog-themed Meme Tokens": ["ChickenDog", "CHID", "huh dog", "DHUH"],\n    \n    "Food and Beverage References": ["Mexican Coke", "Hot Pockets and Coconut Water", "HPCW", "Noodle", "$Noodle"],\n    \n    "Gaming Reference Tokens": ["Doom", "IDDQD", "Gamestop on Clanker", "GME"],\n    \n    "Cultural Movement Tokens": ["For The Culture", "FTC", "WE OUTSIDE", "OUTSIDE"],\n    \n    "Science and Technology Innovation": ["Science Acceleration", "SCI/ACC", "5G"],\n    \n    "Typography and Font References": ["From the director of comic sans", "PAPYRUS", "COMX"],\n    \n    "Latin American Focused": ["Torre LATAM", "LATAM", "HACIENDA"],\n    \n    "Classic Movie References": ["I\'ll be back", "BACK", "Clank Griswold", "clankgriswold"],\n    \n    "Alternative Digital Currency": ["BRICS Currency", "BRICS", "Bictoin", "BCT"]\n}\n</themed_dictionary>\n\nI\'ve focused on creating specific themes that group closely related tokens while avoiding overly broad categories. Each group contains tokens that share unique characteristics or references. I\'ve excluded many tokens that didn\'t fit into clear, specific themes rather than forcing them into broader, less meaningful categories.\n</ideal_output>\n</example>\n</examples>\n\n',
-                        },
-                        {
-                            "type": "text",
-                            "text": 'You will be given a list of token names and symbols. Your task is to identify specific themes among these tokens and group them accordingly. Here is the list of tokens:\n\n<token_list>\n{{TOKEN_LIST}}\n</token_list>\n\nYour goal is to create a dictionary where the keys are themes and the values are lists of tokens that fit those themes. Follow these guidelines:\n\n1. Themes should be as specific as possible, not broad categories.\n2. Each theme should contain only a few items (typically 2-4).\n3. Not every token needs to be categorized if it doesn\'t fit a specific theme.\n4. Focus on unique or niche themes that accurately represent the grouped tokens.\n\nAvoid overly broad themes such as "internet meme," "finance," "artificial intelligence," or "animals." Instead, aim for more specific themes like "space exploration cryptocurrencies," "food-based meme tokens," or "blockchain gaming assets."\n\nExamples of good themes:\n- "Canine-inspired meme tokens"\n- "Decentralized file storage projects"\n- "Metaverse real estate tokens"\n\nExamples of bad (too broad) themes:\n- "Cryptocurrency"\n- "Technology"\n- "Entertainment"\n\nThink carefully about the connections between the tokens and identify the most specific themes possible. Then, provide your themed dictionary output in the following format:\n\n<themed_dictionary>\n{\n    "Theme 1": ["Token1", "Token2", "Token3"],\n    "Theme 2": ["Token4", "Token5"],\n    "Theme 3": ["Token6", "Token7", "Token8"]\n}\n</themed_dictionary>\n\nEnsure that your themes are specific and that each group contains only a few closely related tokens.'.replace(
-                                "{{TOKEN_LIST}}", token_list
-                            ),
-                        },
-                    ],
-                }
-            ],
-        )
+        sorted_themes = self.identify_themes(token_list, previous_themes)
+
+        # Select the top x themes
+        top_themes = dict(sorted_themes[:top_x])
+
+        print("top themes: ", top_themes)
+
+        return top_themes
+
+    def identify_themes(self, token_list: str, previous_themes: dict | None = None, clusters: TokenClusters | None = None) -> list:
+        """
+        Ask Claude to group tokens into themes and save every theme to the database.
+
+        Args:
+            token_list (str): Comma-separated list of tokens to analyze
+            previous_themes (dict): Themes from an earlier analysis to extend, when token_list only holds new tokens
+            clusters (TokenClusters): When token_list holds cluster representatives, expands them back to
+                the names and symbols they stand for
+
+        Returns:
+            list: (theme, tokens) pairs, largest theme first
+        """
+        prompt = [
+            {"type": "text", "text": EXAMPLES_PROMPT},
+            # Everything up to and including this block is cached; only the blocks after it change between calls
+            {"type": "text", "text": INSTRUCTIONS_PROMPT, "cache_control": {"type": "ephemeral"}},
+        ]
+        if clusters is not None:
+            prompt.append({"type": "text", "text": CLUSTERS_PROMPT})
+        if previous_themes:
+            prompt.append(self._previous_themes_prompt(previous_themes))
+        prompt.append({"type": "text", "text": f"Here is the list of tokens:\n\n<token_list>\n{token_list}\n</token_list>"})
+
+        started = time.monotonic()
+        # Prompt caching is still a beta namespace in the pinned anthropic SDK
+        with metrics.span("anthropic.messages_create"):
+            message = self.client.beta.prompt_caching.messages.create(
+                model=self.MODEL,
+                max_tokens=1000,
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}],
+            )
+        self._record_usage(message, time.monotonic() - started, len(token_list))
 
         content = message.content[0].text
 
@@ -50,6 +120,8 @@ class TokenAnalyzer:
         # Convert string to actual dictionary using eval()
         # Note: eval() is safe here since we control the input from Claude
         themed_dict = eval(dict_str)
+        if clusters is not None:
+            themed_dict = clusters.expand(themed_dict)
 
         print("all themes: ", themed_dict)
 
@@ -59,9 +131,17 @@ class TokenAnalyzer:
         # Save the sorted themes to the database
         self.db_manager.save_themes(dict(sorted_themes))
 
-        # Select the top x themes
-        top_themes = dict(sorted_themes[:top_x])
+        return sorted_themes
 
-        print("top themes: ", top_themes)
 
-        return top_themes
+def estimate_cost(model: str, input_tokens: int, output_tokens: int, cache_write_tokens: int = 0, cache_read_tokens: int = 0) -> float | None:
+    """
+    Estimate the USD cost of a call from its token usage
+
+    Returns:
+        float: Cost in USD, or None if the model isn't in MODEL_PRICING
+    """
+    for prefix, (input_price, output_price, cache_write_price, cache_read_price) in MODEL_PRICING.items():
+        if model.startswith(prefix):
+            return (input_tokens * input_price + output_tokens * output_price + cache_write_tokens * cache_write_price + cache_read_tokens * cache_read_price) / 1_000_000
+    return None
@@ -2,109 +2,244 @@
 
 import json
 import click
+import itertools
+import os
 import sys
+import time
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 from neynar_api import NeynarAPIManager
-from table_formatter import display_tokens
-from database import DatabaseManager
-from narrative import TokenNarrative
-
-from scraper import ClankerScraper
+from table_formatter import OUTPUT_MODES, TokenTableStream, display_tokens
+from database import DatabaseManager, TokenBatchWriter
+from narrative import NARRATIVE_COLUMNS, TokenNarrative
+from anthropic_api import estimate_cost
+from metrics import metrics
+
+from scraper import LOOKUP_FAILED, LOOKUP_FOUND, ClankerScraper, creator_details_from_token
+from fetch_backends import FETCH_BACKENDS
+from html_parsers import PARSER_BACKENDS
+from creator_cache import CreatorProfileCache
 from announcer import TokenAnnouncer
+from alert_rules import AlertRuleEngine, token_facts
+from cast_queue import CastQueue, CastQueueWorker
+from backfill import BackfillCrawler, parse_since
+from pipeline import Pipeline
+from page_changes import PageChangeTracker
+from export import EXPORT_FORMATS, TableExporter
 
 NOTIFIED_TOKENS_CACHE_FILE = "notified_tokens.json"
 load_dotenv()
+CLANKER_URL = os.getenv("CLANKER_URL", "https://www.clanker.world/clanker")
+# "none" keeps cron and daemon logs free of token tables
+OUTPUT_MODE = os.getenv("CLANKER_OUTPUT_MODE", "table")
+# Which tokens are announced; the built-in rules apply when the file doesn't exist
+ALERT_RULES_FILE = os.getenv("ALERT_RULES_FILE", "alert_rules.json")
 neynar = NeynarAPIManager()
-announcer = TokenAnnouncer(notified_tokens_cache_file=NOTIFIED_TOKENS_CACHE_FILE)
 db_manager = DatabaseManager()
-
-
-def check_clanker(output=None, verbose=False, dryrun=False):
+cast_queue = CastQueue(db_manager)
+cast_worker = CastQueueWorker(cast_queue, neynar, posts_per_minute=float(os.getenv("CAST_POSTS_PER_MINUTE", "10")))
+# Each check/recent run can be exported for node_exporter's textfile collector and as JSON lines
+metrics.configure(textfile_dir=os.getenv("METRICS_TEXTFILE_DIR"), jsonl_path=os.getenv("METRICS_JSONL"))
+announcer = TokenAnnouncer(notified_tokens_cache_file=NOTIFIED_TOKENS_CACHE_FILE, db_manager=db_manager, cast_queue=cast_queue)
+alert_rules = AlertRuleEngine.load(ALERT_RULES_FILE)
+# Defaults for the Neynar lookup options, shared by every command that builds a scraper
+NEYNAR_TIMEOUT = 10
+PROFILE_TTL = 6 * 3600
+PROFILE_STALE_TTL = 24 * 3600
+# Tokens checked against the database per query in incremental mode
+KNOWN_CHECK_CHUNK = 50
+# Contract address -> monotonic time of the last re-enrichment, so --refresh-known rotates through seen tokens
+last_refreshed = {}
+
+
+def select_tokens_to_refresh(known_tokens, limit):
+    """Pick up to `limit` already-processed tokens, least recently re-enriched first"""
+    if limit <= 0:
+        return []
+    selected = sorted(known_tokens, key=lambda token: last_refreshed.get(token.contract_address, 0))[:limit]
+    # Only tokens still on the page can be picked again, so forget the rest
+    current = {token.contract_address: last_refreshed.get(token.contract_address, 0) for token in known_tokens}
+    last_refreshed.clear()
+    last_refreshed.update(current)
+    now = time.monotonic()
+    for token in selected:
+        last_refreshed[token.contract_address] = now
+    return selected
+
+
+def skip_known_tokens(tokens, refresh_known, refreshed, stats):
+    """
+    Yield tokens not processed yet, then up to `refresh_known` already-processed ones to re-enrich
+
+    Saved tokens whose creator lookup failed, or never finished, count as new, so they're enriched
+    and can still be alerted on. Tokens are checked KNOWN_CHECK_CHUNK at a time, one query per table.
+    """
+    known_tokens = []
+    tokens = iter(tokens)
+    while chunk := list(itertools.islice(tokens, KNOWN_CHECK_CHUNK)):
+        addresses = [token.contract_address for token in chunk]
+        processed = db_manager.get_processed_contract_addresses(addresses)
+        saved = db_manager.get_known_contract_addresses(addresses)
+        for token in chunk:
+            if token.contract_address in processed:
+                known_tokens.append(token)
+            else:
+                stats["retried" if token.contract_address in saved else "new"] += 1
+                yield token
+
+    stats["known"] = len(known_tokens)
+    for token in select_tokens_to_refresh(known_tokens, refresh_known):
+        refreshed.add(token.contract_address)
+        yield token
+
+
+def persist_tokens(tokens, writer, refreshed):
+    """Queue each newly parsed token for the database as it passes through"""
+    for token in tokens:
+        if token.contract_address not in refreshed:
+            writer.add_token(token)
+        yield token
+
+
+def handle_enriched_token(token, writer, dryrun, alert=True):
+    """Record the creator details of an enriched token and announce it if the creator qualifies"""
+    # Use token's contract address as a unique identifier
+    token_id = token.get("contract_address")
+
+    creator_details = creator_details_from_token(token)
+    # Only a fetched profile is stored; a skipped or failed lookup would overwrite the creator's details with zeros
+    if token.get("creator_lookup") == LOOKUP_FOUND:
+        writer.add_creator_details(token_id, creator_details)
+
+    if alert and alert_rules.evaluate(token_facts(token, creator_details)).alert and not announcer.is_token_announced(token_id):
+        # Claim the token before announcing so an overlapping run can't announce it too
+        if not dryrun and announcer.mark_token_announced(token_id):
+            click.echo(f"🔔 Notifying {token.get('name')} with {creator_details['follower_count']} followers and Neynar score {creator_details['neynar_score']} 🔔")
+            announcer.announce_token(token)
+
+
+def process_tokens(scraper, tokens, fetched_at, dryrun, concurrency, refreshed=frozenset(), stream=None):
+    """
+    Save, enrich and alert on parsed tokens as they arrive
+
+    Args:
+        tokens: Parsed tokens (may be a generator)
+        fetched_at: Epoch seconds the tokens were seen, recorded as their detection time
+        refreshed: Addresses of already-saved tokens that only get their creator details updated
+        stream: Optional TokenTableStream the new tokens are printed to as they're enriched
+
+    Returns:
+        tuple: The enriched dicts of the new tokens, and the TokenBatchWriter with its counts
+    """
+    token_dicts = []
+    with TokenBatchWriter(db_manager, detected_at=fetched_at) as writer:
+        tokens = persist_tokens(tokens, writer, refreshed)
+        # Creators of tokens no alert rule could match, going by the card and any cached profile, aren't looked up; re-enriched tokens always are
+        should_lookup = lambda token: token.contract_address in refreshed or alert_rules.needs_lookup(token, scraper.cached_creator_details(token))
+        for token in scraper.iter_token_dicts(tokens, max_workers=concurrency, should_lookup=should_lookup):
+            # Re-enriched tokens only get their creator details updated
+            is_refresh = token.get("contract_address") in refreshed
+            handle_enriched_token(token, writer, dryrun, alert=not is_refresh)
+            # A failed refresh keeps the outcome of the earlier lookup rather than making the token new again
+            if not (is_refresh and token["creator_lookup"] == LOOKUP_FAILED):
+                writer.add_creator_lookup(token["contract_address"], token["creator_lookup"])
+            if not is_refresh:
+                token_dicts.append(token)
+                if stream:
+                    stream.add(token)
+    return token_dicts, writer
+
+
+def check_clanker(
+    output=None, verbose=False, dryrun=False, scraper=None, backend="selenium", url=CLANKER_URL, concurrency=8, incremental=False, refresh_known=0, output_mode=OUTPUT_MODE, page_size=50, skip_unchanged=False
+):
     """Main function to check and parse Clanker tokens"""
-    url = "https://www.clanker.world/clanker"
-
-    try:
-        if verbose:
-            click.echo(f"Fetching dynamic content from {url}...")
-
-        # Initialize scraper and get tokens
-        scraper = ClankerScraper(verbose=verbose)
-        html_content = scraper.get_dynamic_page_content(url)
-        tokens = scraper.parse_clanker_page(html_content)
-
-        if verbose:
-            click.echo(f"Content Length: {len(html_content)} characters")
-
-        # Save tokens to database and format them
-        token_dicts = []
-        for token in tokens:
-            try:
-                # Assuming token is an object, access its attributes directly
-                token_name = getattr(token, "name", "Unknown")
-
-                # Save to database
-                db_manager.save_token(token)
-                click.echo(f"Token {token_name} saved to database.")  # Log status
-            except Exception as e:
-                click.echo(f"Failed to save token {token_name}: {e}", err=True)  # Log error
-            # Format for display
-            token_dicts.append(scraper.format_token_dict(token))
-
-        # Add metadata
-        result = {"timestamp": datetime.now().isoformat(), "total_tokens": len(token_dicts), "tokens": token_dicts}
-
-        # Check for notifications
-        for token in token_dicts:
-            creator_data = token.get("creator", {}) or {}
-            neynar_data = creator_data.get("neynar_data", {}) or {}
-            user_data = neynar_data.get("user", {}) or {}
-
-            follower_count = user_data.get("follower_count", 0)
-            neynar_user_score = user_data.get("experimental", {}).get("neynar_user_score", 0)
-
-            # Use token's contract address as a unique identifier
-            token_id = token.get("contract_address")
-
-            # Construct creator_data dictionary for database
-            creator_details = {"username": creator_data.get("username"), "eth_addresses": creator_data.get("eth_addresses", []), "follower_count": follower_count, "neynar_score": neynar_user_score}
-
-            # Add creator details to database
-            db_manager.add_creator_details(token_id, creator_details)
-
-            if follower_count > 2000 and neynar_user_score >= 0.95 and not announcer.is_token_announced(token_id):
-                if not dryrun:
-                    click.echo(f"🔔 Notifying {token_name} with {follower_count} followers and Neynar score {neynar_user_score} 🔔")
-
-                # Announce the token if needed
-                if not dryrun:
-                    announcer.announce_token(token)
-                    announcer.mark_token_announced(token_id)
-
-        # Display the formatted data in the terminal
-        display_tokens(token_dicts)
+    with metrics.run("check") as run:
+        try:
+            if verbose:
+                click.echo(f"Fetching dynamic content from {url}...")
+
+            # Initialize scraper (unless a long-lived one was passed in) and get tokens
+            if scraper is None:
+                scraper = ClankerScraper(verbose=verbose, backend=backend)
+            html_content = scraper.get_dynamic_page_content(url)
+            fetched_at = time.time()
+
+            if verbose:
+                click.echo(f"Content Length: {len(html_content)} characters")
+
+            # Re-enriching known tokens needs to see them, so --refresh-known always processes the whole page
+            changes = PageChangeTracker(db_manager, url) if skip_unchanged and not refresh_known else None
+            if changes and changes.unchanged(html_content):
+                metrics.increment("polls_unchanged")
+                click.echo("Page unchanged since the last poll; nothing to do.")
+                return
+
+            # Each stage pulls tokens lazily from the one before it: parse -> (skip known) -> persist -> enrich -> alert.
+            # Only `concurrency` tokens are being enriched at once, and the first qualifying creator is
+            # announced as soon as its lookup completes rather than after the whole page is processed.
+            refreshed = set()
+            stats = {"new": 0, "retried": 0, "known": 0}
+            tokens = scraper.iter_clanker_page(html_content, fetched_at=fetched_at)
+            if changes:
+                # Only cards that are new or differ from the last processed poll go any further
+                tokens = changes.changed_cards(tokens)
+            if incremental:
+                # Skip everything already handled by an earlier poll, optionally re-enriching a few of them
+                tokens = skip_known_tokens(tokens, refresh_known, refreshed, stats)
+
+            # In stream mode rows are printed as their lookups finish instead of all at the end
+            stream = TokenTableStream(page_size) if output_mode == "stream" else None
+            token_dicts, writer = process_tokens(scraper, tokens, fetched_at, dryrun, concurrency, refreshed, stream)
+
+            click.echo(f"Saved {writer.tokens_written} tokens and {writer.creator_details_written} creator details to database.")
+            metrics.increment("tokens_saved", writer.tokens_written)
+            if incremental:
+                metrics.increment("tokens_new", stats["new"])
+                metrics.increment("tokens_retried", stats["retried"])
+                metrics.increment("tokens_known", stats["known"])
+                click.echo(f"Incremental mode: {stats['new']} new tokens, {stats['retried']} retried, {stats['known']} already processed, re-enriched {len(refreshed)}")
+
+            # Add metadata
+            result = {"timestamp": datetime.now().isoformat(), "total_tokens": len(token_dicts), "tokens": token_dicts}
+
+            # Display the formatted data in the terminal
+            if stream:
+                stream.close()
+            else:
+                display_tokens(token_dicts, mode=output_mode, page_size=page_size)
+
+            if scraper.profile_cache:
+                click.echo(scraper.profile_cache.summary())
+            if verbose:
+                click.echo(alert_rules.summary())
+
+            # Output handling (if file output is needed)
+            if output:
+                # Save to file
+                with open(output, "w", encoding="utf-8") as f:
+                    json.dump(result, f, indent=2)
+                click.echo(f"Results saved to {output}")
+
+                # Also save raw HTML for debugging
+                if verbose and not dryrun:
+                    debug_html_path = output + ".html"
+                    with open(debug_html_path, "w", encoding="utf-8") as f:
+                        f.write(html_content)
+                    if not dryrun:
+                        click.echo(f"Raw HTML saved to {debug_html_path}")
 
-        # Output handling (if file output is needed)
-        if output:
-            # Save to file
-            with open(output, "w", encoding="utf-8") as f:
-                json.dump(result, f, indent=2)
-            click.echo(f"Results saved to {output}")
-
-            # Also save raw HTML for debugging
             if verbose and not dryrun:
-                debug_html_path = output + ".html"
-                with open(debug_html_path, "w", encoding="utf-8") as f:
-                    f.write(html_content)
-                if not dryrun:
-                    click.echo(f"Raw HTML saved to {debug_html_path}")
+                click.echo(f"\nFound {len(token_dicts)} tokens")
 
-        if verbose and not dryrun:
-            click.echo(f"\nFound {len(tokens)} tokens")
+            # A dry run doesn't announce, so the next real poll must not skip these cards
+            if changes and not dryrun:
+                changes.save()
 
-    except Exception as e:
-        click.echo(f"Error processing data: {e}", err=True)
-        return 1
+        except Exception as e:
+            click.echo(f"Error processing data: {e}", err=True)
+            run["status"] = "error"
+            return 1
 
 
 @click.group()
@@ -113,37 +248,380 @@ def cli():
     pass
 
 
+def output_options(func):
+    """Apply the options controlling how commands print tokens"""
+    func = click.option("--page-size", default=50, type=int, help="Rows per printed table page")(func)
+    func = click.option("--output-mode", type=click.Choice(OUTPUT_MODES), default=OUTPUT_MODE, help="Print tokens as a paginated table, streamed table rows, JSON lines, or not at all")(func)
+    return func
+
+
+def poll_options(func):
+    """Apply the options shared by the commands that poll the Clanker listing"""
+    options = [
+        click.option("--backend", "-b", type=click.Choice(FETCH_BACKENDS), default="selenium", help="How to fetch the page (auto tries plain HTTP, then falls back to Selenium)"),
+        click.option("--url", default=CLANKER_URL, help="Clanker listing URL to fetch"),
+        click.option("--parser", "-p", type=click.Choice(PARSER_BACKENDS), default="bs4", help="HTML parser backend (lxml and selectolax are optional installs)"),
+        click.option("--concurrency", "-c", default=8, type=int, help="Maximum number of concurrent Neynar lookups"),
+        click.option("--neynar-timeout", default=NEYNAR_TIMEOUT, type=float, help="Seconds before a single Neynar lookup is abandoned"),
+        click.option("--profile-ttl", default=PROFILE_TTL, type=int, help="Seconds a cached creator profile is fresh (0 disables the cache)"),
+        click.option("--profile-stale-ttl", default=PROFILE_STALE_TTL, type=int, help="Extra seconds a stale creator profile is served while it refreshes"),
+        click.option("--incremental", is_flag=True, help="Only save, enrich and alert on tokens not already in the database"),
+        click.option("--refresh-known", default=0, type=int, help="With --incremental, re-enrich up to this many already-seen tokens per poll"),
+        click.option("--skip-unchanged", is_flag=True, help="Stop after the fetch when the page lists the same tokens as the last poll, and only process cards that changed"),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return output_options(func)
+
+
+def create_scraper(verbose, backend, parser, neynar_timeout=NEYNAR_TIMEOUT, profile_ttl=PROFILE_TTL, profile_stale_ttl=PROFILE_STALE_TTL, **kwargs):
+    """Build a ClankerScraper, with a creator profile cache unless it's disabled"""
+    profile_cache = CreatorProfileCache(db_manager, ttl=profile_ttl, stale_ttl=profile_stale_ttl) if profile_ttl > 0 else None
+    return ClankerScraper(verbose=verbose, backend=backend, parser=parser, neynar_timeout=neynar_timeout, profile_cache=profile_cache, **kwargs)
+
+
 @cli.command()
 @click.option("--output", "-o", type=click.Path(), help="Output file path for JSON results")
 @click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
 @click.option("--dryrun", "-d", is_flag=True, help="Run without making notifications or console output")
-def check(output, verbose, dryrun):
+@click.option("--drain-timeout", default=60, type=int, help="Seconds to spend posting queued casts before exiting")
+@poll_options
+def check(output, verbose, dryrun, drain_timeout, backend, url, parser, concurrency, neynar_timeout, profile_ttl, profile_stale_ttl, incremental, refresh_known, skip_unchanged, output_mode, page_size):
     """Check and parse current Clanker tokens"""
-    return check_clanker(output, verbose, dryrun)
+    scraper = create_scraper(verbose, backend, parser, neynar_timeout, profile_ttl, profile_stale_ttl)
+    try:
+        return check_clanker(output, verbose, dryrun, scraper=scraper, url=url, concurrency=concurrency, incremental=incremental, refresh_known=refresh_known, skip_unchanged=skip_unchanged, output_mode=output_mode, page_size=page_size)
+    finally:
+        scraper.close()
+        if not dryrun:
+            cast_worker.drain(timeout=drain_timeout)
+
+
+def handle_pushed_tokens(scraper, tokens, fetched_at, dryrun, concurrency, output_mode, page_size):
+    """Save, enrich and alert on a batch of tokens the live page pushed, skipping any already saved"""
+    with metrics.run("push") as run:
+        try:
+            # Reloads push the whole page again, and the page may re-render cards it already showed
+            stats = {"new": 0, "retried": 0, "known": 0}
+            token_dicts, writer = process_tokens(scraper, skip_known_tokens(tokens, 0, set(), stats), fetched_at, dryrun, concurrency)
+            metrics.increment("tokens_pushed", len(tokens))
+            metrics.increment("tokens_saved", writer.tokens_written)
+            metrics.increment("tokens_new", stats["new"])
+            metrics.increment("tokens_retried", stats["retried"])
+            metrics.increment("tokens_known", stats["known"])
+            if token_dicts:
+                click.echo(f"[{datetime.now().isoformat()}] {len(token_dicts)} new token(s) pushed by the page")
+                display_tokens(token_dicts, mode=output_mode, page_size=page_size)
+        except Exception as e:
+            click.echo(f"Error processing pushed tokens: {e}", err=True)
+            run["status"] = "error"
+
+
+@cli.command()
+@click.option("--interval", "-i", default=60, type=int, help="Seconds between polls (with --push, seconds without new cards before the page is reloaded)")
+@click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
+@click.option("--dryrun", "-d", is_flag=True, help="Run without making notifications or console output")
+@click.option("--max-page-loads", default=500, type=int, help="Restart Chrome after this many page loads")
+@click.option("--max-heap-mb", default=512, type=int, help="Restart Chrome when the page's JS heap exceeds this size")
+@click.option("--push", is_flag=True, help="Keep the page open and process cards as the page adds them, instead of polling (selenium backend)")
+@poll_options
+def watch(interval, verbose, dryrun, max_page_loads, max_heap_mb, push, backend, url, parser, concurrency, neynar_timeout, profile_ttl, profile_stale_ttl, incremental, refresh_known, skip_unchanged, output_mode, page_size):
+    """Poll Clanker continuously, keeping one browser session alive between polls"""
+    if push and backend == "http":
+        raise click.BadParameter("--push observes the page in Chrome; use --backend selenium", param_hint="--backend")
+    scraper = create_scraper(verbose, backend, parser, neynar_timeout, profile_ttl, profile_stale_ttl, persistent=True, max_page_loads=max_page_loads, max_heap_mb=max_heap_mb)
+    cycle = 0
+    if not dryrun:
+        cast_worker.start()
+    try:
+        if push:
+            click.echo(f"Watching {url} for new tokens, reloading after {interval}s without any...")
+            for tokens, fetched_at in scraper.watch_new_tokens(url, reload_after=interval):
+                handle_pushed_tokens(scraper, tokens, fetched_at, dryrun, concurrency, output_mode, page_size)
+        else:
+            while True:
+                cycle += 1
+                started = time.monotonic()
+                status = check_clanker(
+                    verbose=verbose, dryrun=dryrun, scraper=scraper, url=url, concurrency=concurrency, incremental=incremental, refresh_known=refresh_known, skip_unchanged=skip_unchanged, output_mode=output_mode, page_size=page_size
+                )
+                elapsed = time.monotonic() - started
+                click.echo(f"[{datetime.now().isoformat()}] Cycle {cycle} {'failed' if status else 'completed'} in {elapsed:.2f}s")
+                time.sleep(max(0, interval - elapsed))
+    except KeyboardInterrupt:
+        click.echo("Stopping watch...")
+    finally:
+        scraper.close()
+        cast_worker.stop()
+
+
+@cli.command()
+@click.option("--interval", "-i", default=60, type=int, help="Seconds between polls of each scraper")
+@click.option("--scrapers", default=1, type=int, help="Polling processes, staggered evenly across the interval")
+@click.option("--enrichers", default=2, type=int, help="Enrichment processes")
+@click.option("--concurrency", "-c", default=8, type=int, help="Concurrent Neynar lookups per enrichment process")
+@click.option("--queue-size", default=500, type=int, help="Capacity of the token and announcement queues")
+@click.option("--report-interval", default=30, type=int, help="Seconds between queue depth reports")
+@click.option("--drain-timeout", default=60, type=int, help="Seconds the announcer spends posting queued casts when stopping")
+@click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
+@click.option("--dryrun", "-d", is_flag=True, help="Enrich and save tokens but don't announce them")
+@click.option("--backend", "-b", type=click.Choice(FETCH_BACKENDS), default="selenium", help="How scrapers fetch the page")
+@click.option("--url", default=CLANKER_URL, help="Clanker listing URL to fetch")
+@click.option("--parser", "-p", type=click.Choice(PARSER_BACKENDS), default="bs4", help="HTML parser backend")
+@click.option("--neynar-timeout", default=NEYNAR_TIMEOUT, type=float, help="Seconds before a single Neynar lookup is abandoned")
+@click.option("--profile-ttl", default=PROFILE_TTL, type=int, help="Seconds a cached creator profile is fresh (0 disables the cache)")
+@click.option("--profile-stale-ttl", default=PROFILE_STALE_TTL, type=int, help="Extra seconds a stale creator profile is served while it refreshes")
+def pipeline(interval, scrapers, enrichers, concurrency, queue_size, report_interval, drain_timeout, verbose, dryrun, backend, url, parser, neynar_timeout, profile_ttl, profile_stale_ttl):
+    """Poll continuously with scraping, enrichment and announcing in separate processes"""
+    config = {
+        "url": url,
+        "interval": interval,
+        "backend": backend,
+        "parser": parser,
+        "concurrency": concurrency,
+        "neynar_timeout": neynar_timeout,
+        "profile_ttl": profile_ttl,
+        "profile_stale_ttl": profile_stale_ttl,
+        "verbose": verbose,
+        "dryrun": dryrun,
+        "drain_timeout": drain_timeout,
+        "notified_tokens_cache_file": NOTIFIED_TOKENS_CACHE_FILE,
+        "alert_rules_file": ALERT_RULES_FILE,
+    }
+    click.echo(f"Starting pipeline: {scrapers} scraper(s), {enrichers} enricher(s) x {concurrency} lookups, 1 announcer")
+    Pipeline(config, scrapers=scrapers, enrichers=enrichers, queue_size=queue_size).run(report_interval=report_interval)
+
+
+@cli.command()
+@click.option("--since", "since_value", required=True, help="How far back to go: an age like 24h or 3d, or a date like 2024-12-01")
+@click.option("--workers", "-w", default=4, type=int, help="Pages fetched at once (each worker has its own browser or HTTP session)")
+@click.option("--max-pages", default=100, type=int, help="Last listing page to crawl")
+@click.option("--page-param", default="page", help="Query parameter that selects a listing page")
+@click.option("--address", "addresses", multiple=True, help="Also fetch this token's own page (repeatable)")
+@click.option("--enrich", is_flag=True, help="Also look up and save creator details (backfilled tokens are never alerted)")
+@click.option("--restart", is_flag=True, help="Ignore the checkpoint of an earlier crawl and start from page 1")
+@click.option("--verbose", "-v", is_flag=True, help="Enable verbose output")
+@click.option("--backend", "-b", type=click.Choice(FETCH_BACKENDS), default="http", help="How each worker fetches pages")
+@click.option("--url", default=CLANKER_URL, help="Clanker listing URL (page 1); token pages are under it")
+@click.option("--parser", "-p", type=click.Choice(PARSER_BACKENDS), default="bs4", help="HTML parser backend")
+@click.option("--concurrency", "-c", default=8, type=int, help="Concurrent Neynar lookups per page with --enrich")
+def backfill(since_value, workers, max_pages, page_param, addresses, enrich, restart, verbose, backend, url, parser, concurrency):
+    """Recover launches missed while the bot was down by crawling older listing pages"""
+    try:
+        since = parse_since(since_value)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--since")
+
+    scraper = create_scraper(verbose, "http", parser, neynar_timeout=NEYNAR_TIMEOUT, profile_ttl=PROFILE_TTL, profile_stale_ttl=PROFILE_STALE_TTL)
+    crawler = BackfillCrawler(db_manager, scraper, backend=backend, workers=workers, enrich=enrich, concurrency=concurrency, verbose=verbose)
+    with metrics.run("backfill") as run:
+        try:
+            click.echo(f"Backfilling {url} back to {datetime.fromtimestamp(since).isoformat()} with {workers} worker(s)...")
+            stats = crawler.crawl_listing(url, since, max_pages=max_pages, page_param=page_param, resume=not restart)
+            click.echo(f"Crawled {stats['pages']} page(s), saved {stats['saved']} tokens; checkpoint at page {stats['checkpoint']}")
+            if addresses:
+                token_stats = crawler.crawl_tokens(addresses, url)
+                click.echo(f"Fetched {token_stats['pages']} token page(s), saved {token_stats['saved']} tokens")
+                if token_stats["missing"]:
+                    click.echo(f"No token found for: {', '.join(token_stats['missing'])}", err=True)
+        except Exception as e:
+            click.echo(f"Error during backfill: {e}", err=True)
+            run["status"] = "error"
+            return 1
+        finally:
+            crawler.close()
+            scraper.close()
 
 
 @cli.command()
 @click.option("--hours", "-h", default=1, type=int, help="Number of hours to look back")
 @click.option("--dryrun", "-d", is_flag=True, help="Run without making notifications or console output")
-def recent(hours, dryrun):
+@click.option("--incremental", is_flag=True, help="Only send tokens added since the last narrative, with its themes, to Claude")
+@click.option("--no-cluster", is_flag=True, help="Send every name and symbol to Claude instead of one entry per cluster of near-duplicates")
+@output_options
+def recent(hours, dryrun, incremental, no_cluster, output_mode, page_size):
     """Display tokens saved in the past specified hours"""
-    try:
-        click.echo(f"Getting recent tokens from the past {hours} hour(s)...")
-        narrative = TokenNarrative()
-        recent_tokens = narrative.get_recent_tokens(hours)
-        if recent_tokens:
-            click.echo(f"\nFound {len(recent_tokens)} tokens in the past {hours} hour(s):")
-            display_tokens(recent_tokens)
-            current_narrative = narrative.get_current_narrative_from_tokens(recent_tokens, 3)
-            click.echo(f"\nCurrent narrative: {current_narrative}")
+    with metrics.run("recent") as run:
+        try:
+            click.echo(f"Getting recent tokens from the past {hours} hour(s)...")
+            narrative = TokenNarrative(db_manager=db_manager)
+            # Stream rows straight to the display, keeping only the fields the narrative needs.
+            # Tables can't show more than those for saved tokens, so only JSON lines read every column.
+            recent_tokens = []
+
+            def collect(rows):
+                for row in rows:
+                    recent_tokens.append({column: row[column] for column in NARRATIVE_COLUMNS})
+                    yield row
+
+            rows = collect(narrative.iter_recent_tokens(hours, columns=None if output_mode == "jsonl" else NARRATIVE_COLUMNS))
+            display_tokens(rows, mode=output_mode, page_size=page_size)
+            for _ in rows:  # "none" doesn't read the rows
+                pass
+            if recent_tokens:
+                click.echo(f"\nFound {len(recent_tokens)} tokens in the past {hours} hour(s)")
+                current_narrative = narrative.get_current_narrative_from_tokens(recent_tokens, 3, incremental=incremental, cluster=not no_cluster)
+                click.echo(f"\nCurrent narrative: {current_narrative}")
+                if not dryrun:
+                    announcer.announce_narrative(current_narrative)
+                    cast_worker.drain()
+            else:
+                click.echo(f"No tokens found in the past {hours} hour(s)")
+        except Exception as e:
             if not dryrun:
-                announcer.announce_narrative(current_narrative)
-        else:
-            click.echo(f"No tokens found in the past {hours} hour(s)")
-    except Exception as e:
-        if not dryrun:
-            click.echo(f"Error retrieving recent tokens: {e}", err=True)
-        return 1
+                click.echo(f"Error retrieving recent tokens: {e}", err=True)
+            run["status"] = "error"
+            return 1
+
+
+@cli.command()
+@click.option("--drain", is_flag=True, help="Post any queued casts that are due")
+@click.option("--timeout", default=300, type=int, help="Seconds to spend draining the queue")
+def casts(drain, timeout):
+    """Show the outbound cast queue, optionally posting what's pending"""
+    if drain:
+        cast_worker.drain(timeout=timeout)
+    stats = cast_queue.stats()
+    counts = stats["counts"]
+    click.echo(f"Pending: {counts.get('pending', 0)}, sending: {counts.get('sending', 0)}, posted: {counts.get('posted', 0)}, failed: {counts.get('failed', 0)}")
+    if stats["avg_latency"] is not None:
+        click.echo(f"Enqueue-to-posted latency: avg {stats['avg_latency']:.1f}s, max {stats['max_latency']:.1f}s")
+
+
+@cli.command()
+@click.option("--days", default=7, type=int, help="Number of days to summarize")
+def stats(days):
+    """Show Claude token usage, cost and latency per day"""
+    rows = db_manager.get_llm_usage_by_day(time.time() - days * 86400)
+    if not rows:
+        click.echo(f"No Claude calls recorded in the past {days} day(s)")
+        return
+
+    click.echo(f"{'day':<10} {'model':<28} {'calls':>5} {'input':>9} {'output':>8} {'cache rd':>9} {'cache wr':>9} {'hit %':>6} {'cost $':>8} {'avg s':>6} {'max s':>6}")
+    total_cost = 0.0
+    for row in rows:
+        cost = estimate_cost(row["model"], row["input_tokens"], row["output_tokens"], row["cache_write_tokens"], row["cache_read_tokens"])
+        total_cost += cost or 0
+        prompt_tokens = row["input_tokens"] + row["cache_read_tokens"] + row["cache_write_tokens"]
+        hit_rate = row["cache_read_tokens"] / prompt_tokens * 100 if prompt_tokens else 0
+        click.echo(
+            f"{row['day']:<10} {row['model'][:28]:<28} {row['calls']:>5} {row['input_tokens']:>9} {row['output_tokens']:>8} "
+            f"{row['cache_read_tokens']:>9} {row['cache_write_tokens']:>9} {hit_rate:>6.1f} {cost if cost is not None else float('nan'):>8.4f} "
+            f"{row['avg_latency']:>6.2f} {row['max_latency']:>6.2f}"
+        )
+    click.echo(f"Total estimated cost: ${total_cost:.4f}")
+
+
+# Upper bounds (seconds) of the delay buckets shown by the latency report
+LATENCY_BUCKETS = [(60, "<1m"), (5 * 60, "1-5m"), (15 * 60, "5-15m"), (60 * 60, "15-60m"), (float("inf"), ">1h")]
+
+
+def format_delay(seconds):
+    """Render a delay in seconds as e.g. 45s, 3m05s or 2h10m"""
+    seconds = max(0, int(round(seconds)))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+@cli.command()
+@click.option("--hours", "-h", default=24, type=int, help="Number of hours of detected tokens to include")
+def latency(hours):
+    """Show how long after launch tokens were detected and alerted"""
+    rows = db_manager.get_token_latencies(time.time() - hours * 3600)
+    if not rows:
+        click.echo(f"No tokens with a known launch time detected in the past {hours} hour(s)")
+        return
+
+    delays = {
+        "launch -> detection": [row["detected_at"] - row["launched_at"] for row in rows],
+        "launch -> alert": [row["announced_at"] - row["launched_at"] for row in rows if row["announced_at"] is not None],
+        "detection -> alert": [row["announced_at"] - row["detected_at"] for row in rows if row["announced_at"] is not None],
+    }
+    click.echo(f"{len(rows)} tokens detected in the past {hours} hour(s), launch times resolved to the listing's precision (e.g. the minute)")
+    click.echo(f"{'':<20} {'tokens':>6} {'p50':>7} {'p90':>7} {'p95':>7} {'max':>7}  " + " ".join(f"{label:>6}" for _, label in LATENCY_BUCKETS))
+    for label, samples in delays.items():
+        if not samples:
+            click.echo(f"{label:<20} {0:>6}")
+            continue
+        ordered = sorted(samples)
+        quantiles = [ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))] for q in (0.5, 0.9, 0.95)]
+        buckets = [0] * len(LATENCY_BUCKETS)
+        for delay in ordered:
+            buckets[next(i for i, (bound, _) in enumerate(LATENCY_BUCKETS) if delay < bound)] += 1
+        click.echo(
+            f"{label:<20} {len(ordered):>6} " + " ".join(f"{format_delay(value):>7}" for value in quantiles + [ordered[-1]]) + "  " + " ".join(f"{count:>6}" for count in buckets)
+        )
+
+
+@cli.command()
+@click.option("--hours", "-h", default=24, type=int, help="Number of hours of saved tokens to replay the rules over")
+@click.option("--file", "rules_file", default=ALERT_RULES_FILE, help="Alert rules file to evaluate (the built-in rules if it doesn't exist)")
+def rules(hours, rules_file):
+    """Replay alert rules over saved tokens and show how often each rule and condition fires"""
+    try:
+        engine = AlertRuleEngine.load(rules_file)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--file")
+
+    columns = ("name", "symbol", "creator_username", "creator_follower_count", "creator_neynar_score")
+    facts = [
+        token_facts(row, {"username": row["creator_username"], "follower_count": row["creator_follower_count"], "neynar_score": row["creator_neynar_score"]})
+        for row in db_manager.iter_tokens_since(datetime.now() - timedelta(hours=hours), columns=columns)
+    ]
+    if not facts:
+        click.echo(f"No tokens saved in the past {hours} hour(s)")
+        return
+
+    decisions = engine.evaluate_many(facts)
+    click.echo(f"{engine.source}: {sum(decision.alert for decision in decisions)} of {len(facts)} tokens from the past {hours} hour(s) would be announced")
+    click.echo(f"{'rule':<24} {'action':<6} {'evaluated':>9} {'matched':>8}  rejected by")
+    for rule in engine.rule_stats():
+        rejected = ", ".join(f"{condition} {count}" for condition, count in rule["rejected"].items() if count) or "-"
+        click.echo(f"{rule['name'][:24]:<24} {rule['action']:<6} {rule['evaluated']:>9} {rule['matched']:>8}  {rejected}")
+
+
+@cli.command()
+@click.option("--table", "tables", multiple=True, type=click.Choice(list(DatabaseManager.EXPORT_TABLES)), help="Table to export (repeatable, defaults to all of them)")
+@click.option("--format", "-f", "fmt", type=click.Choice(EXPORT_FORMATS), default="parquet", help="File format (parquet and arrow need pyarrow, csv is gzipped)")
+@click.option("--output-dir", "-o", default="exports", type=click.Path(file_okay=False), help="Directory the files are written to")
+@click.option("--since", "since_value", help="Only rows saved since: an age like 24h or 3d, or a date like 2024-12-01")
+@click.option("--until", "until_value", help="Only rows saved before: an age like 1h, or a date like 2024-12-31")
+@click.option("--incremental", is_flag=True, help="Only rows saved since the last incremental export, and move its watermark")
+@click.option("--reset", is_flag=True, help="With --incremental, forget the watermarks and export everything again")
+@click.option("--chunk-size", default=5000, type=int, help="Rows read and written at a time")
+@click.option("--settle", default=300, type=int, help="With --incremental, seconds a row must age before it's exported")
+def export(tables, fmt, output_dir, since_value, until_value, incremental, reset, chunk_size, settle):
+    """Stream saved tokens, creator details and themes to Parquet, Arrow or gzipped CSV files"""
+    bounds = {}
+    for name, value in (("since", since_value), ("until", until_value)):
+        try:
+            bounds[name] = parse_since(value) if value else None
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint=f"--{name}")
+    try:
+        exporter = TableExporter(db_manager, output_dir=output_dir, fmt=fmt, chunk_size=chunk_size, settle=settle)
+    except ImportError as e:
+        raise click.BadParameter(str(e), param_hint="--format")
+
+    tables = tables or list(DatabaseManager.EXPORT_TABLES)
+    if incremental and reset:
+        for table in tables:
+            db_manager.delete_watermark(exporter.watermark_name(table))
+    with metrics.run("export") as run:
+        try:
+            for table in tables:
+                stats = exporter.export_table(table, since=bounds["since"], until=bounds["until"], incremental=incremental)
+                if stats["path"]:
+                    click.echo(f"{table}: {stats['rows']} rows in {stats['chunks']} chunk(s) -> {stats['path']}")
+                else:
+                    click.echo(f"{table}: nothing to export")
+        except Exception as e:
+            click.echo(f"Error during export: {e}", err=True)
+            run["status"] = "error"
+            return 1
 
 
 def main():
@@ -151,6 +629,7 @@ def main():
     if len(sys.argv) == 1:
         # No arguments provided (debug mode)
         check_clanker(verbose=True)
+        cast_worker.drain()
     else:
         # Normal CLI mode
         cli()
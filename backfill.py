@@ -0,0 +1,240 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterable, List
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+import click
+from database import DatabaseManager
+from fetch_backends import FetchBackend, create_fetch_backend
+from metrics import metrics
+from models import Token
+from scraper import LOOKUP_FOUND, ClankerScraper, creator_details_from_token
+
+_RELATIVE_SINCE = re.compile(r"^(\d+)\s*([mhdw])$")
+_SINCE_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def parse_since(value: str, now: float | None = None) -> float:
+    """
+    Turn a --since value into epoch seconds
+
+    Args:
+        value: A relative age such as "90m", "24h", "3d" or "2w", or an ISO date or datetime (local time)
+        now: Reference time for relative ages, defaults to the current time
+
+    Returns:
+        float: Epoch seconds
+    """
+    now = now if now is not None else time.time()
+    match = _RELATIVE_SINCE.match(value.strip().lower())
+    if match:
+        return now - int(match.group(1)) * _SINCE_UNITS[match.group(2)]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise ValueError(f"Can't parse --since value {value!r}; use e.g. 24h, 3d or 2024-12-01") from None
+
+
+def page_url(url: str, page: int, page_param: str = "page") -> str:
+    """The listing URL for a given page number, keeping any query the URL already has"""
+    parts = urlparse(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query) if key != page_param]
+    if page > 1:
+        query.append((page_param, str(page)))
+    return urlunparse(parts._replace(query=urlencode(query)))
+
+
+class BackfillCrawler:
+    """
+    Recovers launches the live poll missed by crawling older listing pages and individual token pages.
+
+    Pages are fetched by a bounded pool of workers, each with its own fetch backend (so each
+    Selenium worker drives its own browser). Tokens are saved through DatabaseManager's upsert, so
+    crawling the same page twice is harmless. Listing progress is checkpointed in the watermarks
+    table as the highest page up to which every page has been saved, so an interrupted crawl
+    resumes where it stopped. New launches push older tokens onto later pages while a crawl is
+    paused, which only makes the resumed crawl see some tokens twice.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, scraper: ClankerScraper, backend: str = "http", workers: int = 4, enrich: bool = False, concurrency: int = 8, verbose: bool = False):
+        """
+        Args:
+            db_manager: Database the tokens are saved to
+            scraper: Parses pages and, with `enrich`, looks up creators (its own fetch backend isn't used)
+            backend: Fetch backend name each worker creates ("selenium", "http" or "auto")
+            workers: Pages fetched at once
+            enrich: Also look up and save creator details (no alerts are sent for backfilled tokens)
+            concurrency: Concurrent Neynar lookups per page when enriching
+            verbose: Enable verbose output
+        """
+        self.db_manager = db_manager
+        self.scraper = scraper
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.enrich = enrich
+        self.concurrency = concurrency
+        self.verbose = verbose
+        self._local = threading.local()
+        self._backends: List[FetchBackend] = []
+        self._backends_lock = threading.Lock()
+
+    def _fetch(self, url: str) -> str:
+        """Fetch a page with the calling worker's own backend, creating it on first use"""
+        backend = getattr(self._local, "backend", None)
+        if backend is None:
+            backend = create_fetch_backend(self.backend, verbose=self.verbose, persistent=True)
+            self._local.backend = backend
+            with self._backends_lock:
+                self._backends.append(backend)
+        with metrics.span("backfill.fetch"):
+            return backend.fetch(url)
+
+    def _save(self, tokens: List[Token], detected_at: float) -> int:
+        """Upsert tokens, plus their creator details and lookup outcomes when enriching"""
+        creator_details = []
+        lookups = []
+        if self.enrich and tokens:
+            for token in self.scraper.format_token_dicts(tokens, max_workers=self.concurrency):
+                lookups.append((token["contract_address"], token["creator_lookup"]))
+                # A failed lookup would overwrite details saved earlier with zeros
+                if token["creator_lookup"] == LOOKUP_FOUND:
+                    creator_details.append((token["contract_address"], creator_details_from_token(token)))
+        with self.db_manager.transaction():
+            saved = self.db_manager.save_tokens_bulk(tokens, detected_at=detected_at)
+            self.db_manager.add_creator_details_bulk(creator_details)
+            self.db_manager.set_creator_lookups_bulk(lookups)
+        return saved
+
+    def _crawl_page(self, url: str, since: float) -> Dict:
+        """Fetch, parse and save one listing page, keeping tokens launched since `since`"""
+        html_content = self._fetch(url)
+        fetched_at = time.time()
+        tokens = self.scraper.parse_clanker_page(html_content, fetched_at=fetched_at)
+        # Tokens without a parseable launch time are kept; an upsert of an old one costs nothing
+        kept = [token for token in tokens if token.launched_at is None or token.launched_at >= since]
+        launched = [token.launched_at for token in tokens if token.launched_at is not None]
+        return {
+            "addresses": {token.contract_address for token in tokens},
+            "saved": self._save(kept, fetched_at),
+            "oldest": min(launched) if launched else None,
+        }
+
+    def crawl_listing(self, url: str, since: float, max_pages: int = 100, page_param: str = "page", resume: bool = True) -> Dict:
+        """
+        Crawl listing pages from newest to oldest until one only has tokens launched before `since`
+
+        Also stops at an empty page, at a page that fails to load (the next run retries it), at
+        `max_pages`, or when page 2 repeats page 1 (the listing ignores `page_param`).
+
+        Args:
+            url: Listing URL (page 1)
+            since: Epoch seconds; older tokens are skipped
+            max_pages: Last page number to crawl
+            page_param: Query parameter selecting the page
+            resume: Continue from the checkpoint of an interrupted crawl of `url` back to at least `since`
+
+        Returns:
+            dict: pages crawled, tokens saved, the checkpointed page, and whether the crawl reached `since`
+        """
+        checkpoint_name = f"backfill:{url}"
+        checkpoint = json.loads(self.db_manager.get_watermark(checkpoint_name) or "null") if resume else None
+        # Only an interrupted crawl is resumed, and only if its cutoff reaches at least as far back as this one.
+        # A finished crawl says nothing about launches missed since, so the next one starts from page 1.
+        if checkpoint and not checkpoint["complete"] and checkpoint["since"] <= since:
+            done_through = checkpoint["page"]
+            since = checkpoint["since"]
+            click.echo(f"Resuming backfill of {url} after page {done_through}")
+        else:
+            done_through = 0
+
+        stats = {"pages": 0, "saved": 0, "checkpoint": done_through, "complete": False}
+        completed = set()
+        first_page_addresses = None
+        next_page = done_through + 1
+        stop = False
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as executor:
+            pending = {}
+            while pending or (not stop and next_page <= max_pages):
+                while not stop and next_page <= max_pages and len(pending) < self.workers:
+                    pending[executor.submit(self._crawl_page, page_url(url, next_page, page_param), since)] = next_page
+                    next_page += 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        click.echo(f"Backfill page {page} failed, stopping there: {e}", err=True)
+                        metrics.increment("backfill_page_errors")
+                        stop = True
+                        continue
+
+                    stats["pages"] += 1
+                    stats["saved"] += result["saved"]
+                    metrics.increment("backfill_pages")
+                    metrics.increment("backfill_tokens_saved", result["saved"])
+                    completed.add(page)
+                    if self.verbose:
+                        click.echo(f"Page {page}: {len(result['addresses'])} tokens, saved {result['saved']}")
+
+                    if page == 1:
+                        first_page_addresses = result["addresses"]
+                    if not result["addresses"] or (result["oldest"] is not None and result["oldest"] < since):
+                        stats["complete"] = True
+                        stop = True
+                    elif page == 2 and result["addresses"] == first_page_addresses:
+                        click.echo(f"Page 2 of {url} repeats page 1; the listing doesn't seem to support ?{page_param}=", err=True)
+                        stop = True
+
+                # Only checkpoint through the pages that are all saved, so nothing in between is skipped on resume
+                while stats["checkpoint"] + 1 in completed:
+                    stats["checkpoint"] += 1
+                complete = stats["complete"] and stats["checkpoint"] == max(completed)
+                self.db_manager.set_watermark(checkpoint_name, json.dumps({"page": stats["checkpoint"], "since": since, "complete": complete}))
+
+        if stats["complete"]:
+            click.echo(f"Reached tokens launched before {datetime.fromtimestamp(since).isoformat()} after page {stats['checkpoint']}")
+        return stats
+
+    def crawl_tokens(self, addresses: Iterable[str], base_url: str) -> Dict:
+        """
+        Fetch individual token pages (base_url/<address>) and save the token card each one shows
+
+        Returns:
+            dict: pages fetched, tokens saved, and the addresses whose page couldn't be loaded or had no matching card
+        """
+        addresses = list(dict.fromkeys(addresses))
+        stats = {"pages": 0, "saved": 0, "missing": []}
+
+        def crawl(address):
+            html_content = self._fetch(f"{base_url.rstrip('/')}/{address}")
+            fetched_at = time.time()
+            tokens = [token for token in self.scraper.parse_clanker_page(html_content, fetched_at=fetched_at) if token.contract_address.lower() == address.lower()]
+            return self._save(tokens[:1], fetched_at)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as executor:
+            for address, future in [(address, executor.submit(crawl, address)) for address in addresses]:
+                try:
+                    saved = future.result()
+                except Exception as e:
+                    click.echo(f"Token page for {address} failed: {e}", err=True)
+                    saved = 0
+                else:
+                    stats["pages"] += 1
+                stats["saved"] += saved
+                if not saved:
+                    stats["missing"].append(address)
+        metrics.increment("backfill_tokens_saved", stats["saved"])
+        return stats
+
+    def close(self) -> None:
+        """Close every worker's fetch backend"""
+        with self._backends_lock:
+            backends, self._backends = self._backends, []
+        for backend in backends:
+            backend.close()
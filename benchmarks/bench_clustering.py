@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Measure how much local clustering shrinks the token list sent to Claude by `recent`.
+
+Uses the last `--hours` of tokens from a tokens.db when `--db` is given, otherwise synthetic
+windows with Clanker-like repetition. Input tokens are estimated at four characters per token.
+
+    python benchmarks/bench_clustering.py --sizes 200,1000,5000
+    python benchmarks/bench_clustering.py --db tokens.db --hours 24
+"""
+
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fixtures import synthetic_token_window  # noqa: E402
+from token_clustering import TokenClusters  # noqa: E402
+
+
+def unclustered_list(tokens):
+    """The list analyze_tokens received before clustering: every name, then every symbol"""
+    return ",".join([token["name"] for token in tokens] + [token["symbol"] for token in tokens])
+
+
+def measure(label, tokens, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clusters = TokenClusters(tokens)
+        prompt = clusters.prompt_list()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    before = unclustered_list(tokens)
+    reduction = 1 - len(prompt) / len(before) if before else 0
+    click.echo(
+        f"{label:>14} {len(tokens):>8} {len(clusters.clusters):>9} {len(before) // 4:>12} {len(prompt) // 4:>11} {reduction:>9.0%} {statistics.median(samples):>10.1f}"
+    )
+
+
+@click.command()
+@click.option("--sizes", default="200,1000,5000", help="Comma-separated synthetic window sizes")
+@click.option("--db", "db_path", default=None, help="Read a real window from this tokens.db instead")
+@click.option("--hours", default=1, type=int, help="Window length when reading from --db")
+@click.option("--repeat", default=5, type=int, help="Timed runs per window")
+def main(sizes, db_path, hours, repeat):
+    """Benchmark token clustering against the unclustered prompt list"""
+    click.echo(f"{'window':>14} {'tokens':>8} {'clusters':>9} {'~in before':>12} {'~in after':>11} {'saved':>9} {'ms':>10}")
+    if db_path:
+        from database import DatabaseManager
+
+        db_manager = DatabaseManager(db_path)
+        tokens = db_manager.get_tokens_since(datetime.now() - timedelta(hours=hours))
+        db_manager.close()
+        measure(f"last {hours}h", tokens, repeat)
+        return
+
+    for size in (int(s) for s in sizes.split(",")):
+        measure(f"synthetic-{size}", synthetic_token_window(size), repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Measure time-window and creator query latency before and after the schema migrations.
+
+For each table size a synthetic tokens.db is built with the original, version 0 schema and
+launches spread over the last 30 days, the queries are timed, and then the file is reopened with
+DatabaseManager so every migration upgrades it in place and the queries are timed again.
+
+    python benchmarks/bench_db_queries.py --sizes 10000,100000,1000000
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import DatabaseManager, SCHEMA_MIGRATIONS  # noqa: E402
+
+CREATORS = 5000
+
+
+class UnmigratedDatabaseManager(DatabaseManager):
+    """Opens the database without applying migrations, so the old schema is what gets measured"""
+
+    def migrate(self):
+        pass
+
+
+def populate(db_path, rows):
+    """Fill a fresh, unmigrated database with `rows` tokens, creator details and themes"""
+    UnmigratedDatabaseManager(db_path).close()
+    now = datetime.now(timezone.utc)
+    rng = random.Random(42)
+
+    conn = sqlite3.connect(db_path)
+    batch_size = 50000
+    for start in range(0, rows, batch_size):
+        tokens, creators, themes = [], [], []
+        for i in range(start, min(start + batch_size, rows)):
+            address = f"0x{i:040x}"
+            created_at = (now - timedelta(seconds=rng.randint(0, 30 * 24 * 3600))).strftime("%Y-%m-%d %H:%M:%S")
+            username = f"creator{rng.randrange(CREATORS)}"
+            tokens.append(
+                (
+                    address,
+                    f"Token {i}",
+                    f"TKN{i}",
+                    "1m ago",
+                    username,
+                    f"https://warpcast.com/{username}",
+                    f"https://img.example/{i}.png",
+                    f"https://dexscreener.com/base/{address}",
+                    f"https://basescan.org/token/{address}",
+                    f"https://www.clanker.world/clanker/{address}",
+                    created_at,
+                )
+            )
+            creators.append((address, username, "", rng.randint(0, 50000), rng.random()))
+            if i % 10 == 0:
+                themes.append((f"Theme {i % 997}", f"TKN{i}", created_at))
+        conn.executemany(
+            """
+            INSERT INTO tokens (
+                contract_address, name, symbol, time_ago, creator_name, creator_link,
+                image_url, dexscreener_url, basescan_url, clanker_url, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            tokens,
+        )
+        conn.executemany(
+            "INSERT INTO creator_details (contract_address, username, eth_addresses, follower_count, neynar_score) VALUES (?, ?, ?, ?, ?)",
+            creators,
+        )
+        conn.executemany("INSERT OR REPLACE INTO themes (theme_name, symbol, created_at) VALUES (?, ?, ?)", themes)
+        conn.commit()
+    conn.close()
+
+
+def time_queries(db_manager, repeat):
+    """Return median latency in ms for each benchmarked query"""
+    # created_at holds SQLite CURRENT_TIMESTAMP strings (UTC), so compare against the same format
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%d %H:%M:%S")
+    day_cutoff = (datetime.now(timezone.utc) - timedelta(hours=24)).strftime("%Y-%m-%d %H:%M:%S")
+    usernames = [f"creator{i}" for i in range(repeat)]
+    queries = {
+        "recent --hours 1": lambda i: db_manager.get_tokens_since(cutoff),
+        "recent --hours 24": lambda i: db_manager.get_tokens_since(day_cutoff),
+        "24h name+symbol": lambda i: sum(1 for _ in db_manager.iter_tokens_since(day_cutoff, columns=("name", "symbol"))),
+        "creator lookup": lambda i: db_manager.get_tokens_by_creator(usernames[i]),
+        "themes last hour": lambda i: db_manager.get_themes_since(cutoff),
+    }
+    results = {}
+    for name, query in queries.items():
+        samples = []
+        for i in range(repeat):
+            started = time.perf_counter()
+            query(i)
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+@click.command()
+@click.option("--sizes", default="10000,100000,1000000", help="Comma-separated token counts to benchmark")
+@click.option("--repeat", default=20, type=int, help="Timed runs per query")
+def main(sizes, repeat):
+    """Benchmark query latency with and without the schema migration indexes"""
+    click.echo(f"Schema version after migrations: {SCHEMA_MIGRATIONS[-1][0]}")
+    click.echo(f"{'rows':>10}  {'query':<18} {'before (ms)':>12} {'after (ms)':>12} {'speedup':>8}")
+    for size in (int(s) for s in sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "tokens.db")
+            populate(db_path, size)
+
+            db_manager = UnmigratedDatabaseManager(db_path)
+            before = time_queries(db_manager, repeat)
+            db_manager.close()
+
+            started = time.perf_counter()
+            db_manager = DatabaseManager(db_path)
+            migrate_ms = (time.perf_counter() - started) * 1000
+            after = time_queries(db_manager, repeat)
+            db_manager.close()
+
+            for name in before:
+                speedup = before[name] / after[name] if after[name] else float("inf")
+                click.echo(f"{size:>10}  {name:<18} {before[name]:>12.2f} {after[name]:>12.2f} {speedup:>7.1f}x")
+            click.echo(f"{size:>10}  {'in-place upgrade':<18} {migrate_ms:>12.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Compare the HTML parser backends on recorded (or synthetic) Clanker listing pages.
+
+For each snapshot and backend this reports parse time per card, total parse time and peak
+memory, and checks that the Token list matches the BeautifulSoup backend exactly. Each
+backend runs in its own subprocess so peak RSS isn't polluted by the others.
+
+    python benchmarks/bench_parsers.py [snapshot.html ...]
+"""
+
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+import click
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fixtures import load_snapshots  # noqa: E402
+from html_parsers import PARSER_BACKENDS, create_parser_backend  # noqa: E402
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_backend(backend_name, html_path, repeat):
+    """Parse one snapshot with one backend; runs inside the child process"""
+    os.environ.setdefault("NEYNAR_API_KEY", "benchmark")
+    from scraper import ClankerScraper
+
+    with open(html_path, "r", encoding="utf-8") as f:
+        html_content = f.read()
+    # Relative launch times ("5m ago") resolve against the fetch time, so every backend must share one
+    # or each would stamp launched_at from its own clock and never match the reference
+    fetched_at = os.path.getmtime(html_path)
+
+    scraper = ClankerScraper(parser=create_parser_backend(backend_name))
+    baseline_mb = peak_rss_mb()
+
+    samples = []
+    tokens = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        tokens = scraper.parse_clanker_page(html_content, fetched_at=fetched_at)
+        samples.append(time.perf_counter() - started)
+
+    return {
+        "cards": len(tokens),
+        "median_ms": statistics.median(samples) * 1000,
+        "peak_mb": peak_rss_mb() - baseline_mb,
+        "tokens": [asdict(token) for token in tokens],
+    }
+
+
+@click.command()
+@click.argument("snapshots", nargs=-1, type=click.Path(exists=True))
+@click.option("--repeat", default=10, type=int, help="Timed parses per backend and snapshot")
+@click.option("--backends", default=",".join(PARSER_BACKENDS), help="Comma-separated parser backends to compare")
+@click.option("--child", hidden=True, nargs=2, type=str, default=None)
+def main(snapshots, repeat, backends, child):
+    """Benchmark parse time per card and peak memory for each parser backend"""
+    if child:
+        backend_name, html_path = child
+        click.echo(json.dumps(run_backend(backend_name, html_path, repeat)))
+        return
+
+    import tempfile
+
+    click.echo(f"{'snapshot':<24} {'backend':<11} {'cards':>6} {'ms/page':>9} {'us/card':>9} {'peak MB':>8}  identical")
+    for label, html_content in load_snapshots(snapshots):
+        with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False, encoding="utf-8") as f:
+            f.write(html_content)
+            html_path = f.name
+        try:
+            reference = None
+            for backend_name in backends.split(","):
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--repeat", str(repeat), "--child", backend_name, html_path],
+                    capture_output=True,
+                    text=True,
+                )
+                if proc.returncode != 0:
+                    click.echo(f"{label:<24} {backend_name:<11} failed: {proc.stderr.strip().splitlines()[-1]}")
+                    continue
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+                if reference is None:
+                    reference = result["tokens"]
+                identical = "yes" if result["tokens"] == reference else "NO"
+                per_card_us = result["median_ms"] * 1000 / result["cards"] if result["cards"] else 0
+                click.echo(f"{label:<24} {backend_name:<11} {result['cards']:>6} {result['median_ms']:>9.2f} {per_card_us:>9.1f} {result['peak_mb']:>8.1f}  {identical}")
+        finally:
+            os.unlink(html_path)
+
+
+if __name__ == "__main__":
+    main()
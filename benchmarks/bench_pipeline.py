@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+End-to-end offline benchmark of the check and recent pipelines.
+
+Starts local stub servers for the Clanker listing, Neynar and Anthropic (see stub_servers.py),
+points the app at them through CLANKER_URL, NEYNAR_BASE_URL and ANTHROPIC_BASE_URL, and runs
+everything against a throwaway tokens.db in a temporary directory:
+
+1. Recorded snapshots in benchmarks/snapshots/ (or synthetic pages) are replayed through
+   ClankerScraper.parse_clanker_page.
+2. `check_clanker` is run for `--cycles` polls over the HTTP fetch backend, with queued casts
+   drained after each poll as `app.py check` does.
+3. The `recent` command analyzes everything saved and announces the narrative.
+
+It reports throughput, p50/p95/p99 latency per stage and peak RSS. Desktop notifications are
+switched off for the run.
+
+    python benchmarks/bench_pipeline.py --cycles 20 --neynar-latency 0.05 --error-rate 0.02
+"""
+
+import contextlib
+import functools
+import io
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import click
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+from fixtures import load_snapshots  # noqa: E402
+from stub_servers import FakeAnthropicHandler, FakeClankerHandler, FakeNeynarHandler, StubServer, stub_handler  # noqa: E402
+
+
+class StageTimer:
+    """Collects wall-clock samples per stage from wrapped callables (thread-safe)"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, owner, attribute, stage):
+        """Replace owner.attribute with a version that records how long each call takes"""
+        original = getattr(owner, attribute)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        setattr(owner, attribute, timed)
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def report(timer):
+    click.echo(f"\n{'stage':<36} {'calls':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, samples in sorted(timer.samples.items()):
+        click.echo(
+            f"{stage:<36} {len(samples):>7} {sum(samples):>9.2f} {percentile(samples, 50) * 1000:>9.1f} "
+            f"{percentile(samples, 95) * 1000:>9.1f} {percentile(samples, 99) * 1000:>9.1f} {max(samples) * 1000:>9.1f}"
+        )
+
+
+@click.command()
+@click.option("--cycles", default=10, type=int, help="check_clanker polls to run")
+@click.option("--cards", default=50, type=int, help="Cards per synthetic listing page")
+@click.option("--new-per-cycle", default=5, type=int, help="New cards appearing on each synthetic poll")
+@click.option("--parser", "parser_name", default="bs4", help="Parser backend for the scraper")
+@click.option("--concurrency", default=8, type=int, help="Concurrent Neynar lookups per poll")
+@click.option("--incremental", is_flag=True, help="Poll in incremental mode")
+@click.option("--skip-unchanged", is_flag=True, help="Skip unchanged polls and cards, as check and watch do by default")
+@click.option("--profile-ttl", default=6 * 3600, type=int, help="Creator profile cache TTL (0 disables the cache)")
+@click.option("--clanker-latency", default=0.0, type=float, help="Stub listing response delay in seconds")
+@click.option("--neynar-latency", default=0.02, type=float, help="Stub Neynar response delay in seconds")
+@click.option("--anthropic-latency", default=0.5, type=float, help="Stub Anthropic response delay in seconds")
+@click.option("--alert-share", default=0.05, type=float, help="Share of stub creators that qualify for an alert")
+@click.option("--error-rate", default=0.0, type=float, help="Share of stub responses that are 503s")
+@click.option("--snapshots/--synthetic", "use_snapshots", default=False, help="Serve recorded snapshots instead of synthetic pages")
+@click.option("--parse-repeat", default=20, type=int, help="Timed parses per snapshot")
+@click.option("--output-mode", default="table", help="How check and recent print tokens (table, stream, jsonl or none)")
+@click.option("--alert-rules", type=click.Path(exists=True, dir_okay=False), help="Alert rules file to poll with (the built-in rules otherwise)")
+def main(cycles, cards, new_per_cycle, parser_name, concurrency, incremental, skip_unchanged, profile_ttl, clanker_latency, neynar_latency, anthropic_latency, alert_share, error_rate, use_snapshots, parse_repeat, output_mode, alert_rules):
+    """Benchmark check and recent end to end against local stub servers"""
+    snapshots = load_snapshots()
+    clanker = StubServer(
+        stub_handler(
+            FakeClankerHandler, clanker_latency, error_rate, seed=1, cards=cards, new_per_request=new_per_cycle, snapshots=snapshots if use_snapshots else []
+        )
+    ).start()
+    neynar = StubServer(stub_handler(FakeNeynarHandler, neynar_latency, error_rate, seed=2, alert_share=alert_share)).start()
+    anthropic = StubServer(stub_handler(FakeAnthropicHandler, anthropic_latency, error_rate, seed=3)).start()
+
+    os.environ.update(
+        {
+            "CLANKER_URL": f"{clanker.url}/clanker",
+            "NEYNAR_BASE_URL": f"{neynar.url}/v2/farcaster",
+            "NEYNAR_API_KEY": "bench",
+            "NEYNAR_SIGNER_UUID": "bench",
+            "ANTHROPIC_BASE_URL": anthropic.url,
+            "ANTHROPIC_API_KEY": "bench",
+            "CAST_POSTS_PER_MINUTE": "0",
+            "ALERT_RULES_FILE": os.path.abspath(alert_rules) if alert_rules else "",
+        }
+    )
+
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name)  # app.py opens tokens.db relative to the working directory
+
+    import app
+    from anthropic_api import TokenAnalyzer
+    from database import DatabaseManager
+    from neynar_api import NeynarAPIManager
+
+    timer = StageTimer()
+    app.announcer.send_mac_notification = lambda *args, **kwargs: None
+    timer.wrap(NeynarAPIManager, "get_user_by_username", "neynar.get_user_by_username")
+    timer.wrap(NeynarAPIManager, "post_cast", "neynar.post_cast")
+    timer.wrap(DatabaseManager, "save_tokens_bulk", "db.save_tokens_bulk")
+    timer.wrap(DatabaseManager, "add_creator_details_bulk", "db.add_creator_details_bulk")
+    timer.wrap(TokenAnalyzer, "identify_themes", "anthropic.identify_themes")
+
+    scraper = app.create_scraper(False, "http", parser_name, profile_ttl=profile_ttl)
+    timer.wrap(scraper.fetch_backend, "fetch", "fetch")
+    timer.wrap(scraper.parser, "load", "parse.load")
+    timer.wrap(scraper.parser, "card_fields", "parse.card_fields")
+
+    click.echo(f"Replaying {len(snapshots)} page(s) through parse_clanker_page ({parser_name})...")
+    for label, html in snapshots:
+        for _ in range(parse_repeat):
+            with timer.span(f"parse_clanker_page[{label}]"):
+                scraper.parse_clanker_page(html)
+
+    click.echo(f"Running {cycles} check cycle(s) against {os.environ['CLANKER_URL']}...")
+    failed = 0
+    tokens_before = len(app.db_manager.get_all_tokens())
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        for _ in range(cycles):
+            with timer.span("check_clanker"):
+                failed += bool(app.check_clanker(scraper=scraper, url=os.environ["CLANKER_URL"], concurrency=concurrency, incremental=incremental, skip_unchanged=skip_unchanged, output_mode=output_mode))
+            with timer.span("cast_queue.drain"):
+                app.cast_worker.drain(timeout=60)
+    check_seconds = time.perf_counter() - started
+    scraper.close()
+    new_tokens = len(app.db_manager.get_all_tokens()) - tokens_before
+
+    click.echo("Running recent over everything saved...")
+    with contextlib.redirect_stdout(output), timer.span("recent"):
+        app.recent.callback(hours=24, dryrun=False, incremental=False, no_cluster=False, output_mode=output_mode, page_size=50)
+
+    queue = app.cast_queue.stats()
+    report(timer)
+    click.echo(f"\nChecks: {cycles} in {check_seconds:.2f}s ({cycles / check_seconds * 60:.1f}/min), {failed} failed")
+    click.echo(f"Tokens: {new_tokens} saved ({new_tokens / check_seconds:.1f}/s)")
+    click.echo(f"Casts: {queue['counts']}")
+    click.echo(app.alert_rules.summary())
+    if queue["avg_latency"] is not None:
+        click.echo(f"Cast enqueue-to-posted latency: avg {queue['avg_latency']:.2f}s, max {queue['max_latency']:.2f}s")
+    if timer.samples.get("check_clanker"):
+        click.echo(f"check_clanker mean: {statistics.mean(timer.samples['check_clanker']):.3f}s")
+    click.echo(f"Peak RSS: {peak_rss_mb():.1f} MB")
+
+    for server in (clanker, neynar, anthropic):
+        server.stop()
+    app.db_manager.close()
+    os.chdir(BENCH_DIR)
+    workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
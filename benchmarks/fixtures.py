@@ -0,0 +1,124 @@
+"""
+Synthetic Clanker listing pages for offline benchmarks.
+
+The markup mirrors the classes ClankerScraper.parse_clanker_page looks for. Recorded pages
+(`app.py check -v -o out.json` also writes the raw HTML to `out.json.html`) can be dropped into
+benchmarks/snapshots/ and are used in preference to these.
+"""
+
+import glob
+import html
+import os
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+
+
+def contract_address(i):
+    return f"0x{i:040x}"
+
+
+def render_token_card(i, minutes_ago=None, name=None, symbol=None):
+    """Render one token card the way the Clanker listing lays it out"""
+    address = contract_address(i)
+    minutes_ago = i % 60 if minutes_ago is None else minutes_ago
+    username = f"creator{i % 500}"
+    name = html.escape(name if name is not None else f"Token {i}")
+    symbol = html.escape(symbol if symbol is not None else f"TKN{i}")
+    return f"""
+    <div class="bg-white rounded-lg shadow-sm overflow-hidden hover:shadow-md transition-shadow">
+      <div class="flex items-start gap-4 p-4">
+        <div class="relative w-16 h-16 flex-shrink-0">
+          <img alt="{name}" class="w-full h-full object-cover rounded-md" src="https://img.clanker.example/{i}.png">
+        </div>
+        <div class="flex-1 min-w-0">
+          <div class="flex items-center justify-between">
+            <h2 class="text-lg font-semibold truncate">{name}</h2>
+            <span class="text-xs text-gray-400">{minutes_ago}m ago</span>
+          </div>
+          <p class="text-sm text-gray-500">{symbol}</p>
+          <div class="mt-2 text-sm">by <a class="text-blue-600 hover:underline" href="https://warpcast.com/{username}">{username}</a></div>
+          <p class="text-xs font-mono text-gray-600 break-all" title="{address}">{address[:6]}...{address[-4:]}</p>
+        </div>
+      </div>
+    </div>"""
+
+
+def render_token_cards(count, start=0, tokens=None, minutes_ago=None):
+    """Render cards start..start+count-1, newest (highest index) first; see render_clanker_page"""
+    return "".join(
+        render_token_card(
+            i,
+            minutes_ago=minutes_ago(i) if minutes_ago else None,
+            **({"name": tokens[i % len(tokens)]["name"], "symbol": tokens[i % len(tokens)]["symbol"]} if tokens else {}),
+        )
+        for i in range(start + count - 1, start - 1, -1)
+    )
+
+
+def render_clanker_page(count, start=0, tokens=None, minutes_ago=None, script=""):
+    """
+    Render a full listing page with `count` cards, newest (highest index) first
+
+    Args:
+        tokens: Optional name/symbol dicts (e.g. from synthetic_token_window), used for card i as tokens[i % len(tokens)]
+        minutes_ago: Optional function of the card index giving its "Xm ago" age
+        script: Optional JavaScript run by the page
+    """
+    cards = render_token_cards(count, start=start, tokens=tokens, minutes_ago=minutes_ago)
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="utf-8"><title>Clanker</title></head>
+<body>
+  <main class="container mx-auto px-4">
+    <div class="grid gap-4 md:grid-cols-2 lg:grid-cols-3">{cards}
+    </div>
+  </main>{f"<script>{script}</script>" if script else ""}
+</body>
+</html>"""
+
+
+def load_snapshots(paths=None, synthetic_sizes=(50, 500)):
+    """
+    Return (label, html) pairs to benchmark against.
+
+    Uses the given paths, else any recorded pages in benchmarks/snapshots/, else synthetic pages.
+    """
+    paths = list(paths or []) or sorted(glob.glob(os.path.join(SNAPSHOT_DIR, "*.html")))
+    if paths:
+        snapshots = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshots.append((os.path.basename(path), f.read()))
+        return snapshots
+    return [(f"synthetic-{size}", render_clanker_page(size)) for size in synthetic_sizes]
+
+
+THEME_WORDS = [
+    "Doge", "Pepe", "Based", "Clank", "Moon", "Frog", "Cat", "Degen", "Higher", "Bankr",
+    "Noodle", "Pizza", "Lambo", "Rocket", "Wizard", "Ape", "Banana", "Turbo", "Shiba", "Giga",
+]
+SUFFIXES = ["", " Inu", " AI", " on Base", " Coin", "2", " Classic", " DAO"]
+
+
+def synthetic_token_window(count, seed=0):
+    """
+    Token name/symbol dicts for one busy hour, with the repetition seen on Clanker
+
+    Most launches reuse a popular word with small variations in case, "$" prefixes, suffixes and
+    misspellings. The rest are one-off names.
+    """
+    import random
+
+    rng = random.Random(seed)
+    tokens = []
+    for i in range(count):
+        if rng.random() < 0.8:
+            word = rng.choice(THEME_WORDS)
+            name = word + rng.choice(SUFFIXES) + rng.choice(["", "", "", "s", "z", "zz"])
+            name = rng.choice([name, name.upper(), name.lower(), "$" + name])
+            symbol = "".join(part[0] for part in name.lstrip("$").split()).upper() if " " in name else name.lstrip("$").upper()[:8]
+        else:
+            name = f"Project {i}"
+            symbol = f"P{i}"
+        tokens.append({"name": name, "symbol": symbol})
+    return tokens
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for clanker.world, Neynar and Anthropic, for offline benchmarks and manual testing.
+
+Every stub takes a response latency and an error rate (the share of requests answered with a
+5xx), so slow or flaky upstreams can be reproduced.
+
+- FakeClanker serves the listing page. It replays recorded snapshots in turn, or renders a
+  synthetic page that gains `new_per_request` cards on every request. With `history` set it
+  instead serves a fixed listing of that many tokens, `minutes_per_token` apart, paginated by
+  ?page=N, with token pages at /clanker/<address>. With `live_every` set it serves a page that
+  adds a new card every `live_every` seconds by itself, fetching it from /clanker/live, for
+  `app.py watch --push`.
+- FakeNeynar answers GET .../user/by_username and POST .../cast. A fixed share of creators have
+  enough followers and a high enough score to trigger an alert.
+- FakeAnthropic answers POST /v1/messages the way TokenAnalyzer expects: a <themed_dictionary>
+  built from the prompt's token list, plus usage that mimics prompt caching. The prefix up to the
+  last block marked with cache_control is "written" the first time it is seen and "read" on later
+  calls within the cache TTL. Token counts are estimated at four characters per token.
+
+    python benchmarks/stub_servers.py anthropic --port 8765
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=fake python app.py recent --hours 24
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixtures import load_snapshots, render_clanker_page, render_token_cards, synthetic_token_window  # noqa: E402
+
+CACHE_TTL = 300
+MIN_CACHEABLE_TOKENS = 1024
+
+_TOKEN_LIST = re.compile(r"<token_list>\n(.*?)\n</token_list>", re.S)
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubServer:
+    """Runs a handler class on a background ThreadingHTTPServer"""
+
+    def __init__(self, handler_class, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler adding a fixed latency and a random 5xx error rate to every request"""
+
+    latency = 0.0
+    error_rate = 0.0
+    rng = random.Random(0)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode(), "application/json")
+
+    def _delay_or_fail(self):
+        """Sleep for the configured latency, then maybe answer with an error. Returns True if it did."""
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self._send_json(503, {"type": "error", "error": {"type": "overloaded_error", "message": "Injected failure"}})
+            return True
+        return False
+
+
+class FakeClankerHandler(StubHandler):
+    cards = 50
+    new_per_request = 5
+    snapshots = []
+    history = 0
+    minutes_per_token = 2
+    live_every = 0
+    tokens = synthetic_token_window(1000)
+    _requests = itertools.count()
+    _started = time.monotonic()
+
+    # Polls for cards launched since the page rendered and prepends them, like a live listing would
+    LIVE_SCRIPT = """
+let count = %d;
+setInterval(async () => {
+  const response = await fetch(location.pathname.replace(/\\/$/, "") + "/live?after=" + count);
+  const update = await response.json();
+  if (update.html) document.querySelector(".grid").insertAdjacentHTML("afterbegin", update.html);
+  count = update.count;
+}, 500);
+"""
+
+    def _live_page(self, url):
+        """The live listing, or (at /live) the cards launched since ?after=N as JSON"""
+        count = self.cards + int((time.monotonic() - self._started) / self.live_every)
+        if url.path.rstrip("/").endswith("/live"):
+            after = int(parse_qs(url.query).get("after", [count])[0])
+            return {"count": count, "html": render_token_cards(count - after, start=after, tokens=self.tokens) if count > after else ""}
+        return render_clanker_page(self.cards, start=count - self.cards, tokens=self.tokens, script=self.LIVE_SCRIPT % count)
+
+    def _history_page(self, url):
+        """A page of the fixed listing, or a single token's page"""
+        newest = self.history - 1
+
+        def ages(i):
+            return (newest - i) * self.minutes_per_token
+
+        address = url.path.rstrip("/").rsplit("/", 1)[-1]
+        if address.startswith("0x"):
+            i = int(address, 16)
+            return render_clanker_page(1, start=i, tokens=self.tokens, minutes_ago=ages) if i <= newest else None
+        page = int(parse_qs(url.query).get("page", ["1"])[0])
+        start = max(0, self.history - page * self.cards)
+        count = self.history - (page - 1) * self.cards - start
+        return render_clanker_page(count, start=start, tokens=self.tokens, minutes_ago=ages) if count > 0 else None
+
+    def do_GET(self):
+        if self._delay_or_fail():
+            return
+        request = next(self._requests)
+        if self.live_every:
+            page = self._live_page(urlparse(self.path))
+            if isinstance(page, dict):
+                self._send_json(200, page)
+                return
+        elif self.history:
+            page = self._history_page(urlparse(self.path))
+            if page is None:
+                self._send(404, b"Not found", "text/html; charset=utf-8")
+                return
+        elif self.snapshots:
+            page = self.snapshots[request % len(self.snapshots)][1]
+        else:
+            page = render_clanker_page(self.cards, start=request * self.new_per_request, tokens=self.tokens)
+        self._send(200, page.encode(), "text/html; charset=utf-8")
+
+
+class FakeNeynarHandler(StubHandler):
+    alert_share = 0.02
+
+    def _user(self, username):
+        # Deterministic per username, so cached and uncached runs see the same creators
+        bucket = zlib.crc32(username.encode()) % 10000 / 10000
+        notable = bucket < self.alert_share
+        return {
+            "user": {
+                "username": username,
+                "follower_count": 5000 + int(bucket * 100000) if notable else int(bucket * 2000),
+                "power_badge": notable,
+                "experimental": {"neynar_user_score": 0.97 if notable else round(bucket * 0.9, 2)},
+                "verified_addresses": {"eth_addresses": [f"0x{zlib.crc32(username.encode()):040x}"]},
+            }
+        }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith("/user/by_username"):
+            self._send_json(404, {"message": f"Unknown path {url.path}"})
+            return
+        if self._delay_or_fail():
+            return
+        self._send_json(200, self._user(parse_qs(url.query).get("username", [""])[0]))
+
+    def do_POST(self):
+        if not urlparse(self.path).path.endswith("/cast"):
+            self._send_json(404, {"message": f"Unknown path {self.path}"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._delay_or_fail():
+            return
+        self._send_json(200, {"success": True, "cast": {"hash": "0x" + hashlib.sha1(body).hexdigest(), "author": {"username": "stub"}}})
+
+
+class FakeAnthropicHandler(StubHandler):
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    @classmethod
+    def _cache_usage(cls, blocks):
+        """Split a prompt's estimated tokens into (uncached input, cache write, cache read)"""
+        texts = [block.get("text", "") for block in blocks]
+        breakpoint = max((i for i, block in enumerate(blocks) if block.get("cache_control")), default=-1)
+        prefix = "".join(texts[: breakpoint + 1])
+        rest = estimate_tokens("".join(texts[breakpoint + 1 :]))
+        prefix_tokens = len(prefix) // 4
+        if breakpoint < 0 or prefix_tokens < MIN_CACHEABLE_TOKENS:
+            return prefix_tokens + rest, 0, 0
+
+        key = hashlib.sha256(prefix.encode()).hexdigest()
+        now = time.monotonic()
+        with cls._cache_lock:
+            hit = cls._cache.get(key, 0) > now
+            cls._cache[key] = now + CACHE_TTL
+        return (rest, 0, prefix_tokens) if hit else (rest, prefix_tokens, 0)
+
+    @staticmethod
+    def _themes(blocks):
+        """Pair up the first entries of the token list into themes"""
+        match = _TOKEN_LIST.search("".join(block.get("text", "") for block in blocks))
+        entries = [entry for entry in (match.group(1).split(",") if match else []) if entry]
+        return {f"Stub theme {i // 2 + 1}": entries[i : i + 2] for i in range(0, min(len(entries), 12), 2)}
+
+    def do_POST(self):
+        if not self.path.startswith("/v1/messages"):
+            self._send_json(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if self._delay_or_fail():
+            return
+        blocks = [block for message in request["messages"] for block in message["content"]]
+        input_tokens, cache_write, cache_read = self._cache_usage(blocks)
+
+        text = "<themed_dictionary>\n" + json.dumps(self._themes(blocks), ensure_ascii=False, indent=4) + "\n</themed_dictionary>"
+        self._send_json(
+            200,
+            {
+                "id": "msg_stub",
+                "type": "message",
+                "role": "assistant",
+                "model": request["model"],
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "output_tokens": estimate_tokens(text),
+                    "cache_creation_input_tokens": cache_write,
+                    "cache_read_input_tokens": cache_read,
+                },
+            },
+        )
+
+
+def stub_handler(base, latency=0.0, error_rate=0.0, seed=0, **attrs):
+    """
+    A subclass of one of the stub handlers with its own settings and state
+
+    Args:
+        base: FakeClankerHandler, FakeNeynarHandler or FakeAnthropicHandler
+        latency: Seconds to wait before each response
+        error_rate: Share of requests answered with a 503
+        seed: Seed for the error injection
+        attrs: Handler-specific settings (e.g. cards, new_per_request, snapshots, alert_share)
+    """
+    state = {"rng": random.Random(seed), "_requests": itertools.count(), "_cache": {}, "_cache_lock": threading.Lock()}
+    return type(base.__name__.replace("Handler", ""), (base,), {"latency": latency, "error_rate": error_rate, **state, **attrs})
+
+
+def serve(handler, port, label):
+    server = StubServer(handler, port=port)
+    click.echo(f"{label} listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+def stub_options(func):
+    func = click.option("--error-rate", default=0.0, type=float, help="Share of requests answered with a 503")(func)
+    func = click.option("--latency", default=0.0, type=float, help="Seconds to wait before each response")(func)
+    return func
+
+
+@click.group()
+def cli():
+    """Run a stub API server in the foreground"""
+
+
+@cli.command()
+@click.option("--port", default=8765, type=int, help="Port to listen on")
+@stub_options
+def anthropic(port, latency, error_rate):
+    """Fake Anthropic Messages API with simulated prompt caching"""
+    serve(stub_handler(FakeAnthropicHandler, latency, error_rate), port, "Fake Anthropic API")
+
+
+@cli.command()
+@click.option("--port", default=8766, type=int, help="Port to listen on")
+@click.option("--alert-share", default=0.02, type=float, help="Share of creators that qualify for an alert")
+@stub_options
+def neynar(port, alert_share, latency, error_rate):
+    """Fake Neynar API (NEYNAR_BASE_URL=http://127.0.0.1:PORT/v2/farcaster)"""
+    serve(stub_handler(FakeNeynarHandler, latency, error_rate, alert_share=alert_share), port, "Fake Neynar API")
+
+
+@cli.command()
+@click.option("--port", default=8767, type=int, help="Port to listen on")
+@click.option("--cards", default=50, type=int, help="Cards per synthetic page")
+@click.option("--new-per-request", default=5, type=int, help="New cards on each synthetic page request")
+@click.option("--history", default=0, type=int, help="Serve a fixed, paginated listing of this many tokens instead")
+@click.option("--minutes-per-token", default=2, type=int, help="Minutes between launches in the --history listing")
+@click.option("--live-every", default=0, type=float, help="Serve a page that adds a card by itself every this many seconds instead")
+@click.argument("snapshots", nargs=-1, type=click.Path(exists=True))
+@stub_options
+def clanker(port, cards, new_per_request, history, minutes_per_token, live_every, snapshots, latency, error_rate):
+    """Fake Clanker listing (CLANKER_URL=http://127.0.0.1:PORT/clanker), replaying SNAPSHOTS if given"""
+    snapshots = load_snapshots(snapshots) if snapshots else []
+    handler = stub_handler(
+        FakeClankerHandler,
+        latency,
+        error_rate,
+        cards=cards,
+        new_per_request=new_per_request,
+        history=history,
+        minutes_per_token=minutes_per_token,
+        live_every=live_every,
+        _started=time.monotonic(),
+        snapshots=snapshots,
+    )
+    serve(handler, port, "Fake Clanker listing")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from typing import Optional
+import click
+import requests
+from database import DatabaseManager
+from metrics import metrics
+from neynar_api import NeynarAPIManager
+
+
+class CastQueue:
+    """Durable outbound queue of casts, stored in the outbound_casts table."""
+
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+
+    def enqueue(self, text: str, frame_url: Optional[str] = None, reply_to: Optional[str] = None, token_id: Optional[str] = None) -> int:
+        """
+        Queue a cast to be posted by a CastQueueWorker.
+
+        Args:
+            token_id: Announced token the cast alerts on, credited with the post time once it goes out
+
+        Returns:
+            int: ID of the queued cast
+        """
+        cast_id = self.db_manager.enqueue_cast(text, frame_url=frame_url, reply_to=reply_to, token_id=token_id)
+        metrics.increment("casts_queued")
+        click.echo(f"Queued cast {cast_id}")
+        return cast_id
+
+    def stats(self) -> dict:
+        """Cast counts by status and enqueue-to-posted latency"""
+        return self.db_manager.get_cast_queue_stats()
+
+
+class CastQueueWorker:
+    """
+    Posts queued casts through NeynarAPIManager, either on a background thread or by draining on demand.
+
+    Failed posts are retried with exponential backoff (plus jitter) up to `max_attempts`; client
+    errors other than 429 are not retried. Posts are spaced so no more than `posts_per_minute`
+    go out in total: each claim reserves its attempt time in the database, after the latest one
+    reserved by any worker, so overlapping processes and restarts share the limit.
+    """
+
+    def __init__(
+        self,
+        queue: CastQueue,
+        neynar: NeynarAPIManager,
+        posts_per_minute: float = 10,
+        max_attempts: int = 5,
+        base_backoff: float = 5,
+        max_backoff: float = 600,
+        poll_interval: float = 1,
+        stale_after: float = 300,
+    ):
+        """
+        Args:
+            queue: Queue to consume
+            neynar: Client used to post, sharing its pooled HTTP session
+            posts_per_minute: Maximum posting rate
+            max_attempts: Attempts before a cast is marked failed
+            base_backoff: Delay in seconds before the first retry, doubled on each further attempt
+            max_backoff: Upper bound on the retry delay
+            poll_interval: Seconds the background thread sleeps when nothing is due
+            stale_after: Seconds after which a cast stuck in 'sending' is put back in the queue
+        """
+        self.queue = queue
+        self.neynar = neynar
+        self.posts_per_minute = posts_per_minute
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _wait_for_rate_limit(self, attempted_at: float) -> None:
+        wait = attempted_at - time.time()
+        if wait > 0:
+            self._stop.wait(wait)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1))
+        return delay + random.uniform(0, delay * 0.1)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        return isinstance(error, requests.exceptions.RequestException)
+
+    def process_once(self) -> bool:
+        """
+        Post the next due cast, if any.
+
+        Returns:
+            bool: True if a cast was attempted, False if nothing was due
+        """
+        min_interval = 60 / self.posts_per_minute if self.posts_per_minute > 0 else 0
+        cast = self.queue.db_manager.claim_next_cast(min_interval=min_interval)
+        if cast is None:
+            return False
+
+        self._wait_for_rate_limit(cast["attempted_at"])
+        attempts = cast["attempts"] + 1
+        try:
+            response = self.neynar.post_cast(cast["text"], frame_url=cast["frame_url"], reply_to=cast["reply_to"])
+        except Exception as e:
+            if self._is_retryable(e) and attempts < self.max_attempts:
+                delay = self._backoff(attempts)
+                self.queue.db_manager.mark_cast_retry(cast["id"], str(e), time.time() + delay)
+                metrics.increment("casts_retried")
+                click.echo(f"Cast {cast['id']} failed (attempt {attempts}/{self.max_attempts}), retrying in {delay:.0f}s: {e}", err=True)
+            else:
+                self.queue.db_manager.mark_cast_failed(cast["id"], str(e))
+                metrics.increment("casts_failed")
+                click.echo(f"Cast {cast['id']} failed permanently after {attempts} attempt(s): {e}", err=True)
+            return True
+
+        posted_at = time.time()
+        cast_hash = (response.get("cast") or {}).get("hash") if isinstance(response, dict) else None
+        self.queue.db_manager.mark_cast_posted(cast["id"], cast_hash=cast_hash, posted_at=posted_at)
+        metrics.increment("casts_posted")
+        metrics.observe("cast_queue.enqueue_to_posted", posted_at - cast["enqueued_at"])
+        click.echo(f"Posted cast {cast['id']} {posted_at - cast['enqueued_at']:.1f}s after it was queued")
+        return True
+
+    def drain(self, timeout: float = 60) -> None:
+        """Post due casts until none are left or `timeout` seconds have passed"""
+        self.queue.db_manager.release_stale_casts(time.time() - self.stale_after)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and not self._stop.is_set():
+            if not self.process_once():
+                return
+
+    def _run(self) -> None:
+        self.queue.db_manager.release_stale_casts(time.time() - self.stale_after)
+        while not self._stop.is_set():
+            try:
+                if not self.process_once():
+                    self._stop.wait(self.poll_interval)
+            except Exception as e:
+                click.echo(f"Cast worker error: {e}", err=True)
+                self._stop.wait(self.poll_interval)
+
+    def start(self) -> None:
+        """Start posting from a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cast-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Stop the background thread; casts still queued are picked up by the next worker"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+import click
+from database import DatabaseManager
+from metrics import metrics
+
+
+class CreatorProfileCache:
+    """
+    Caches Neynar user lookups by username, in memory (LRU) and in the creator_profiles table.
+
+    Entries younger than `ttl` are served as-is. Entries older than `ttl` but within
+    `ttl + stale_ttl` are served immediately while a background refresh fetches a fresh copy
+    (stale-while-revalidate). Anything older, or never seen, is fetched synchronously; concurrent
+    misses on the same username wait for the one lookup already in flight instead of calling again.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, ttl: float = 6 * 3600, stale_ttl: float = 24 * 3600, max_entries: int = 2048):
+        """
+        Args:
+            db_manager: Database used to persist profiles between runs
+            ttl: Seconds a cached profile is considered fresh
+            stale_ttl: Extra seconds a stale profile may be served while it is refreshed
+            max_entries: Maximum number of profiles kept in the in-memory LRU
+        """
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[Dict[str, Any], float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        # Username -> Future of the synchronous lookup in flight for it
+        self._inflight: Dict[str, Future] = {}
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="profile-refresh")
+        self.stats = {"memory_hits": 0, "db_hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "api_calls": 0, "refreshes": 0, "errors": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+        metrics.increment(f"profile_cache_{key}")
+
+    def _remember(self, username: str, profile: Dict[str, Any], fetched_at: float) -> None:
+        """Insert into the in-memory LRU, evicting the least recently used entry if full"""
+        with self._lock:
+            self._memory[username] = (profile, fetched_at)
+            self._memory.move_to_end(username)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, username: str) -> Optional[tuple[Dict[str, Any], float]]:
+        """Find a cached entry in memory, then in the database"""
+        with self._lock:
+            entry = self._memory.get(username)
+            if entry is not None:
+                self._memory.move_to_end(username)
+                self.stats["memory_hits"] += 1
+                metrics.increment("profile_cache_memory_hits")
+                return entry
+
+        row = self.db_manager.get_creator_profile(username)
+        if row is None:
+            return None
+
+        profile_json, fetched_at = row
+        entry = (json.loads(profile_json), fetched_at)
+        self._remember(username, *entry)
+        self._count("db_hits")
+        return entry
+
+    def _fetch(self, username: str, fetch_profile: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Call the API and store the result in both cache layers"""
+        self._count("api_calls")
+        profile = fetch_profile(username)
+        fetched_at = time.time()
+        self._remember(username, profile, fetched_at)
+        self.db_manager.save_creator_profile(username, json.dumps(profile), fetched_at)
+        return profile
+
+    def _refresh(self, username: str, fetch_profile: Callable[[str], Dict[str, Any]]) -> None:
+        try:
+            self._fetch(username, fetch_profile)
+            self._count("refreshes")
+        except Exception as e:
+            self._count("errors")
+            click.echo(f"Error refreshing cached Neynar data for {username}: {e}", err=True)
+        finally:
+            with self._lock:
+                self._refreshing.discard(username)
+
+    def _schedule_refresh(self, username: str, fetch_profile: Callable[[str], Dict[str, Any]]) -> None:
+        """Refresh a stale entry in the background, at most once at a time per username"""
+        with self._lock:
+            if username in self._refreshing:
+                return
+            self._refreshing.add(username)
+        self._refresher.submit(self._refresh, username, fetch_profile)
+
+    def peek(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached profile for a username if it is still fresh, without calling Neynar
+
+        Peeking isn't counted as a hit; the lookup that may follow is.
+        """
+        with self._lock:
+            entry = self._memory.get(username)
+        if entry is None:
+            row = self.db_manager.get_creator_profile(username)
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), row[1])
+            self._remember(username, *entry)
+        profile, fetched_at = entry
+        return profile if time.time() - fetched_at <= self.ttl else None
+
+    def get(self, username: str, fetch_profile: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Return the Neynar profile for a username, calling fetch_profile only when needed.
+
+        Args:
+            username: Farcaster username
+            fetch_profile: Function performing the actual API lookup (e.g. NeynarAPIManager.get_user_by_username)
+
+        Returns:
+            Dict containing the user information
+
+        Raises:
+            requests.exceptions.RequestException: If a synchronous lookup fails
+        """
+        entry = self._lookup(username)
+        if entry is not None:
+            profile, fetched_at = entry
+            age = time.time() - fetched_at
+            if age <= self.ttl:
+                return profile
+            if age <= self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                self._schedule_refresh(username, fetch_profile)
+                return profile
+
+        self._count("misses")
+        return self._fetch_once(username, fetch_profile)
+
+    def _fetch_once(self, username: str, fetch_profile: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        """Fetch a missing profile, or wait for the lookup another thread already has in flight for it"""
+        with self._lock:
+            future = self._inflight.get(username)
+            owner = future is None
+            if owner:
+                # A lookup that finished since this thread missed has already filled the memory layer
+                entry = self._memory.get(username)
+                if entry is not None and time.time() - entry[1] <= self.ttl:
+                    return entry[0]
+                future = self._inflight[username] = Future()
+        if not owner:
+            self._count("coalesced")
+            return future.result()
+
+        try:
+            profile = self._fetch(username, fetch_profile)
+            future.set_result(profile)
+            return profile
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(username, None)
+
+    def summary(self) -> str:
+        """One-line description of cache effectiveness"""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+        served = lookups - stats["misses"]
+        hit_rate = (served / lookups * 100) if lookups else 0
+        return (
+            f"Creator cache: {lookups} lookups, {hit_rate:.1f}% served from cache "
+            f"({stats['memory_hits']} memory, {stats['db_hits']} db, {stats['stale_hits']} stale), "
+            f"{stats['api_calls']} Neynar calls ({stats['refreshes']} background refreshes, {stats['coalesced']} concurrent misses shared), "
+            f"{served + stats['coalesced']} calls saved"
+        )
+
+    def close(self) -> None:
+        """Wait for in-flight background refreshes to finish"""
+        self._refresher.shutdown(wait=True)
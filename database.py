@@ -1,15 +1,313 @@
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from metrics import metrics
+
+
+# Ordered (version, statements) pairs applied by init_db on top of the base tables.
+# PRAGMA user_version records the last applied version, so existing databases upgrade in place.
+SCHEMA_MIGRATIONS = [
+    (
+        1,
+        [
+            "CREATE INDEX IF NOT EXISTS idx_tokens_created_at ON tokens (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_creator_details_username ON creator_details (username)",
+            "CREATE INDEX IF NOT EXISTS idx_themes_created_at ON themes (created_at)",
+        ],
+    ),
+    (
+        2,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS announced_tokens (
+                token_id TEXT PRIMARY KEY,
+                announced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+        ],
+    ),
+    (
+        3,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS outbound_casts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                frame_url TEXT,
+                reply_to TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                cast_hash TEXT,
+                enqueued_at REAL NOT NULL,
+                next_attempt_at REAL NOT NULL,
+                claimed_at REAL,
+                posted_at REAL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_outbound_casts_status ON outbound_casts (status, next_attempt_at)",
+        ],
+    ),
+    (
+        4,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS narrative_cache (
+                token_set_hash TEXT PRIMARY KEY,
+                tokens_json TEXT NOT NULL,
+                themes_json TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_narrative_cache_created_at ON narrative_cache (created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_themes_symbol ON themes (symbol)",
+        ],
+    ),
+    (
+        5,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS llm_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                model TEXT NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_write_tokens INTEGER NOT NULL DEFAULT 0,
+                latency REAL NOT NULL,
+                prompt_chars INTEGER
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage (created_at)",
+        ],
+    ),
+    (
+        6,
+        [
+            "ALTER TABLE tokens ADD COLUMN launched_at REAL",
+            "ALTER TABLE tokens ADD COLUMN detected_at REAL",
+            # Tokens saved before this migration were last seen at created_at (UTC), the best detection time there is
+            "UPDATE tokens SET detected_at = (julianday(created_at) - 2440587.5) * 86400.0 WHERE detected_at IS NULL",
+            "CREATE INDEX IF NOT EXISTS idx_tokens_detected_at ON tokens (detected_at)",
+        ],
+    ),
+    (
+        7,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS watermarks (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        8,
+        [
+            # Outcome of the token's creator lookup (found, failed or skipped); NULL until it has been enriched
+            "ALTER TABLE tokens ADD COLUMN creator_lookup TEXT",
+            """
+            UPDATE tokens SET creator_lookup = CASE
+                WHEN EXISTS (SELECT 1 FROM creator_details cd WHERE cd.contract_address = tokens.contract_address) THEN 'found'
+                ELSE 'skipped'
+            END
+            """,
+        ],
+    ),
+    (
+        9,
+        [
+            # Token a queued alert cast belongs to, so its post time can be credited to the token
+            "ALTER TABLE outbound_casts ADD COLUMN token_id TEXT",
+            # When the token's alert cast actually went out (announced_at is when the alert was claimed)
+            "ALTER TABLE announced_tokens ADD COLUMN posted_at REAL",
+            # Alerts from before this migration only have their claim time, the closest there is
+            "UPDATE announced_tokens SET posted_at = (julianday(announced_at) - 2440587.5) * 86400.0 WHERE posted_at IS NULL",
+        ],
+    ),
+    (
+        10,
+        [
+            # Time slot reserved for the cast's latest attempt, which spaces posts across every worker
+            "ALTER TABLE outbound_casts ADD COLUMN attempted_at REAL",
+            "UPDATE outbound_casts SET attempted_at = posted_at WHERE attempted_at IS NULL",
+            "CREATE INDEX IF NOT EXISTS idx_outbound_casts_attempted_at ON outbound_casts (attempted_at)",
+        ],
+    ),
+    (
+        11,
+        [
+            # When the creator's details were last written (UTC), so exports pick up refreshed profiles
+            "ALTER TABLE creator_details ADD COLUMN updated_at TIMESTAMP",
+            """
+            UPDATE creator_details SET updated_at = COALESCE(
+                (SELECT t.created_at FROM tokens t WHERE t.contract_address = creator_details.contract_address),
+                CURRENT_TIMESTAMP
+            )
+            WHERE updated_at IS NULL
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_creator_details_updated_at ON creator_details (updated_at)",
+        ],
+    ),
+]
 
 
 class DatabaseManager:
+    # Re-saving a token refreshes its listing fields but keeps the launch and detection times of its first sighting
+    SAVE_TOKEN_SQL = """
+        INSERT INTO tokens (
+            contract_address, name, symbol, time_ago,
+            creator_name, creator_link, image_url,
+            dexscreener_url, basescan_url, clanker_url,
+            launched_at, detected_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (contract_address) DO UPDATE SET
+            name = excluded.name,
+            symbol = excluded.symbol,
+            time_ago = excluded.time_ago,
+            creator_name = excluded.creator_name,
+            creator_link = excluded.creator_link,
+            image_url = excluded.image_url,
+            dexscreener_url = excluded.dexscreener_url,
+            basescan_url = excluded.basescan_url,
+            clanker_url = excluded.clanker_url,
+            created_at = CURRENT_TIMESTAMP,
+            launched_at = COALESCE(tokens.launched_at, excluded.launched_at),
+            detected_at = COALESCE(tokens.detected_at, excluded.detected_at)
+    """
+
+    SAVE_CREATOR_DETAILS_SQL = """
+        INSERT OR REPLACE INTO creator_details (
+            contract_address, username, eth_addresses,
+            follower_count, neynar_score, updated_at
+        ) VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """
+
+    # Same as SAVE_CREATOR_DETAILS_SQL, but a no-op when the token doesn't exist
+    ADD_CREATOR_DETAILS_SQL = """
+        INSERT OR REPLACE INTO creator_details (
+            contract_address, username, eth_addresses,
+            follower_count, neynar_score, updated_at
+        )
+        SELECT ?, ?, ?, ?, ?, CURRENT_TIMESTAMP
+        WHERE EXISTS (SELECT 1 FROM tokens WHERE contract_address = ?)
+    """
+
+    # Columns iter_tokens_since can project: the tokens table's own, and creator details under their joined aliases
+    TOKEN_COLUMNS = (
+        "contract_address",
+        "name",
+        "symbol",
+        "time_ago",
+        "creator_name",
+        "creator_link",
+        "image_url",
+        "dexscreener_url",
+        "basescan_url",
+        "clanker_url",
+        "created_at",
+        "launched_at",
+        "detected_at",
+    )
+    CREATOR_COLUMNS = {
+        "creator_username": "cd.username",
+        "creator_eth_addresses": "cd.eth_addresses",
+        "creator_follower_count": "cd.follower_count",
+        "creator_neynar_score": "cd.neynar_score",
+    }
+
+    # Tables iter_export_rows can stream. Each has its (name, SQL expression, type) columns, the FROM clause,
+    # and the change time and rowid it is ordered and checkpointed by. Re-saving a token or theme refreshes
+    # its created_at, and creator details are written with their token, so a changed row moves to the end.
+    EXPORT_TABLES = {
+        "tokens": {
+            "columns": [(column, f"t.{column}", "text") for column in TOKEN_COLUMNS[:10]]
+            + [
+                ("created_at", "strftime('%Y-%m-%dT%H:%M:%SZ', t.created_at)", "timestamp"),
+                ("launched_at", "t.launched_at", "real"),
+                ("detected_at", "t.detected_at", "real"),
+            ],
+            "from": "tokens t",
+            "changed_at": "t.created_at",
+            "rowid": "t.rowid",
+        },
+        "creator_details": {
+            "columns": [
+                ("contract_address", "cd.contract_address", "text"),
+                ("username", "cd.username", "text"),
+                ("eth_addresses", "cd.eth_addresses", "text"),
+                ("follower_count", "cd.follower_count", "integer"),
+                ("neynar_score", "cd.neynar_score", "real"),
+                ("updated_at", "strftime('%Y-%m-%dT%H:%M:%SZ', cd.updated_at)", "timestamp"),
+            ],
+            "from": "creator_details cd",
+            "changed_at": "cd.updated_at",
+            "rowid": "cd.rowid",
+        },
+        "themes": {
+            "columns": [
+                ("theme_name", "th.theme_name", "text"),
+                ("symbol", "th.symbol", "text"),
+                ("created_at", "strftime('%Y-%m-%dT%H:%M:%SZ', th.created_at)", "timestamp"),
+            ],
+            "from": "themes th",
+            "changed_at": "th.created_at",
+            "rowid": "th.rowid",
+        },
+    }
+
     def __init__(self, db_path="tokens.db"):
         self.db_path = db_path
+        # One connection per manager, shared by every method (and every thread) under this lock
+        self._lock = threading.RLock()
+        self._transaction_depth = 0
+        self._conn = self._connect()
         self.init_db()
 
+    def _connect(self):
+        """Open the shared connection with WAL journaling so readers and writers don't block each other"""
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements in a single transaction on the shared connection
+
+        Nested uses join the outermost transaction, which commits on success and rolls back on error.
+
+        Yields:
+            sqlite3.Cursor: Cursor bound to the shared connection
+        """
+        with self._lock:
+            self._transaction_depth += 1
+            try:
+                yield self._conn.cursor()
+                if self._transaction_depth == 1:
+                    with metrics.span("db.commit"):
+                        self._conn.commit()
+            except BaseException:
+                if self._transaction_depth == 1:
+                    self._conn.rollback()
+                raise
+            finally:
+                self._transaction_depth -= 1
+
+    def close(self):
+        """Close the shared connection"""
+        with self._lock:
+            self._conn.close()
+
     def init_db(self):
         """Initialize the database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+        with self.transaction() as cursor:
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS tokens (
@@ -49,73 +347,203 @@ class DatabaseManager:
                 )
                 """
             )
-            conn.commit()
-
-    def save_token(self, token, creator_data=None):
-        """Save a token and its creator details to the database"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
             cursor.execute(
                 """
-                INSERT OR REPLACE INTO tokens (
-                    contract_address, name, symbol, time_ago,
-                    creator_name, creator_link, image_url,
-                    dexscreener_url, basescan_url, clanker_url
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                (
-                    token.contract_address,
-                    token.name,
-                    token.symbol,
-                    token.time_ago,
-                    token.creator_name,
-                    token.creator_link,
-                    token.image_url,
-                    token.dexscreener_url,
-                    token.basescan_url,
-                    token.clanker_url,
-                ),
+                CREATE TABLE IF NOT EXISTS creator_profiles (
+                    username TEXT PRIMARY KEY,
+                    profile_json TEXT,
+                    fetched_at REAL
+                )
+                """
             )
 
+        self.migrate()
+
+    def schema_version(self):
+        """Return the schema version recorded in the database file"""
+        with self._lock:
+            return self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """
+        Apply any SCHEMA_MIGRATIONS newer than the database's recorded version
+
+        Runs under an immediate write lock so overlapping processes don't apply the same migration twice.
+        """
+        latest = SCHEMA_MIGRATIONS[-1][0] if SCHEMA_MIGRATIONS else 0
+        if self.schema_version() >= latest:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read inside the lock in case another process migrated first
+                current = self._conn.execute("PRAGMA user_version").fetchone()[0]
+                for version, statements in SCHEMA_MIGRATIONS:
+                    if version <= current:
+                        continue
+                    for statement in statements:
+                        self._conn.execute(statement)
+                    self._conn.execute(f"PRAGMA user_version = {int(version)}")
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    @staticmethod
+    def _token_row(token, detected_at):
+        return (
+            token.contract_address,
+            token.name,
+            token.symbol,
+            token.time_ago,
+            token.creator_name,
+            token.creator_link,
+            token.image_url,
+            token.dexscreener_url,
+            token.basescan_url,
+            token.clanker_url,
+            token.launched_at,
+            detected_at,
+        )
+
+    @staticmethod
+    def _creator_details_row(contract_address, creator_data):
+        eth_addresses_str = ",".join(creator_data.get("eth_addresses") or [])
+        return (
+            contract_address,
+            creator_data.get("username"),
+            eth_addresses_str,
+            creator_data.get("follower_count"),
+            creator_data.get("neynar_score"),
+        )
+
+    def save_token(self, token, creator_data=None, detected_at=None):
+        """Save a token and its creator details to the database"""
+        detected_at = detected_at if detected_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(self.SAVE_TOKEN_SQL, self._token_row(token, detected_at))
+
             if creator_data:
-                eth_addresses_str = ",".join(creator_data.get("eth_addresses", []))
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO creator_details (
-                        contract_address, username, eth_addresses,
-                        follower_count, neynar_score
-                    ) VALUES (?, ?, ?, ?, ?)
-                """,
-                    (
-                        token.contract_address,
-                        creator_data.get("username"),
-                        eth_addresses_str,
-                        creator_data.get("follower_count"),
-                        creator_data.get("neynar_score"),
-                    ),
-                )
+                cursor.execute(self.SAVE_CREATOR_DETAILS_SQL, self._creator_details_row(token.contract_address, creator_data))
+
+    @metrics.timed("db.save_tokens_bulk")
+    def save_tokens_bulk(self, tokens, detected_at=None):
+        """
+        Save many tokens in a single transaction
+
+        Args:
+            tokens (list): Token objects to insert or update
+            detected_at (float, optional): Epoch seconds the tokens were first seen, defaults to now
 
-            conn.commit()
+        Returns:
+            int: Number of tokens written
+        """
+        detected_at = detected_at if detected_at is not None else time.time()
+        rows = [self._token_row(token, detected_at) for token in tokens]
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany(self.SAVE_TOKEN_SQL, rows)
+        return len(rows)
 
     def get_token(self, contract_address):
         """Retrieve a token by its contract address"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tokens WHERE contract_address = ?", (contract_address,))
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM tokens WHERE contract_address = ?", (contract_address,))
             return cursor.fetchone()
 
     def get_all_tokens(self):
         """Retrieve all tokens"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tokens ORDER BY created_at DESC")
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM tokens ORDER BY created_at DESC")
             return cursor.fetchall()
 
+    @metrics.timed("db.get_known_contract_addresses")
+    def get_known_contract_addresses(self, contract_addresses=None):
+        """
+        Return the set of contract addresses already saved in the tokens table
+
+        Args:
+            contract_addresses (list, optional): Only check these addresses instead of loading the whole table
+
+        Returns:
+            set: Contract addresses present in the database
+        """
+        with self._lock:
+            if contract_addresses is None:
+                cursor = self._conn.execute("SELECT contract_address FROM tokens")
+                return {row[0] for row in cursor}
+
+            known = set()
+            addresses = list(contract_addresses)
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(addresses), 500):
+                chunk = addresses[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(f"SELECT contract_address FROM tokens WHERE contract_address IN ({placeholders})", chunk)
+                known.update(row[0] for row in cursor)
+            return known
+
+    def _token_addresses_where(self, contract_addresses, condition):
+        """The addresses among `contract_addresses` of saved tokens matching an SQL condition on the tokens table"""
+        matched = set()
+        addresses = list(contract_addresses)
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(addresses), 500):
+                chunk = addresses[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(f"SELECT contract_address FROM tokens WHERE contract_address IN ({placeholders}) AND {condition}", chunk)
+                matched.update(row[0] for row in cursor)
+        return matched
+
+    @metrics.timed("db.get_processed_contract_addresses")
+    def get_processed_contract_addresses(self, contract_addresses):
+        """
+        Return the saved tokens among `contract_addresses` whose creator lookup is done
+
+        A token whose lookup failed, or that was saved but never enriched (e.g. a poll that crashed),
+        isn't processed, so incremental polls handle it again.
+
+        Args:
+            contract_addresses (list): Addresses to check
+
+        Returns:
+            set: Contract addresses whose creator lookup was found or skipped
+        """
+        return self._token_addresses_where(contract_addresses, "creator_lookup IN ('found', 'skipped')")
+
+    def get_failed_lookup_addresses(self, contract_addresses):
+        """
+        Return the saved tokens among `contract_addresses` whose last creator lookup failed
+
+        Returns:
+            set: Contract addresses
+        """
+        return self._token_addresses_where(contract_addresses, "creator_lookup = 'failed'")
+
+    def set_creator_lookups_bulk(self, lookups):
+        """
+        Record the outcome of creator lookups for saved tokens in a single transaction
+
+        Args:
+            lookups (list): (contract_address, outcome) pairs, outcome being found, failed or skipped
+
+        Returns:
+            int: Number of tokens updated
+        """
+        rows = [(outcome, contract_address) for contract_address, outcome in lookups]
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany("UPDATE tokens SET creator_lookup = ? WHERE contract_address = ?", rows)
+            return cursor.rowcount
+
     def get_token_with_creator_details(self, contract_address):
         """Retrieve a token and its creator details by contract address"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        with self._lock:
+            cursor = self._conn.execute(
                 """
                 SELECT t.*, cd.username, cd.eth_addresses, cd.follower_count, cd.neynar_score
                 FROM tokens t
@@ -126,34 +554,59 @@ class DatabaseManager:
             )
             return cursor.fetchone()
 
-    def add_creator_details(self, contract_address, creator_data):
-        """Add or update creator details for an existing token"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
+    def get_tokens_by_creator(self, username):
+        """
+        Retrieve all tokens launched by a Farcaster username, newest first
 
-            # First verify the token exists
-            cursor.execute("SELECT 1 FROM tokens WHERE contract_address = ?", (contract_address,))
-            if not cursor.fetchone():
-                raise ValueError(f"No token found with contract address: {contract_address}")
+        Args:
+            username (str): The creator's Farcaster username
 
-            eth_addresses_str = ",".join(creator_data.get("eth_addresses", []))
+        Returns:
+            list: List of dictionaries containing token data and creator details
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
             cursor.execute(
                 """
-                INSERT OR REPLACE INTO creator_details (
-                    contract_address, username, eth_addresses,
-                    follower_count, neynar_score
-                ) VALUES (?, ?, ?, ?, ?)
-            """,
-                (
-                    contract_address,
-                    creator_data.get("username"),
-                    eth_addresses_str,
-                    creator_data.get("follower_count"),
-                    creator_data.get("neynar_score"),
-                ),
+                SELECT t.*, cd.username, cd.eth_addresses, cd.follower_count, cd.neynar_score
+                FROM creator_details cd
+                JOIN tokens t ON t.contract_address = cd.contract_address
+                WHERE cd.username = ?
+                ORDER BY t.created_at DESC
+                """,
+                (username,),
             )
-            conn.commit()
+            return [dict(row) for row in cursor.fetchall()]
+
+    def add_creator_details(self, contract_address, creator_data):
+        """Add or update creator details for an existing token"""
+        with self.transaction() as cursor:
+            cursor.execute(self.ADD_CREATOR_DETAILS_SQL, self._creator_details_row(contract_address, creator_data) + (contract_address,))
+            if cursor.rowcount == 0:
+                raise ValueError(f"No token found with contract address: {contract_address}")
+
+    @metrics.timed("db.add_creator_details_bulk")
+    def add_creator_details_bulk(self, creator_details):
+        """
+        Add or update creator details for many tokens in a single transaction
+
+        Rows for contract addresses that aren't in the tokens table are skipped.
+
+        Args:
+            creator_details (list): (contract_address, creator_data) pairs
+
+        Returns:
+            int: Number of rows written
+        """
+        rows = [self._creator_details_row(contract_address, creator_data) + (contract_address,) for contract_address, creator_data in creator_details]
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany(self.ADD_CREATOR_DETAILS_SQL, rows)
+            return cursor.rowcount
 
+    @metrics.timed("db.get_tokens_since")
     def get_tokens_since(self, cutoff_time):
         """
         Retrieve all tokens created after the specified timestamp, including creator details
@@ -164,13 +617,13 @@ class DatabaseManager:
         Returns:
             list: List of dictionaries containing token data and creator details
         """
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row  # This allows accessing columns by name
-            cursor = conn.cursor()
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row  # This allows accessing columns by name
 
             cursor.execute(
                 """
-                SELECT 
+                SELECT
                     t.*,
                     cd.username as creator_username,
                     cd.eth_addresses as creator_eth_addresses,
@@ -187,17 +640,565 @@ class DatabaseManager:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]  # Convert rows to dictionaries
 
+    def iter_tokens_since(self, cutoff_time, columns=None, page_size=1000):
+        """
+        Stream tokens created after the specified timestamp, newest first, selecting only the columns asked for
+
+        Rows are read a page at a time, continuing each page from the last (created_at, rowid) seen rather
+        than with OFFSET, so memory stays bounded by `page_size` and the lock is only held while a page is read.
+
+        Args:
+            cutoff_time (datetime): The timestamp to query tokens from
+            columns (iterable, optional): Names from TOKEN_COLUMNS and CREATOR_COLUMNS; defaults to all of them
+            page_size (int): Rows fetched per query
+
+        Yields:
+            dict: One token per row, with just the requested columns
+        """
+        columns = list(columns) if columns is not None else list(self.TOKEN_COLUMNS) + list(self.CREATOR_COLUMNS)
+        unknown = [column for column in columns if column not in self.TOKEN_COLUMNS and column not in self.CREATOR_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown token columns: {', '.join(unknown)}")
+
+        select = ", ".join(self.CREATOR_COLUMNS[column] if column in self.CREATOR_COLUMNS else f"t.{column}" for column in columns)
+        join = "LEFT JOIN creator_details cd ON t.contract_address = cd.contract_address" if any(column in self.CREATOR_COLUMNS for column in columns) else ""
+        query = f"""
+            SELECT {select}, t.created_at, t.rowid
+            FROM tokens t
+            {join}
+            WHERE t.created_at >= ? {{keyset}}
+            ORDER BY t.created_at DESC, t.rowid DESC
+            LIMIT ?
+        """
+        first_page = query.format(keyset="")
+        next_page = query.format(keyset="AND (t.created_at, t.rowid) < (?, ?)")
+
+        last = None
+        while True:
+            with metrics.span("db.iter_tokens_since.page"), self._lock:
+                if last is None:
+                    rows = self._conn.execute(first_page, (cutoff_time, page_size)).fetchall()
+                else:
+                    rows = self._conn.execute(next_page, (cutoff_time, *last, page_size)).fetchall()
+            for row in rows:
+                yield dict(zip(columns, row))
+            if len(rows) < page_size:
+                return
+            last = rows[-1][-2:]
+
+    def iter_export_rows(self, table, since=None, until=None, after=None, page_size=5000):
+        """
+        Stream one of EXPORT_TABLES a page at a time, oldest change first
+
+        Pages continue from the last (change time, rowid) seen, like iter_tokens_since, so memory stays
+        bounded by `page_size` and the lock is only held while a page is read.
+
+        Args:
+            table (str): Name in EXPORT_TABLES
+            since (str, optional): Only rows changed at or after this UTC time ("YYYY-MM-DD HH:MM:SS")
+            until (str, optional): Only rows changed before this UTC time
+            after (tuple, optional): (change time, rowid) position to continue after, as yielded by an earlier export
+            page_size (int): Rows fetched per query
+
+        Yields:
+            tuple: (rows, position) per page, rows as tuples in the table's column order and position the
+            (change time, rowid) of the page's last row
+        """
+        if table not in self.EXPORT_TABLES:
+            raise ValueError(f"Unknown export table {table!r} (expected one of {', '.join(self.EXPORT_TABLES)})")
+        spec = self.EXPORT_TABLES[table]
+        position = f"{spec['changed_at']}, {spec['rowid']}"
+        select = ", ".join(expression for _, expression, _ in spec["columns"])
+
+        filters, params = ["1"], []
+        if since is not None:
+            filters.append(f"{spec['changed_at']} >= ?")
+            params.append(since)
+        if until is not None:
+            filters.append(f"{spec['changed_at']} < ?")
+            params.append(until)
+        query = f"""
+            SELECT {select}, {position}
+            FROM {spec['from']}
+            WHERE {' AND '.join(filters)} {{keyset}}
+            ORDER BY {position}
+            LIMIT ?
+        """
+        first_page = query.format(keyset="")
+        next_page = query.format(keyset=f"AND ({position}) > (?, ?)")
+
+        last = tuple(after) if after is not None else None
+        while True:
+            with metrics.span(f"db.iter_export_rows.{table}"), self._lock:
+                if last is None:
+                    rows = self._conn.execute(first_page, (*params, page_size)).fetchall()
+                else:
+                    rows = self._conn.execute(next_page, (*params, *last, page_size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][-2:]
+            yield [row[:-2] for row in rows], last
+            if len(rows) < page_size:
+                return
+
+    def get_token_latencies(self, since):
+        """
+        Retrieve launch, detection and alert times of tokens detected since `since`
+
+        Args:
+            since (float): Epoch seconds to start from
+
+        Returns:
+            list: Dictionaries with contract_address, launched_at, detected_at and announced_at (epoch seconds,
+            announced_at being when the alert cast was posted, None for tokens whose alert hasn't gone out),
+            for tokens with a known launch time
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                """
+                SELECT
+                    t.contract_address,
+                    t.launched_at,
+                    t.detected_at,
+                    a.posted_at AS announced_at
+                FROM tokens t
+                LEFT JOIN announced_tokens a ON a.token_id = t.contract_address
+                WHERE t.detected_at >= ? AND t.launched_at IS NOT NULL
+                ORDER BY t.detected_at
+                """,
+                (since,),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
     def save_themes(self, themes_dict):
         """Save themes and their associated symbols to the database"""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            for theme, symbols in themes_dict.items():
-                for symbol in symbols:
+        rows = [(theme, symbol) for theme, symbols in themes_dict.items() for symbol in symbols]
+        with self.transaction() as cursor:
+            cursor.executemany(
+                """
+                INSERT OR REPLACE INTO themes (theme_name, symbol, created_at)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
+                """,
+                rows,
+            )
+
+    def get_themes_since(self, cutoff_time):
+        """
+        Retrieve themes saved after the specified timestamp
+
+        Args:
+            cutoff_time (datetime): The timestamp to query themes from
+
+        Returns:
+            dict: Theme name mapped to its list of symbols
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                SELECT theme_name, symbol FROM themes
+                WHERE created_at >= ?
+                ORDER BY created_at DESC
+                """,
+                (cutoff_time,),
+            )
+            themes = {}
+            for theme_name, symbol in cursor:
+                themes.setdefault(theme_name, []).append(symbol)
+            return themes
+
+    def get_themes_for_symbols(self, symbols):
+        """
+        Retrieve the saved themes that contain any of the given token names or symbols
+
+        Args:
+            symbols (list): Token names and symbols to look up
+
+        Returns:
+            dict: Theme name mapped to its list of matching symbols
+        """
+        symbols = list(symbols)
+        themes = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(symbols), 500):
+                chunk = symbols[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                cursor = self._conn.execute(f"SELECT theme_name, symbol FROM themes WHERE symbol IN ({placeholders})", chunk)
+                for theme_name, symbol in cursor:
+                    themes.setdefault(theme_name, []).append(symbol)
+        return themes
+
+    def get_narrative(self, token_set_hash):
+        """
+        Retrieve a cached narrative analysis by the hash of its token set
+
+        Returns:
+            tuple: (tokens_json, themes_json) or None if that token set hasn't been analyzed
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT tokens_json, themes_json FROM narrative_cache WHERE token_set_hash = ?", (token_set_hash,))
+            return cursor.fetchone()
+
+    def get_latest_narrative(self):
+        """
+        Retrieve the most recently cached narrative analysis
+
+        Returns:
+            tuple: (token_set_hash, tokens_json, themes_json) or None if nothing has been cached
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT token_set_hash, tokens_json, themes_json FROM narrative_cache ORDER BY created_at DESC LIMIT 1")
+            return cursor.fetchone()
+
+    def save_narrative(self, token_set_hash, tokens_json, themes_json, created_at=None):
+        """Store or replace the cached narrative analysis for a token set"""
+        created_at = created_at if created_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO narrative_cache (token_set_hash, tokens_json, themes_json, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (token_set_hash, tokens_json, themes_json, created_at),
+            )
+
+    def prune_narratives(self, older_than):
+        """
+        Delete cached narrative analyses created before `older_than` (epoch seconds)
+
+        Returns:
+            int: Number of entries deleted
+        """
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM narrative_cache WHERE created_at < ?", (older_than,))
+            return cursor.rowcount
+
+    def record_llm_usage(self, model, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens, latency, prompt_chars=None, created_at=None):
+        """Record the token usage and wall time of one LLM call"""
+        created_at = created_at if created_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO llm_usage (
+                    created_at, model, input_tokens, output_tokens,
+                    cache_read_tokens, cache_write_tokens, latency, prompt_chars
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (created_at, model, input_tokens, output_tokens, cache_read_tokens, cache_write_tokens, latency, prompt_chars),
+            )
+
+    def get_llm_usage_by_day(self, since):
+        """
+        Summarize LLM usage per UTC day and model
+
+        Args:
+            since (float): Epoch seconds to start from
+
+        Returns:
+            list: Dictionaries with day, model, calls, token totals and average/max latency, oldest day first
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.row_factory = sqlite3.Row
+            cursor.execute(
+                """
+                SELECT
+                    date(created_at, 'unixepoch') AS day,
+                    model,
+                    COUNT(*) AS calls,
+                    SUM(input_tokens) AS input_tokens,
+                    SUM(output_tokens) AS output_tokens,
+                    SUM(cache_read_tokens) AS cache_read_tokens,
+                    SUM(cache_write_tokens) AS cache_write_tokens,
+                    AVG(latency) AS avg_latency,
+                    MAX(latency) AS max_latency
+                FROM llm_usage
+                WHERE created_at >= ?
+                GROUP BY day, model
+                ORDER BY day, model
+                """,
+                (since,),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_announced_token_ids(self):
+        """Return the set of every token ID that has been announced"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT token_id FROM announced_tokens")
+            return {row[0] for row in cursor}
+
+    def is_token_announced(self, token_id):
+        """Check whether a token ID has been announced (by this or any other process)"""
+        with self._lock:
+            cursor = self._conn.execute("SELECT 1 FROM announced_tokens WHERE token_id = ?", (token_id,))
+            return cursor.fetchone() is not None
+
+    def mark_token_announced(self, token_id):
+        """
+        Record a token as announced
+
+        Returns:
+            bool: True if this call recorded it, False if it had already been marked
+        """
+        with self.transaction() as cursor:
+            cursor.execute("INSERT OR IGNORE INTO announced_tokens (token_id) VALUES (?)", (token_id,))
+            return cursor.rowcount == 1
+
+    def mark_token_posted(self, token_id, posted_at=None):
+        """Record when an announced token's alert cast was posted (the first post wins)"""
+        posted_at = posted_at if posted_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE announced_tokens SET posted_at = ? WHERE token_id = ? AND posted_at IS NULL", (posted_at, token_id))
+
+    def import_announced_tokens(self, token_ids):
+        """
+        Record many token IDs as announced, ignoring ones already present
+
+        Returns:
+            int: Number of token IDs newly recorded
+        """
+        rows = [(token_id,) for token_id in token_ids]
+        if not rows:
+            return 0
+        with self.transaction() as cursor:
+            cursor.executemany("INSERT OR IGNORE INTO announced_tokens (token_id) VALUES (?)", rows)
+            return cursor.rowcount
+
+    def enqueue_cast(self, text, frame_url=None, reply_to=None, enqueued_at=None, token_id=None):
+        """
+        Add a cast to the outbound queue
+
+        Args:
+            token_id: Announced token the cast alerts on, whose posted_at is set when the cast goes out
+
+        Returns:
+            int: ID of the queued cast
+        """
+        enqueued_at = enqueued_at if enqueued_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO outbound_casts (text, frame_url, reply_to, enqueued_at, next_attempt_at, token_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (text, frame_url, reply_to, enqueued_at, enqueued_at, token_id),
+            )
+            return cursor.lastrowid
+
+    def claim_next_cast(self, now=None, min_interval=0):
+        """
+        Claim the oldest pending cast that is due for an attempt
+
+        The pending row is read, its slot computed and the claim written under one immediate write
+        lock, so two workers (even in different processes) can neither claim the same cast nor
+        reserve the same slot. The slot is `min_interval` seconds after the latest attempt any worker
+        has made or reserved, so the spacing holds across processes and restarts.
+
+        Args:
+            now (float): Current epoch seconds (defaults to now)
+            min_interval (float): Minimum seconds between attempts
+
+        Returns:
+            dict: The claimed cast row, with attempted_at set to the reserved time, or None if nothing is due
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self._conn.cursor()
+                cursor.row_factory = sqlite3.Row
+                cursor.execute(
+                    """
+                    SELECT * FROM outbound_casts
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id
+                    LIMIT 1
+                    """,
+                    (now,),
+                )
+                row = cursor.fetchone()
+                claimed = None
+                if row is not None:
+                    last_attempt = cursor.execute("SELECT MAX(attempted_at) FROM outbound_casts").fetchone()[0]
+                    attempted_at = max(now, last_attempt + min_interval) if last_attempt is not None else now
+                    # Only claim the row as it was read; a retried cast still holds its previous attempt's slot
                     cursor.execute(
                         """
-                        INSERT OR REPLACE INTO themes (theme_name, symbol, created_at)
-                        VALUES (?, ?, CURRENT_TIMESTAMP)
+                        UPDATE outbound_casts SET status = 'sending', claimed_at = ?, attempted_at = ?
+                        WHERE id = ? AND status = 'pending' AND attempted_at IS ?
                         """,
-                        (theme, symbol),
+                        (now, attempted_at, row["id"], row["attempted_at"]),
                     )
-            conn.commit()
+                    if cursor.rowcount == 1:
+                        claimed = {**dict(row), "attempted_at": attempted_at}
+                self._conn.commit()
+                return claimed
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def release_stale_casts(self, older_than):
+        """
+        Return casts stuck in 'sending' (e.g. the worker crashed mid-post) to the pending queue
+
+        Returns:
+            int: Number of casts released
+        """
+        with self.transaction() as cursor:
+            cursor.execute("UPDATE outbound_casts SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?", (older_than,))
+            return cursor.rowcount
+
+    def mark_cast_posted(self, cast_id, cast_hash=None, posted_at=None):
+        """Record a successful post"""
+        posted_at = posted_at if posted_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                "UPDATE outbound_casts SET status = 'posted', attempts = attempts + 1, cast_hash = ?, posted_at = ?, last_error = NULL WHERE id = ?",
+                (cast_hash, posted_at, cast_id),
+            )
+            cursor.execute(
+                """
+                UPDATE announced_tokens SET posted_at = ?
+                WHERE posted_at IS NULL AND token_id = (SELECT token_id FROM outbound_casts WHERE id = ?)
+                """,
+                (posted_at, cast_id),
+            )
+
+    def mark_cast_retry(self, cast_id, error, next_attempt_at):
+        """Record a failed attempt and schedule the next one"""
+        with self.transaction() as cursor:
+            cursor.execute(
+                "UPDATE outbound_casts SET status = 'pending', attempts = attempts + 1, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                (error, next_attempt_at, cast_id),
+            )
+
+    def mark_cast_failed(self, cast_id, error):
+        """Give up on a cast"""
+        with self.transaction() as cursor:
+            cursor.execute(
+                "UPDATE outbound_casts SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                (error, cast_id),
+            )
+
+    def get_cast_queue_stats(self):
+        """
+        Summarize the outbound queue
+
+        Returns:
+            dict: Cast counts by status, plus the average and max enqueue-to-posted latency in seconds
+        """
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbound_casts GROUP BY status").fetchall())
+            avg_latency, max_latency = self._conn.execute("SELECT AVG(posted_at - enqueued_at), MAX(posted_at - enqueued_at) FROM outbound_casts WHERE status = 'posted'").fetchone()
+        return {"counts": counts, "avg_latency": avg_latency, "max_latency": max_latency}
+
+    def get_watermark(self, name):
+        """
+        Retrieve a named checkpoint (e.g. how far a backfill got)
+
+        Returns:
+            str: The stored value, or None if it hasn't been set
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM watermarks WHERE name = ?", (name,)).fetchone()
+            return row[0] if row else None
+
+    def set_watermark(self, name, value, updated_at=None):
+        """Store or replace a named checkpoint"""
+        updated_at = updated_at if updated_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO watermarks (name, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+                """,
+                (name, value, updated_at),
+            )
+
+    def delete_watermark(self, name):
+        """Forget a named checkpoint"""
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM watermarks WHERE name = ?", (name,))
+
+    def get_creator_profile(self, username):
+        """
+        Retrieve a cached Neynar profile for a username
+
+        Returns:
+            tuple: (profile_json, fetched_at) or None if the username hasn't been cached
+        """
+        with self._lock:
+            cursor = self._conn.execute("SELECT profile_json, fetched_at FROM creator_profiles WHERE username = ?", (username,))
+            return cursor.fetchone()
+
+    def save_creator_profile(self, username, profile_json, fetched_at):
+        """Store or replace the cached Neynar profile for a username"""
+        with self.transaction() as cursor:
+            cursor.execute(
+                """
+                INSERT OR REPLACE INTO creator_profiles (username, profile_json, fetched_at)
+                VALUES (?, ?, ?)
+                """,
+                (username, profile_json, fetched_at),
+            )
+
+
+class TokenBatchWriter:
+    """
+    Buffers a poll's token rows and creator details and writes them in small transactions
+
+    Used by the streaming check pipeline so tokens are persisted as they flow through without a
+    commit per token. Tokens are always written before creator details and lookup outcomes, since
+    those are only stored for tokens that exist.
+    """
+
+    def __init__(self, db_manager, batch_size=25, detected_at=None):
+        """
+        Args:
+            db_manager: Database to write to
+            batch_size: Buffered rows that trigger a write
+            detected_at: Epoch seconds recorded as the detection time of new tokens (e.g. when the page was fetched), defaults to the write time
+        """
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.detected_at = detected_at
+        self._tokens = []
+        self._creator_details = []
+        self._lookups = []
+        self.tokens_written = 0
+        self.creator_details_written = 0
+
+    def add_token(self, token):
+        self._tokens.append(token)
+        self._maybe_flush()
+
+    def add_creator_details(self, contract_address, creator_data):
+        self._creator_details.append((contract_address, creator_data))
+        self._maybe_flush()
+
+    def add_creator_lookup(self, contract_address, outcome):
+        self._lookups.append((contract_address, outcome))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._tokens) + len(self._creator_details) + len(self._lookups) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far in one transaction"""
+        if not self._tokens and not self._creator_details and not self._lookups:
+            return
+        tokens, creator_details, lookups = self._tokens, self._creator_details, self._lookups
+        self._tokens, self._creator_details, self._lookups = [], [], []
+        with self.db_manager.transaction():
+            self.tokens_written += self.db_manager.save_tokens_bulk(tokens, detected_at=self.detected_at)
+            self.creator_details_written += self.db_manager.add_creator_details_bulk(creator_details)
+            self.db_manager.set_creator_lookups_bulk(lookups)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
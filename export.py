@@ -0,0 +1,208 @@
+import csv
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Sequence, Tuple
+from database import DatabaseManager
+from metrics import metrics
+
+EXPORT_FORMATS = ("parquet", "arrow", "csv")
+
+EXTENSIONS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv.gz"}
+
+
+def sqlite_time(epoch: float) -> str:
+    """Epoch seconds as the UTC "YYYY-MM-DD HH:MM:SS" text SQLite's CURRENT_TIMESTAMP stores"""
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The parquet and arrow export formats require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+class ExportWriter:
+    """Writes one table's rows to a file, a chunk at a time"""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str, str]]):
+        """
+        Args:
+            path: File to write
+            columns: (name, SQL expression, type) columns, as in DatabaseManager.EXPORT_TABLES
+        """
+        self.path = path
+        self.columns = columns
+
+    def write_chunk(self, rows: List[tuple]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+
+class CsvExportWriter(ExportWriter):
+    """Gzipped CSV with a header row, readable without any extra dependencies"""
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str, str]]):
+        super().__init__(path, columns)
+        self._file = gzip.open(path, "wt", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _, _ in columns])
+
+    def write_chunk(self, rows: List[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ArrowExportWriter(ExportWriter):
+    """
+    Parquet or Arrow IPC through pyarrow
+
+    Each chunk becomes one record batch (one row group in Parquet), so only a chunk is ever held in memory.
+    """
+
+    def __init__(self, path: str, columns: Sequence[Tuple[str, str, str]], fmt: str = "parquet"):
+        super().__init__(path, columns)
+        pa = self._pa = _import_pyarrow()
+        types = {"text": pa.string(), "integer": pa.int64(), "real": pa.float64(), "timestamp": pa.timestamp("s", tz="UTC")}
+        self.schema = pa.schema([(name, types[column_type]) for name, _, column_type in columns])
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        else:
+            self._writer = pa.ipc.new_file(path, self.schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+
+    def write_chunk(self, rows: List[tuple]) -> None:
+        pa = self._pa
+        arrays = []
+        for index, field in enumerate(self.schema):
+            values = [row[index] for row in rows]
+            if pa.types.is_timestamp(field.type):
+                # ISO 8601 UTC text from the query, parsed by Arrow rather than row by row in Python
+                arrays.append(pa.array(values, pa.string()).cast(field.type))
+            else:
+                arrays.append(pa.array(values, field.type))
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def create_export_writer(fmt: str, path: str, columns: Sequence[Tuple[str, str, str]]) -> ExportWriter:
+    """Build the writer for an export format name"""
+    if fmt == "csv":
+        return CsvExportWriter(path, columns)
+    if fmt in ("parquet", "arrow"):
+        return ArrowExportWriter(path, columns, fmt=fmt)
+    raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(EXPORT_FORMATS)})")
+
+
+class TableExporter:
+    """
+    Streams tables from tokens.db into columnar files for analysis.
+
+    Rows are read with DatabaseManager.iter_export_rows in chunks of `chunk_size` and written as
+    they arrive, so memory stays bounded by one chunk however large the table is. Each table goes
+    to a new timestamped file, written under a temporary name and renamed when complete.
+
+    Incremental exports continue from a per-table watermark (`export:<table>` in the watermarks
+    table) holding the (change time, rowid) of the last row exported. It only moves once the file
+    is in place, so an interrupted export is simply repeated by the next run. Rows changed in the
+    last `settle` seconds are left for the next run, so changes committed out of order by
+    overlapping writers aren't skipped past. Creator details are tracked by their own updated_at,
+    so profiles refreshed with `--refresh-known` are exported again.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, output_dir: str = "exports", fmt: str = "parquet", chunk_size: int = 5000, settle: float = 300):
+        """
+        Args:
+            db_manager: Database to read
+            output_dir: Directory the files are written to (created if missing)
+            fmt: One of EXPORT_FORMATS
+            chunk_size: Rows read from the database and written per chunk
+            settle: Seconds a change must age before an incremental export includes it
+
+        Raises:
+            ImportError: For parquet or arrow without pyarrow installed
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt} (expected one of {', '.join(EXPORT_FORMATS)})")
+        if fmt != "csv":
+            _import_pyarrow()
+        self.db_manager = db_manager
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.settle = settle
+
+    @staticmethod
+    def watermark_name(table: str) -> str:
+        return f"export:{table}"
+
+    def export_table(self, table: str, since: float | None = None, until: float | None = None, incremental: bool = False) -> Dict:
+        """
+        Write one table's rows to a new file
+
+        Args:
+            table: Name in DatabaseManager.EXPORT_TABLES
+            since: Only rows changed at or after this time (epoch seconds)
+            until: Only rows changed before this time (epoch seconds), capped at when the export started
+            incremental: Continue after the table's watermark and move it to the last row written
+
+        Returns:
+            dict: rows and chunks written, and the file's path (None when there was nothing to export)
+        """
+        started = time.time()
+        until = min(until, started) if until is not None else started
+        after = None
+        if incremental:
+            until = min(until, started - self.settle)
+            watermark = self.db_manager.get_watermark(self.watermark_name(table))
+            after = tuple(json.loads(watermark)) if watermark else None
+
+        stats = {"table": table, "rows": 0, "chunks": 0, "path": None}
+        columns = self.db_manager.EXPORT_TABLES[table]["columns"]
+        path = os.path.join(self.output_dir, f"{table}-{datetime.fromtimestamp(started).strftime('%Y%m%dT%H%M%S')}{EXTENSIONS[self.fmt]}")
+        temp_path = path + ".tmp"
+        writer = None
+        position = None
+        try:
+            with metrics.span(f"export.{table}"):
+                pages = self.db_manager.iter_export_rows(
+                    table, since=sqlite_time(since) if since is not None else None, until=sqlite_time(until), after=after, page_size=self.chunk_size
+                )
+                for rows, position in pages:
+                    if writer is None:
+                        os.makedirs(self.output_dir, exist_ok=True)
+                        writer = create_export_writer(self.fmt, temp_path, columns)
+                    writer.write_chunk(rows)
+                    stats["rows"] += len(rows)
+                    stats["chunks"] += 1
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                    os.replace(temp_path, path)
+                    stats["path"] = path
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        metrics.increment(f"export_{table}_rows", stats["rows"])
+        if incremental and position is not None:
+            self.db_manager.set_watermark(self.watermark_name(table), json.dumps(list(position)))
+        return stats
+
+    def export(self, tables: Iterable[str], since: float | None = None, until: float | None = None, incremental: bool = False) -> List[Dict]:
+        """Export several tables, one file each (see export_table)"""
+        return [self.export_table(table, since=since, until=until, incremental=incremental) for table in tables]
@@ -0,0 +1,357 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from requests.adapters import HTTPAdapter
+from typing import Iterator
+import requests
+import time
+import click
+from html_parsers import SelectolaxParser
+from metrics import metrics
+
+
+FETCH_BACKENDS = ("selenium", "http", "auto")
+
+# Installed after each page load: queues every token card the page adds to the DOM from then on
+OBSERVE_CARDS_JS = """
+const selector = arguments[0];
+if (window.__clankerObserver) return;
+window.__clankerPending = [];
+window.__clankerObserver = new MutationObserver((mutations) => {
+  for (const mutation of mutations) {
+    for (const node of mutation.addedNodes) {
+      if (node.nodeType !== Node.ELEMENT_NODE) continue;
+      const cards = node.matches(selector) ? [node] : node.querySelectorAll(selector);
+      for (const card of cards) window.__clankerPending.push({node: card, added: Date.now()});
+    }
+  }
+});
+window.__clankerObserver.observe(document.body, {childList: true, subtree: true});
+"""
+
+# Long-poll: waits up to waitMs for queued cards whose creator link has rendered (or that have
+# waited settleMs for it) and hands over their HTML. null means the observer is gone, i.e. the page navigated.
+TAKE_CARDS_JS = """
+const [waitMs, settleMs, done] = arguments;
+if (!window.__clankerObserver) { done(null); return; }
+const started = Date.now();
+const check = () => {
+  const ready = [];
+  const waiting = [];
+  for (const entry of window.__clankerPending) {
+    if (!entry.node.isConnected) continue;
+    if (entry.node.querySelector('a[href*="warpcast.com"]') || Date.now() - entry.added >= settleMs) ready.push(entry.node.outerHTML);
+    else waiting.push(entry);
+  }
+  window.__clankerPending = waiting;
+  if (ready.length || Date.now() - started >= waitMs) done(ready);
+  else setTimeout(check, 100);
+};
+check();
+"""
+
+
+class FetchError(Exception):
+    """Raised when a backend can't produce usable page content for a URL."""
+
+
+class FetchBackend:
+    """Base class for the ways ClankerScraper can get the HTML of the token listing."""
+
+    name = "base"
+
+    def fetch(self, url: str) -> str:
+        """Return the page HTML for the given URL"""
+        raise NotImplementedError
+
+    def watch(self, url: str, reload_after: float = 60, wait: float = 5) -> Iterator[str]:
+        """Yield the page, then HTML holding just the token cards the page adds (see SeleniumFetchBackend.watch)"""
+        raise FetchError(f"The {self.name} backend can't observe a live page; use the selenium backend")
+
+    def close(self) -> None:
+        """Release any resources (browsers, connection pools) held by the backend"""
+
+
+class SeleniumFetchBackend(FetchBackend):
+    """Renders the page in headless Chrome so client-side JavaScript has populated the token cards."""
+
+    name = "selenium"
+
+    def __init__(self, verbose: bool = False, persistent: bool = False, max_page_loads: int = 500, max_heap_mb: int = 512):
+        """
+        Args:
+            verbose: Enable verbose output
+            persistent: Keep one Chrome session alive across calls to fetch
+            max_page_loads: Restart the persistent browser after this many page loads
+            max_heap_mb: Restart the persistent browser when the page's JS heap grows past this size
+        """
+        self.verbose = verbose
+        self.persistent = persistent
+        self.max_page_loads = max_page_loads
+        self.max_heap_mb = max_heap_mb
+        self._driver = None
+        self._page_loads = 0
+
+    def _start_driver(self) -> webdriver.Chrome:
+        """Launch a new headless Chrome session"""
+        chrome_options = Options()
+        chrome_options.add_argument("--headless")  # Run in headless mode
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+
+        click.echo("Starting Chrome in headless mode...")
+
+        metrics.increment("chrome_starts")
+        with metrics.span("selenium.start"):
+            return webdriver.Chrome(options=chrome_options)
+
+    def _load_page(self, driver: webdriver.Chrome, url: str) -> str:
+        """Load (or refresh) the page and wait for the token cards to render"""
+        if self.persistent and driver.current_url == url:
+            if self.verbose:
+                click.echo(f"Refreshing URL: {url}")
+            driver.refresh()
+        else:
+            if self.verbose:
+                click.echo(f"Loading URL: {url}")
+            with metrics.span("selenium.get"):
+                driver.get(url)
+
+        with metrics.span("selenium.wait"):
+            # Wait for the tokens to load
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "flex-1")))
+
+            # Wait specifically for the Warpcast links to be loaded
+            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//a[contains(@href, 'warpcast.com')]")))
+
+        if self.verbose:
+            click.echo("Page loaded successfully with creator info")
+
+        return driver.page_source
+
+    def _heap_size_mb(self, driver: webdriver.Chrome) -> float:
+        """Return the page's used JS heap in MB (0 if the browser doesn't expose it)"""
+        try:
+            used = driver.execute_script("return window.performance.memory ? window.performance.memory.usedJSHeapSize : 0")
+            return (used or 0) / (1024 * 1024)
+        except WebDriverException:
+            return 0
+
+    def _should_recycle(self, driver: webdriver.Chrome) -> bool:
+        """Check whether the persistent browser has been used long enough to leak memory"""
+        if self._page_loads >= self.max_page_loads:
+            click.echo(f"Recycling Chrome after {self._page_loads} page loads")
+            return True
+        heap_mb = self._heap_size_mb(driver)
+        if heap_mb > self.max_heap_mb:
+            click.echo(f"Recycling Chrome, JS heap at {heap_mb:.0f}MB exceeds {self.max_heap_mb}MB")
+            return True
+        return False
+
+    def close(self) -> None:
+        """Quit the persistent browser session, if one is running"""
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except WebDriverException as e:
+                click.echo(f"Error shutting down Chrome: {e}", err=True)
+            self._driver = None
+            self._page_loads = 0
+
+    def fetch(self, url: str) -> str:
+        """Get page content after JavaScript execution"""
+        if not self.persistent:
+            driver = self._start_driver()
+            try:
+                return self._load_page(driver, url)
+            finally:
+                driver.quit()
+
+        if self._driver is None:
+            self._driver = self._start_driver()
+
+        try:
+            html_content = self._load_page(self._driver, url)
+        except TimeoutException:
+            raise
+        except WebDriverException as e:
+            # The session crashed or Chrome went away; start over with a fresh browser
+            click.echo(f"Chrome session failed, restarting: {e.__class__.__name__}", err=True)
+            metrics.increment("chrome_crashes")
+            self.close()
+            self._driver = self._start_driver()
+            html_content = self._load_page(self._driver, url)
+
+        self._page_loads += 1
+        if self._should_recycle(self._driver):
+            self.close()
+
+        return html_content
+
+    def watch(self, url: str, reload_after: float = 60, wait: float = 5) -> Iterator[str]:
+        """
+        Load the page once, then yield the HTML of each batch of token cards the page adds by itself
+
+        A MutationObserver installed in the page queues every card node added to the DOM. A
+        long-poll (execute_async_script) hands them over as soon as their creator link has
+        rendered, so new tokens reach Python within about a second of appearing and only those
+        fragments need parsing. The first item, and the first after every reload, is the whole
+        page. The page is reloaded when it hasn't added a card for `reload_after` seconds (in case
+        it doesn't update itself), when it navigates away, or after a browser error.
+
+        Args:
+            url: Listing URL
+            reload_after: Seconds without new cards before the page is reloaded
+            wait: Longest a single long-poll waits for new cards
+        """
+        if not self.persistent:
+            raise ValueError("Watching a page needs a persistent browser session")
+
+        loaded = False
+        last_card = time.monotonic()
+        while True:
+            if not loaded:
+                try:
+                    html_content = self.fetch(url)
+                    # fetch() may have recycled the browser right after loading; the next pass loads a fresh one
+                    if self._driver is not None:
+                        self._driver.set_script_timeout(wait + 10)
+                        self._driver.execute_script(OBSERVE_CARDS_JS, SelectolaxParser.CARD_SELECTOR)
+                        loaded = True
+                except (TimeoutException, WebDriverException) as e:
+                    click.echo(f"Error loading {url} to watch it, retrying: {e.__class__.__name__}", err=True)
+                    time.sleep(wait)
+                    continue
+                last_card = time.monotonic()
+                yield html_content
+                continue
+
+            try:
+                cards = self._driver.execute_async_script(TAKE_CARDS_JS, int(wait * 1000), 3000)
+            except WebDriverException as e:
+                click.echo(f"Lost the page observer, reloading: {e.__class__.__name__}", err=True)
+                loaded = False
+                continue
+
+            if cards is None:
+                loaded = False
+            elif cards:
+                last_card = time.monotonic()
+                yield "<html><body>" + "".join(cards) + "</body></html>"
+            elif time.monotonic() - last_card >= reload_after:
+                if self.verbose:
+                    click.echo(f"No new cards for {reload_after:.0f}s, reloading {url}")
+                loaded = False
+
+
+class HttpFetchBackend(FetchBackend):
+    """
+    Reads the server-rendered HTML with a plain HTTP request over a pooled connection.
+
+    This skips the browser entirely, so it only works when the server response already
+    contains the token cards. Responses that don't are rejected with FetchError so the
+    caller can fall back to rendering the page.
+    """
+
+    name = "http"
+
+    def __init__(self, verbose: bool = False, timeout: float = 10, pool_size: int = 4):
+        """
+        Args:
+            verbose: Enable verbose output
+            timeout: Seconds to wait for the server before giving up
+            pool_size: Maximum number of pooled connections kept per host
+        """
+        self.verbose = verbose
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "accept": "text/html,application/xhtml+xml",
+                "user-agent": "Mozilla/5.0 (compatible; clanker-fomo-bot)",
+            }
+        )
+
+    def fetch(self, url: str) -> str:
+        """Get the server-rendered page content"""
+        if self.verbose:
+            click.echo(f"Requesting URL: {url}")
+
+        try:
+            with metrics.span("http.get"):
+                response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise FetchError(f"HTTP request for {url} failed: {e}") from e
+
+        html_content = response.text
+
+        # Same readiness check the Selenium backend waits for: creator links must be present
+        if "warpcast.com" not in html_content:
+            raise FetchError(f"Server HTML for {url} does not contain rendered token cards")
+
+        if self.verbose:
+            click.echo(f"Fetched {len(html_content)} characters over HTTP")
+
+        return html_content
+
+    def close(self) -> None:
+        """Close the pooled HTTP connections"""
+        self.session.close()
+
+
+class FallbackFetchBackend(FetchBackend):
+    """Tries a cheap backend first and falls back to another one when it can't produce the page."""
+
+    name = "auto"
+
+    def __init__(self, primary: FetchBackend, fallback: FetchBackend, verbose: bool = False):
+        self.primary = primary
+        self.fallback = fallback
+        self.verbose = verbose
+
+    def fetch(self, url: str) -> str:
+        try:
+            return self.primary.fetch(url)
+        except FetchError as e:
+            click.echo(f"{self.primary.name} backend failed ({e}), falling back to {self.fallback.name}")
+            return self.fallback.fetch(url)
+
+    def watch(self, url: str, reload_after: float = 60, wait: float = 5) -> Iterator[str]:
+        return self.fallback.watch(url, reload_after=reload_after, wait=wait)
+
+    def close(self) -> None:
+        self.primary.close()
+        self.fallback.close()
+
+
+def create_fetch_backend(name: str, verbose: bool = False, persistent: bool = False, max_page_loads: int = 500, max_heap_mb: int = 512) -> FetchBackend:
+    """
+    Build a fetch backend by name.
+
+    Args:
+        name: One of FETCH_BACKENDS ("selenium", "http" or "auto")
+        verbose: Enable verbose output
+        persistent: Keep the browser alive between fetches (Selenium only)
+        max_page_loads: Restart the persistent browser after this many page loads
+        max_heap_mb: Restart the persistent browser when its JS heap exceeds this size
+
+    Returns:
+        FetchBackend: The configured backend
+    """
+    if name == "http":
+        return HttpFetchBackend(verbose=verbose)
+
+    selenium_backend = SeleniumFetchBackend(verbose=verbose, persistent=persistent, max_page_loads=max_page_loads, max_heap_mb=max_heap_mb)
+    if name == "selenium":
+        return selenium_backend
+    if name == "auto":
+        return FallbackFetchBackend(HttpFetchBackend(verbose=verbose), selenium_backend, verbose=verbose)
+
+    raise ValueError(f"Unknown fetch backend: {name}. Expected one of {', '.join(FETCH_BACKENDS)}")
@@ -0,0 +1,200 @@
+from typing import Any, Dict, List, Optional
+from bs4 import BeautifulSoup
+
+
+PARSER_BACKENDS = ("bs4", "lxml", "selectolax")
+
+
+class HtmlParserBackend:
+    """
+    Finds token cards in a Clanker listing page and pulls out their raw fields.
+
+    Every backend matches elements the same way the original BeautifulSoup code did:
+    class names are matched as substrings of the class attribute, except `break-all`,
+    which must be a whole class.
+    """
+
+    name = "base"
+
+    def load(self, html_content: str) -> Any:
+        """Parse the HTML into the backend's document type"""
+        raise NotImplementedError
+
+    def title(self, document: Any) -> Optional[str]:
+        """Return the page title, if there is one"""
+        raise NotImplementedError
+
+    def cards(self, document: Any) -> List[Any]:
+        """Return the token card elements in document order"""
+        raise NotImplementedError
+
+    def card_fields(self, card: Any) -> Dict[str, Optional[str]]:
+        """
+        Extract the raw fields of a token card.
+
+        Returns:
+            dict: name, symbol, time_ago, creator_name, creator_link, contract_address and image_url,
+            each None when the element or attribute is missing
+        """
+        raise NotImplementedError
+
+
+class BeautifulSoupParser(HtmlParserBackend):
+    """Pure-Python parsing with BeautifulSoup and html.parser."""
+
+    name = "bs4"
+
+    def load(self, html_content: str) -> BeautifulSoup:
+        return BeautifulSoup(html_content, "html.parser")
+
+    def title(self, document: BeautifulSoup) -> Optional[str]:
+        return document.title.string if document.title else None
+
+    def cards(self, document: BeautifulSoup) -> List[Any]:
+        return document.find_all("div", class_=lambda x: x and "bg-white" in x and "rounded-lg" in x and "shadow-sm" in x)
+
+    def card_fields(self, card: Any) -> Dict[str, Optional[str]]:
+        name_element = card.find("h2", class_=lambda x: x and "text-lg" in x)
+        symbol_element = card.find("p", class_=lambda x: x and "text-sm" in x and "text-gray-500" in x)
+        time_element = card.find("span", class_=lambda x: x and "text-xs" in x and "text-gray-400" in x)
+        creator_a_tag = card.find("a", href=lambda x: x and "warpcast.com" in x)
+        address_p = card.find("p", class_="break-all")
+        img = card.find("img", class_=lambda x: x and "w-full" in x and "h-full" in x)
+
+        return {
+            "name": name_element.text.strip() if name_element else None,
+            "symbol": symbol_element.text.strip() if symbol_element else None,
+            "time_ago": time_element.text.strip() if time_element else None,
+            "creator_name": creator_a_tag.text.strip() if creator_a_tag else None,
+            "creator_link": creator_a_tag["href"] if creator_a_tag else None,
+            "contract_address": address_p["title"] if address_p and "title" in address_p.attrs else None,
+            "image_url": img["src"] if img and "src" in img.attrs else None,
+        }
+
+
+class LxmlParser(HtmlParserBackend):
+    """libxml2 parsing with XPath expressions compiled once."""
+
+    name = "lxml"
+
+    def __init__(self):
+        try:
+            from lxml import etree, html as lxml_html
+        except ImportError as e:
+            raise ImportError("The lxml parser backend requires lxml (pip install lxml)") from e
+
+        self._html = lxml_html
+        self._cards = etree.XPath("//div[contains(@class, 'bg-white') and contains(@class, 'rounded-lg') and contains(@class, 'shadow-sm')]")
+        self._title = etree.XPath("(//title)[1]")
+        self._name = etree.XPath("(.//h2[contains(@class, 'text-lg')])[1]")
+        self._symbol = etree.XPath("(.//p[contains(@class, 'text-sm') and contains(@class, 'text-gray-500')])[1]")
+        self._time = etree.XPath("(.//span[contains(@class, 'text-xs') and contains(@class, 'text-gray-400')])[1]")
+        self._creator = etree.XPath("(.//a[contains(@href, 'warpcast.com')])[1]")
+        self._address = etree.XPath("(.//p[contains(concat(' ', normalize-space(@class), ' '), ' break-all ')])[1]")
+        self._image = etree.XPath("(.//img[contains(@class, 'w-full') and contains(@class, 'h-full')])[1]")
+
+    @staticmethod
+    def _first(matches: List[Any]) -> Any:
+        return matches[0] if matches else None
+
+    def load(self, html_content: str) -> Any:
+        return self._html.document_fromstring(html_content)
+
+    def title(self, document: Any) -> Optional[str]:
+        title = self._first(self._title(document))
+        return title.text if title is not None else None
+
+    def cards(self, document: Any) -> List[Any]:
+        return self._cards(document)
+
+    def card_fields(self, card: Any) -> Dict[str, Optional[str]]:
+        name_element = self._first(self._name(card))
+        symbol_element = self._first(self._symbol(card))
+        time_element = self._first(self._time(card))
+        creator_a_tag = self._first(self._creator(card))
+        address_p = self._first(self._address(card))
+        img = self._first(self._image(card))
+
+        return {
+            "name": name_element.text_content().strip() if name_element is not None else None,
+            "symbol": symbol_element.text_content().strip() if symbol_element is not None else None,
+            "time_ago": time_element.text_content().strip() if time_element is not None else None,
+            "creator_name": creator_a_tag.text_content().strip() if creator_a_tag is not None else None,
+            "creator_link": creator_a_tag.get("href") if creator_a_tag is not None else None,
+            "contract_address": address_p.get("title") if address_p is not None else None,
+            "image_url": img.get("src") if img is not None else None,
+        }
+
+
+class SelectolaxParser(HtmlParserBackend):
+    """Lexbor parsing through selectolax with fixed CSS selectors."""
+
+    name = "selectolax"
+
+    CARD_SELECTOR = 'div[class*="bg-white"][class*="rounded-lg"][class*="shadow-sm"]'
+    NAME_SELECTOR = 'h2[class*="text-lg"]'
+    SYMBOL_SELECTOR = 'p[class*="text-sm"][class*="text-gray-500"]'
+    TIME_SELECTOR = 'span[class*="text-xs"][class*="text-gray-400"]'
+    CREATOR_SELECTOR = 'a[href*="warpcast.com"]'
+    ADDRESS_SELECTOR = "p.break-all"
+    IMAGE_SELECTOR = 'img[class*="w-full"][class*="h-full"]'
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError as e:
+            raise ImportError("The selectolax parser backend requires selectolax (pip install selectolax)") from e
+
+        self._parser = LexborHTMLParser
+
+    @staticmethod
+    def _text(node: Any) -> Optional[str]:
+        return node.text(deep=True).strip() if node is not None else None
+
+    def load(self, html_content: str) -> Any:
+        return self._parser(html_content)
+
+    def title(self, document: Any) -> Optional[str]:
+        title = document.css_first("title")
+        return title.text() if title is not None else None
+
+    def cards(self, document: Any) -> List[Any]:
+        return document.css(self.CARD_SELECTOR)
+
+    def card_fields(self, card: Any) -> Dict[str, Optional[str]]:
+        creator_a_tag = card.css_first(self.CREATOR_SELECTOR)
+        address_p = card.css_first(self.ADDRESS_SELECTOR)
+        img = card.css_first(self.IMAGE_SELECTOR)
+
+        return {
+            "name": self._text(card.css_first(self.NAME_SELECTOR)),
+            "symbol": self._text(card.css_first(self.SYMBOL_SELECTOR)),
+            "time_ago": self._text(card.css_first(self.TIME_SELECTOR)),
+            "creator_name": self._text(creator_a_tag),
+            "creator_link": creator_a_tag.attributes.get("href") if creator_a_tag is not None else None,
+            "contract_address": address_p.attributes.get("title") if address_p is not None else None,
+            "image_url": img.attributes.get("src") if img is not None else None,
+        }
+
+
+def create_parser_backend(name: str) -> HtmlParserBackend:
+    """
+    Build an HTML parser backend by name.
+
+    Args:
+        name: One of PARSER_BACKENDS ("bs4", "lxml" or "selectolax")
+
+    Returns:
+        HtmlParserBackend: The parser backend
+
+    Raises:
+        ImportError: If the backend's optional dependency isn't installed
+    """
+    if name == "bs4":
+        return BeautifulSoupParser()
+    if name == "lxml":
+        return LxmlParser()
+    if name == "selectolax":
+        return SelectolaxParser()
+
+    raise ValueError(f"Unknown parser backend: {name}. Expected one of {', '.join(PARSER_BACKENDS)}")
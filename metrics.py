@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Dict, Optional
+import click
+
+
+class MetricsRegistry:
+    """
+    Collects per-stage timings (spans), counters and gauges for one check or recent run.
+
+    Each run starts from zero. When it finishes, its metrics are written as a Prometheus textfile
+    (one file per command, for node_exporter's textfile collector) and appended as one JSON line,
+    if either destination is configured. Recording is thread-safe and cheap enough to leave on.
+    """
+
+    def __init__(self, textfile_dir: Optional[str] = None, jsonl_path: Optional[str] = None, max_samples: int = 10000):
+        """
+        Args:
+            textfile_dir: Directory for clanker_<command>.prom files
+            jsonl_path: File that gets one JSON line per run
+            max_samples: Timing samples kept per stage; older ones are dropped, so long-lived processes that never start a run stay bounded
+        """
+        self.textfile_dir = textfile_dir
+        self.jsonl_path = jsonl_path
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._spans: Dict[str, deque] = {}
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def configure(self, textfile_dir: Optional[str] = None, jsonl_path: Optional[str] = None) -> None:
+        """Set where finished runs are exported; None leaves a destination unchanged"""
+        if textfile_dir is not None:
+            self.textfile_dir = textfile_dir
+        if jsonl_path is not None:
+            self.jsonl_path = jsonl_path
+
+    def reset(self) -> None:
+        with self._lock:
+            self._spans = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one timing sample for a stage"""
+        with self._lock:
+            self._spans.setdefault(stage, deque(maxlen=self.max_samples)).append(seconds)
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Add to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Record a point-in-time value (such as a queue depth), replacing the previous one"""
+        with self._lock:
+            self._gauges[name] = value
+
+    @contextmanager
+    def span(self, stage: str):
+        """Time the enclosed block as one sample of `stage`, whether or not it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def timed(self, stage: str):
+        """Decorator form of span"""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(stage):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _quantile(ordered: list, q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+    def snapshot(self) -> Dict:
+        """
+        Summarize the current run
+
+        Returns:
+            dict: "spans" mapping each stage to count, sum, max, p50 and p95 (seconds), "counters" and "gauges"
+        """
+        with self._lock:
+            spans = {stage: sorted(samples) for stage, samples in self._spans.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        return {
+            "spans": {
+                stage: {
+                    "count": len(samples),
+                    "sum": sum(samples),
+                    "max": samples[-1],
+                    "p50": self._quantile(samples, 0.5),
+                    "p95": self._quantile(samples, 0.95),
+                }
+                for stage, samples in sorted(spans.items())
+            },
+            "counters": dict(sorted(counters.items())),
+            "gauges": dict(sorted(gauges.items())),
+        }
+
+    @contextmanager
+    def run(self, command: str):
+        """
+        Scope one run of a command: reset on entry, export on exit
+
+        Yields:
+            dict: Run state; set "status" to something other than "ok" to report a handled failure
+        """
+        self.reset()
+        state = {"status": "ok"}
+        started_at = time.time()
+        started = time.monotonic()
+        try:
+            yield state
+        except BaseException:
+            state["status"] = "error"
+            raise
+        finally:
+            self.export(command, state["status"], time.monotonic() - started, started_at)
+
+    def export(self, command: str, status: str, duration: float, started_at: float) -> None:
+        """Write the current run to the configured textfile directory and JSON lines file"""
+        if not self.textfile_dir and not self.jsonl_path:
+            return
+
+        snapshot = self.snapshot()
+        try:
+            if self.textfile_dir:
+                self._write_textfile(command, status, duration, started_at, snapshot)
+            if self.jsonl_path:
+                record = {
+                    "ts": datetime.fromtimestamp(started_at, timezone.utc).isoformat(),
+                    "command": command,
+                    "status": status,
+                    "duration": round(duration, 6),
+                    **snapshot,
+                }
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            click.echo(f"Error exporting metrics: {e}", err=True)
+
+    def _write_textfile(self, command: str, status: str, duration: float, started_at: float, snapshot: Dict) -> None:
+        base = f'command="{command}"'
+        lines = [
+            "# HELP clanker_run_duration_seconds Wall time of the last run.",
+            "# TYPE clanker_run_duration_seconds gauge",
+            f"clanker_run_duration_seconds{{{base}}} {duration:.6f}",
+            "# HELP clanker_run_success Whether the last run completed without error.",
+            "# TYPE clanker_run_success gauge",
+            f"clanker_run_success{{{base}}} {int(status == 'ok')}",
+            "# HELP clanker_run_timestamp_seconds Unix time the last run started.",
+            "# TYPE clanker_run_timestamp_seconds gauge",
+            f"clanker_run_timestamp_seconds{{{base}}} {started_at:.3f}",
+            "# HELP clanker_stage_seconds Time spent per stage during the last run.",
+            "# TYPE clanker_stage_seconds summary",
+        ]
+        for stage, summary in snapshot["spans"].items():
+            labels = f'{base},stage="{stage}"'
+            lines.append(f'clanker_stage_seconds{{{labels},quantile="0.5"}} {summary["p50"]:.6f}')
+            lines.append(f'clanker_stage_seconds{{{labels},quantile="0.95"}} {summary["p95"]:.6f}')
+            lines.append(f"clanker_stage_seconds_sum{{{labels}}} {summary['sum']:.6f}")
+            lines.append(f"clanker_stage_seconds_count{{{labels}}} {summary['count']}")
+        lines += [
+            "# HELP clanker_stage_seconds_max Slowest single sample per stage during the last run.",
+            "# TYPE clanker_stage_seconds_max gauge",
+        ]
+        lines += [f'clanker_stage_seconds_max{{{base},stage="{stage}"}} {summary["max"]:.6f}' for stage, summary in snapshot["spans"].items()]
+        lines += [
+            "# HELP clanker_events Counters recorded during the last run (tokens seen, API calls, cache hits, alerts, ...).",
+            "# TYPE clanker_events gauge",
+        ]
+        lines += [f'clanker_events{{{base},event="{name}"}} {value:g}' for name, value in snapshot["counters"].items()]
+        for name, value in snapshot["gauges"].items():
+            lines += [
+                f"# HELP clanker_{name} Value of {name} when the last run finished.",
+                f"# TYPE clanker_{name} gauge",
+                f"clanker_{name}{{{base}}} {value:g}",
+            ]
+
+        os.makedirs(self.textfile_dir, exist_ok=True)
+        path = os.path.join(self.textfile_dir, f"clanker_{command}.prom")
+        # Write then rename, so the collector never reads a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+# Shared by every module; app.py points it at METRICS_TEXTFILE_DIR / METRICS_JSONL
+metrics = MetricsRegistry()
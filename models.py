@@ -13,3 +13,5 @@ class Token:
     dexscreener_url: str
     basescan_url: str
     clanker_url: str
+    # Epoch seconds, resolved from time_ago against the time the page was fetched
+    launched_at: float | None = None
@@ -1,12 +1,24 @@
+import hashlib
+import json
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List
+import click
 from database import DatabaseManager
-from anthropic_api import TokenAnalyzer
+from anthropic_api import CLUSTERS_PROMPT, EXAMPLES_PROMPT, INSTRUCTIONS_PROMPT, TokenAnalyzer
+from token_clustering import TokenClusters
+from metrics import metrics
+
+# Cached analyses older than this are pruned whenever a new one is saved
+NARRATIVE_CACHE_RETENTION = 7 * 24 * 3600
+
+# The only token fields narrative analysis reads
+NARRATIVE_COLUMNS = ("name", "symbol")
 
 
 class TokenNarrative:
-    def __init__(self):
-        self.db_manager = DatabaseManager()
+    def __init__(self, db_manager: DatabaseManager | None = None):
+        self.db_manager = db_manager or DatabaseManager()
 
     def get_recent_tokens(self, hours=1):
         """
@@ -21,16 +33,115 @@ class TokenNarrative:
         cutoff_time = datetime.now() - timedelta(hours=hours)
         return self.db_manager.get_tokens_since(cutoff_time)
 
-    def get_current_narrative_from_tokens(self, tokens: List[Dict], top_x: int = 3) -> str:
+    def iter_recent_tokens(self, hours=1, columns: Iterable[str] | None = NARRATIVE_COLUMNS, page_size=1000) -> Iterator[Dict]:
+        """
+        Stream tokens saved in the last specified hours, newest first, with only the given columns
+
+        Args:
+            hours (int): Number of hours to look back (default: 1)
+            columns (iterable, optional): Columns to read (see DatabaseManager.iter_tokens_since); None reads them all
+            page_size (int): Rows read from the database at a time
+
+        Yields:
+            dict: One token per row
+        """
+        cutoff_time = datetime.now() - timedelta(hours=hours)
+        return self.db_manager.iter_tokens_since(cutoff_time, columns=columns, page_size=page_size)
+
+    @staticmethod
+    def normalize_token_set(tokens: List[Dict]) -> Dict[str, str]:
+        """
+        Collect the distinct names and symbols of a list of tokens
+
+        Names and symbols that differ only in case or surrounding whitespace count as one entry.
+
+        Returns:
+            dict: Normalized key mapped to the first spelling seen, sorted by key
+        """
+        entries = {}
+        for value in [token["name"] for token in tokens] + [token["symbol"] for token in tokens]:
+            value = (value or "").strip()
+            if value:
+                entries.setdefault(value.casefold(), value)
+        return dict(sorted(entries.items()))
+
+    @staticmethod
+    def token_set_hash(entries: Dict[str, str], cluster: bool = True, incremental: bool = False) -> str:
+        """
+        Hash a normalized token set together with the model and prompt variant that analyze it
+
+        Args:
+            entries (dict): Normalized token set, from normalize_token_set
+            cluster (bool): Whether the prompt sends clustered entries
+            incremental (bool): Whether the analysis may extend the previous one's themes
+        """
+        digest = hashlib.sha256(TokenAnalyzer.MODEL.encode())
+        for prompt in (EXAMPLES_PROMPT, INSTRUCTIONS_PROMPT, CLUSTERS_PROMPT if cluster else ""):
+            digest.update(b"\0" + hashlib.sha256(prompt.encode()).digest())
+        digest.update(f"\0cluster={int(cluster)}\0incremental={int(incremental)}".encode())
+        for key in entries:
+            digest.update(b"\0" + key.encode())
+        return digest.hexdigest()
+
+    def get_current_narrative_from_tokens(self, tokens: List[Dict], top_x: int = 3, incremental: bool = False, cluster: bool = True) -> dict:
         """
         Generate a narrative from a list of tokens
+
+        The analysis is cached by a hash of the normalized token set and the prompt variant (clustering,
+        incremental), so an unchanged window analyzed the same way doesn't call Claude again.
+
+        Args:
+            tokens (list): Token dictionaries with name and symbol
+            top_x (int): Number of themes to return
+            incremental (bool): Only send tokens added since the last analysis, along with the saved themes
+                that already cover tokens in this list
+            cluster (bool): Send one "Name (SYMBOL)" entry per cluster of near-duplicate names instead of
+                every name and symbol
+
+        Returns:
+            dict: The top themes, mapped to their tokens
         """
-        # read the token name and symbols into a single string
-        token_names = [token["name"] for token in tokens]
-        token_symbols = [token["symbol"] for token in tokens]
-        token_names_and_symbols = ",".join(token_names + token_symbols)
+        entries = self.normalize_token_set(tokens)
+        token_set_hash = self.token_set_hash(entries, cluster=cluster, incremental=incremental)
+
+        cached = self.db_manager.get_narrative(token_set_hash)
+        if cached:
+            click.echo(f"Narrative cache hit for {len(entries)} names and symbols")
+            metrics.increment("narrative_cache_hits")
+            return dict(json.loads(cached[1])[:top_x])
+
+        metrics.increment("narrative_cache_misses")
+        with metrics.span("narrative.cluster"):
+            clusters = TokenClusters(tokens) if cluster else None
+        if clusters is not None:
+            click.echo(clusters.summary())
+
+        sorted_themes = None
+        previous = self.db_manager.get_latest_narrative() if incremental else None
+        if previous:
+            analyzed = set(json.loads(previous[1]))
+            new_entries = [value for key, value in entries.items() if key not in analyzed]
+            spellings = {(value or "").strip() for token in tokens for value in (token["name"], token["symbol"])}
+            previous_themes = self.db_manager.get_themes_for_symbols(spellings)
+            token_list = clusters.prompt_list(clusters.keys_for(new_entries)) if clusters is not None else ",".join(new_entries)
+            if previous_themes and not token_list:
+                click.echo("No new tokens since the last narrative, reusing its themes")
+                sorted_themes = sorted(previous_themes.items(), key=lambda item: len(item[1]), reverse=True)
+            elif previous_themes:
+                click.echo(f"Sending {len(new_entries)} new of {len(entries)} names and symbols with {len(previous_themes)} previous themes")
+                sorted_themes = self._identify_themes(token_list, previous_themes, clusters)
+
+        if sorted_themes is None:
+            token_list = clusters.prompt_list() if clusters is not None else ",".join(entries.values())
+            sorted_themes = self._identify_themes(token_list, None, clusters)
+
+        self.db_manager.save_narrative(token_set_hash, json.dumps(list(entries)), json.dumps(sorted_themes))
+        self.db_manager.prune_narratives(time.time() - NARRATIVE_CACHE_RETENTION)
+        return dict(sorted_themes[:top_x])
 
-        # Use TokenAnalyzer to generate narrative
-        analyzer = TokenAnalyzer()
-        narrative = analyzer.analyze_tokens(token_names_and_symbols, top_x)
-        return narrative
+    def _identify_themes(self, token_list: str, previous_themes: dict | None, clusters: TokenClusters | None) -> list:
+        started = time.monotonic()
+        analyzer = TokenAnalyzer(db_manager=self.db_manager)
+        sorted_themes = analyzer.identify_themes(token_list, previous_themes, clusters)
+        click.echo(f"Narrative analysis of {len(token_list)} characters took {time.monotonic() - started:.2f}s")
+        return sorted_themes
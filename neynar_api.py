@@ -1,28 +1,39 @@
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional, Dict, Any
 import os
 from dotenv import load_dotenv
 import click
+from metrics import metrics
 
 
 class NeynarAPIManager:
     """Manages interactions with the Neynar API for Farcaster data."""
 
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, timeout: float = 10, pool_size: int = 16, base_url: Optional[str] = None):
         """
         Initialize the Neynar API manager.
 
         Args:
             api_key: Optional API key. If not provided, will try to load from environment variables.
+            timeout: Seconds to wait for a Neynar response before the request fails.
+            pool_size: Maximum number of pooled keep-alive connections to the API.
+            base_url: Optional API root, e.g. a local stub server. Defaults to NEYNAR_BASE_URL or the public API.
         """
         load_dotenv()
         self.api_key = api_key or os.getenv("NEYNAR_API_KEY")
         if not self.api_key:
             raise ValueError("Neynar API key is required. Provide it directly or set NEYNAR_API_KEY environment variable.")
 
-        self.base_url = "https://api.neynar.com/v2/farcaster"
+        self.timeout = timeout
+        self.base_url = (base_url or os.getenv("NEYNAR_BASE_URL") or "https://api.neynar.com/v2/farcaster").rstrip("/")
         self.headers = {"accept": "application/json", "x-neynar-experimental": "true", "x-api-key": self.api_key}
 
+        # Reuse connections across lookups and casts instead of a new TLS handshake per request
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
     def get_user_by_username(self, username: str) -> Dict[str, Any]:
         """
         Fetch user information from Neynar API by username.
@@ -39,7 +50,9 @@ class NeynarAPIManager:
         url = f"{self.base_url}/user/by_username"
         params = {"username": username}
 
-        response = requests.get(url, headers=self.headers, params=params)
+        metrics.increment("neynar_user_lookups")
+        with metrics.span("neynar.get_user_by_username"):
+            response = self.session.get(url, headers=self.headers, params=params, timeout=self.timeout)
         response.raise_for_status()
 
         return response.json()
@@ -104,7 +117,9 @@ class NeynarAPIManager:
 
         headers = {**self.headers, "content-type": "application/json"}
 
-        response = requests.post(url, json=payload, headers=headers)
+        metrics.increment("neynar_casts")
+        with metrics.span("neynar.post_cast"):
+            response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
         response.raise_for_status()
 
         return response.json()
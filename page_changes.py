@@ -0,0 +1,89 @@
+import hashlib
+import json
+import re
+from dataclasses import asdict
+from typing import Dict, Iterable, Iterator
+from database import DatabaseManager
+from metrics import metrics
+from models import Token
+
+# Contract and wallet addresses, but not the first 40 digits of a longer hex string such as a tx hash
+_ADDRESS = re.compile(r"(?<![0-9a-fA-F])0x[0-9a-fA-F]{40}(?![0-9a-fA-F])")
+
+# Card fields that change on every poll without the card itself changing
+VOLATILE_FIELDS = ("time_ago", "launched_at")
+
+
+def page_fingerprint(html_content: str) -> str:
+    """
+    Hash of the ordered addresses a listing page shows
+
+    Found with one regex pass over the raw HTML, so an unchanged page is recognized without parsing
+    it. Relative launch times ("3m ago") aren't part of it, so it stays the same from one minute to the next.
+    """
+    addresses = dict.fromkeys(address.lower() for address in _ADDRESS.findall(html_content))
+    return hashlib.sha1("\n".join(addresses).encode()).hexdigest()
+
+
+def card_hash(token: Token) -> str:
+    """Hash of everything a card shows except its relative launch time"""
+    fields = {name: value for name, value in asdict(token).items() if name not in VOLATILE_FIELDS}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class PageChangeTracker:
+    """
+    Remembers what a listing page looked like the last time a poll of it was fully processed.
+
+    State lives in the watermarks table (one row per URL), so it carries over between cron runs.
+    unchanged() compares the page fingerprint right after the fetch; changed_cards() filters a
+    partially changed page down to the cards that are new or differ. Nothing is stored until
+    save() is called, so a poll that fails halfway is processed in full by the next one, and
+    save() only records cards whose creator lookup completed (see
+    DatabaseManager.get_processed_contract_addresses), so a failed lookup is retried next poll.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, url: str):
+        self.db_manager = db_manager
+        self.name = f"page:{url}"
+        state = json.loads(db_manager.get_watermark(self.name) or "null") or {}
+        self.fingerprint = state.get("fingerprint")
+        self.cards: Dict[str, str] = state.get("cards", {})
+        self._seen_fingerprint = None
+        self._seen_cards: Dict[str, str] = {}
+
+    def unchanged(self, html_content: str) -> bool:
+        """Whether the page lists the same addresses, in the same order, as the last processed poll"""
+        self._seen_fingerprint = page_fingerprint(html_content)
+        return self._seen_fingerprint == self.fingerprint
+
+    def changed_cards(self, tokens: Iterable[Token]) -> Iterator[Token]:
+        """Yield the tokens whose card is new or differs from the last processed poll"""
+        for token in tokens:
+            digest = card_hash(token)
+            self._seen_cards[token.contract_address] = digest
+            if self.cards.get(token.contract_address) == digest:
+                metrics.increment("cards_unchanged")
+                continue
+            metrics.increment("cards_changed")
+            yield token
+
+    def save(self) -> None:
+        """
+        Record the page seen by this poll as processed
+
+        Cards whose token isn't saved with a completed creator lookup (it failed, or the poll never
+        got to it) are left out, and the page fingerprint isn't stored while any are pending, so
+        the next poll doesn't stop at the fetch and processes those cards again.
+        """
+        if self._seen_fingerprint is None:
+            return
+        processed = self.db_manager.get_processed_contract_addresses(self._seen_cards)
+        # Only the cards on this page are kept, so the state stays as small as the page
+        cards = {address: digest for address, digest in self._seen_cards.items() if address in processed}
+        pending = len(self._seen_cards) - len(cards)
+        if pending:
+            metrics.increment("cards_pending", pending)
+        fingerprint = self._seen_fingerprint if not pending else None
+        self.db_manager.set_watermark(self.name, json.dumps({"fingerprint": fingerprint, "cards": cards}))
+        self.fingerprint, self.cards = fingerprint, cards
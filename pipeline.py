@@ -0,0 +1,324 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import click
+from alert_rules import AlertRuleEngine, token_facts
+from announcer import TokenAnnouncer
+from cast_queue import CastQueue, CastQueueWorker
+from creator_cache import CreatorProfileCache
+from database import DatabaseManager
+from metrics import metrics
+from neynar_api import NeynarAPIManager
+from scraper import LOOKUP_FAILED, LOOKUP_FOUND, ClankerScraper, creator_details_from_token
+
+# Put on a queue to tell its consumer there's nothing more coming
+SENTINEL = None
+
+# Shared counters reported by the parent process
+STAT_NAMES = ("scraped", "queued", "requeued", "skipped_known", "lookups_skipped", "lookups_failed", "enriched", "qualified", "announced", "errors")
+
+
+class CountedQueue:
+    """
+    A bounded multiprocessing queue that also keeps a shared count of the items in it
+
+    multiprocessing.Queue.qsize() isn't implemented on macOS, so the depth is tracked separately.
+    """
+
+    def __init__(self, context, maxsize: int):
+        self._queue = context.Queue(maxsize)
+        self._depth = context.Value("i", 0)
+
+    def put(self, item, stop=None, timeout: float | None = None, poll: float = 0.5) -> bool:
+        """
+        Put an item, blocking while the queue is full
+
+        Returns:
+            bool: False if `stop` was set, or `timeout` seconds passed, before there was room
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            try:
+                self._queue.put(item, timeout=poll)
+                break
+            except queue.Full:
+                if (stop is not None and stop.is_set()) or (deadline is not None and time.monotonic() >= deadline):
+                    return False
+        with self._depth.get_lock():
+            self._depth.value += 1
+        return True
+
+    def get(self, timeout: float | None = None):
+        """Take the next item; raises queue.Empty after `timeout` seconds"""
+        item = self._queue.get(timeout=timeout)
+        with self._depth.get_lock():
+            self._depth.value -= 1
+        return item
+
+    def depth(self) -> int:
+        return self._depth.value
+
+
+class PipelineStats:
+    """Counters shared by every pipeline process"""
+
+    def __init__(self, context):
+        self._values = {name: context.Value("l", 0) for name in STAT_NAMES}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        counter = self._values[name]
+        with counter.get_lock():
+            counter.value += value
+
+    def snapshot(self) -> Dict[str, int]:
+        return {name: counter.value for name, counter in self._values.items()}
+
+
+def _ignore_interrupts() -> None:
+    # Ctrl-C goes to the whole process group; only the parent reacts and shuts the stages down in order
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _build_scraper(config: Dict, db_manager: DatabaseManager, **kwargs) -> ClankerScraper:
+    profile_cache = CreatorProfileCache(db_manager, ttl=config["profile_ttl"], stale_ttl=config["profile_stale_ttl"]) if config["profile_ttl"] > 0 else None
+    return ClankerScraper(verbose=config["verbose"], parser=config["parser"], neynar_timeout=config["neynar_timeout"], profile_cache=profile_cache, **kwargs)
+
+
+def scrape_worker(index: int, config: Dict, tokens: CountedQueue, stats: PipelineStats, stop) -> None:
+    """
+    Poll the listing and queue every token this worker hasn't queued recently
+
+    A recently queued token whose creator lookup failed is queued again, at most once per poll,
+    until a lookup succeeds. With several scrapers, each starts `interval / scrapers` seconds
+    after the previous one, so together they poll more often than one could.
+    """
+    _ignore_interrupts()
+    db_manager = DatabaseManager()
+    scraper = _build_scraper(config, db_manager, backend=config["backend"], persistent=True)
+    # Addresses already queued by this worker, oldest first, so page 1 isn't queued again every poll
+    recent = OrderedDict()
+    stop.wait(index * config["interval"] / config["scrapers"])
+    try:
+        while not stop.is_set():
+            started = time.monotonic()
+            try:
+                html_content = scraper.get_dynamic_page_content(config["url"])
+                fetched_at = time.time()
+                for token in scraper.iter_clanker_page(html_content, fetched_at=fetched_at):
+                    stats.increment("scraped")
+                    if token.contract_address in recent:
+                        if not db_manager.get_failed_lookup_addresses([token.contract_address]):
+                            continue
+                        stats.increment("requeued")
+                    if not tokens.put((token, fetched_at), stop=stop):
+                        return
+                    recent[token.contract_address] = None
+                    if len(recent) > 5000:
+                        recent.popitem(last=False)
+                    stats.increment("queued")
+            except Exception as e:
+                stats.increment("errors")
+                click.echo(f"[scraper {index}] Error polling {config['url']}: {e}", err=True)
+            stop.wait(max(0, config["interval"] - (time.monotonic() - started)))
+    finally:
+        scraper.close()
+
+
+def enrich_worker(index: int, config: Dict, tokens: CountedQueue, qualified: CountedQueue, stats: PipelineStats) -> None:
+    """
+    Save new tokens, look up the creators an alert rule could still match and queue the ones worth announcing
+
+    Up to `concurrency` tokens are enriched at once on threads; the next token is only taken off
+    the queue when a thread is free, so a backlog stays in the bounded queue. Exits after the
+    sentinel, once the tokens in flight are done.
+    """
+    _ignore_interrupts()
+    db_manager = DatabaseManager()
+    scraper = _build_scraper(config, db_manager, backend="http")
+    alert_rules = AlertRuleEngine.load(config["alert_rules_file"])
+    slots = threading.Semaphore(config["concurrency"])
+
+    def handle(token, fetched_at):
+        try:
+            # Tokens whose lookup failed or never finished aren't processed, so they're enriched again
+            if db_manager.get_processed_contract_addresses([token.contract_address]):
+                stats.increment("skipped_known")
+                return
+            db_manager.save_tokens_bulk([token], detected_at=fetched_at)
+            lookup = alert_rules.needs_lookup(token, scraper.cached_creator_details(token))
+            if not lookup:
+                stats.increment("lookups_skipped")
+            token_dict = scraper.format_token_dict(token, lookup)
+            creator_details = creator_details_from_token(token_dict)
+            with db_manager.transaction():
+                if token_dict["creator_lookup"] == LOOKUP_FOUND:
+                    db_manager.add_creator_details_bulk([(token.contract_address, creator_details)])
+                db_manager.set_creator_lookups_bulk([(token.contract_address, token_dict["creator_lookup"])])
+            if token_dict["creator_lookup"] == LOOKUP_FAILED:
+                # The token stays unprocessed; a scraper queues it again on its next poll
+                stats.increment("lookups_failed")
+                return
+            stats.increment("enriched")
+            if alert_rules.evaluate(token_facts(token_dict, creator_details)).alert and not db_manager.is_token_announced(token.contract_address):
+                stats.increment("qualified")
+                qualified.put(token_dict)
+        except Exception as e:
+            stats.increment("errors")
+            click.echo(f"[enricher {index}] Error enriching {token.contract_address}: {e}", err=True)
+        finally:
+            slots.release()
+
+    try:
+        with ThreadPoolExecutor(max_workers=config["concurrency"], thread_name_prefix=f"enrich{index}") as executor:
+            while True:
+                slots.acquire()
+                item = tokens.get()
+                if item is SENTINEL:
+                    slots.release()
+                    break
+                executor.submit(handle, *item)
+    finally:
+        scraper.close()
+
+
+def announce_worker(config: Dict, qualified: CountedQueue, stats: PipelineStats) -> None:
+    """Claim and announce qualified tokens, posting their casts from a background cast worker"""
+    _ignore_interrupts()
+    db_manager = DatabaseManager()
+    neynar = NeynarAPIManager()
+    cast_queue = CastQueue(db_manager)
+    cast_worker = CastQueueWorker(cast_queue, neynar, posts_per_minute=float(os.getenv("CAST_POSTS_PER_MINUTE", "10")))
+    announcer = TokenAnnouncer(notified_tokens_cache_file=config["notified_tokens_cache_file"], db_manager=db_manager, cast_queue=cast_queue)
+    if not config["dryrun"]:
+        cast_worker.start()
+    try:
+        while True:
+            token = qualified.get()
+            if token is SENTINEL:
+                break
+            token_id = token.get("contract_address")
+            # The claim is atomic, so a token queued twice (or announced by a concurrent check) goes out once
+            if config["dryrun"] or not announcer.mark_token_announced(token_id):
+                continue
+            try:
+                creator_details = creator_details_from_token(token)
+                click.echo(f"🔔 Notifying {token.get('name')} with {creator_details['follower_count']} followers and Neynar score {creator_details['neynar_score']} 🔔")
+                announcer.announce_token(token)
+                stats.increment("announced")
+            except Exception as e:
+                stats.increment("errors")
+                click.echo(f"[announcer] Error announcing {token_id}: {e}", err=True)
+    finally:
+        if not config["dryrun"]:
+            cast_worker.drain(timeout=config["drain_timeout"])
+        cast_worker.stop()
+        db_manager.close()
+
+
+class Pipeline:
+    """
+    Runs polling, enrichment and announcing as separate processes joined by bounded queues.
+
+    scrapers -> tokens queue -> enrichers -> qualified queue -> announcer
+
+    A slow page render only delays the scrapers; tokens already queued keep being enriched and
+    announced. Full queues block the stage feeding them, so memory stays bounded when a stage
+    falls behind. stop() shuts the stages down front to back: scrapers finish their poll, each
+    enricher finishes the tokens it took, and the announcer announces what's left and drains the
+    cast queue.
+    """
+
+    def __init__(self, config: Dict, scrapers: int = 1, enrichers: int = 2, queue_size: int = 500):
+        """
+        Args:
+            config: Settings shared with the worker processes (url, interval, backend, parser, concurrency, ...)
+            scrapers: Polling processes
+            enrichers: Enrichment processes, each running `concurrency` lookups at once
+            queue_size: Capacity of each queue
+        """
+        self.context = multiprocessing.get_context("spawn")
+        self.config = dict(config, scrapers=scrapers)
+        self.tokens = CountedQueue(self.context, queue_size)
+        self.qualified = CountedQueue(self.context, queue_size)
+        self.stats = PipelineStats(self.context)
+        self.stop_event = self.context.Event()
+        self.scrapers = [self.context.Process(target=scrape_worker, args=(i, self.config, self.tokens, self.stats, self.stop_event), name=f"scraper-{i}") for i in range(scrapers)]
+        self.enrichers = [self.context.Process(target=enrich_worker, args=(i, self.config, self.tokens, self.qualified, self.stats), name=f"enricher-{i}") for i in range(enrichers)]
+        self.announcer = self.context.Process(target=announce_worker, args=(self.config, self.qualified, self.stats), name="announcer")
+
+    @property
+    def processes(self):
+        return self.scrapers + self.enrichers + [self.announcer]
+
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    def report(self) -> Dict:
+        """Log queue depths and stage counters, and export them as metrics"""
+        depths = {"tokens": self.tokens.depth(), "qualified": self.qualified.depth()}
+        counts = self.stats.snapshot()
+        click.echo(
+            f"Queues: tokens {depths['tokens']}, qualified {depths['qualified']} | "
+            + ", ".join(f"{name.replace('_', ' ')} {value}" for name, value in counts.items())
+        )
+        with metrics.run("pipeline"):
+            for name, depth in depths.items():
+                metrics.set_gauge(f"queue_depth_{name}", depth)
+            for name, value in counts.items():
+                metrics.increment(f"pipeline_{name}", value)
+        return {"depths": depths, "counts": counts}
+
+    def run(self, report_interval: float = 30) -> None:
+        """Start every stage and report until interrupted or a stage dies, then stop"""
+        # Ctrl-C and SIGTERM only raise a flag: setting the shared stop event from a signal handler could
+        # deadlock on its lock, and a KeyboardInterrupt could land in the middle of stop()
+        self._stop_requested = False
+
+        def request_stop(signum, frame):
+            self._stop_requested = True
+
+        previous_handlers = {signum: signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.start()
+            next_report = time.monotonic() + report_interval
+            while not self._stop_requested:
+                time.sleep(0.2)
+                if time.monotonic() < next_report:
+                    continue
+                next_report += report_interval
+                self.report()
+                dead = [process.name for process in self.processes if not process.is_alive()]
+                if dead:
+                    click.echo(f"Pipeline process(es) exited unexpectedly: {', '.join(dead)}; shutting down", err=True)
+                    break
+        finally:
+            self.stop()
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop(self, timeout: float = 60) -> None:
+        """Shut the stages down in order, letting each drain what the previous one queued"""
+        click.echo("Stopping pipeline...")
+        self.stop_event.set()
+        started = lambda processes: [process for process in processes if process.pid is not None]
+        for process in started(self.scrapers):
+            process.join(timeout)
+        for _ in started(self.enrichers):
+            self.tokens.put(SENTINEL, timeout=timeout)
+        for process in started(self.enrichers):
+            process.join(timeout)
+        if started([self.announcer]):
+            self.qualified.put(SENTINEL, timeout=timeout)
+            self.announcer.join(timeout + self.config["drain_timeout"])
+        for process in started(self.processes):
+            if process.is_alive():
+                click.echo(f"{process.name} didn't stop in time, terminating it", err=True)
+                process.terminate()
+        self.report()
@@ -1,19 +1,84 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
-from bs4 import BeautifulSoup
+import re
+import time
 import click
-from typing import List, Dict
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
 from models import Token
 from neynar_api import NeynarAPIManager
+from fetch_backends import FetchBackend, create_fetch_backend
+from creator_cache import CreatorProfileCache
+from html_parsers import HtmlParserBackend, create_parser_backend
+from metrics import metrics
+
+# Seconds per unit of a relative launch time such as "2m ago" or "about 1 hour ago"
+TIME_AGO_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400, "mo": 30 * 86400, "y": 365 * 86400}
+# Outcome of a token's creator lookup, recorded in its dict as "creator_lookup"
+LOOKUP_FOUND = "found"
+LOOKUP_FAILED = "failed"
+# Not requested (e.g. no alert rule could match), or the card has no creator to look up
+LOOKUP_SKIPPED = "skipped"
+
+_TIME_AGO = re.compile(r"(?P<amount>\d+|an?|one)\s*(?P<unit>mo(?:nths?)?|s(?:ecs?|econds?)?|m(?:ins?|inutes?)?|h(?:rs?|ours?)?|d(?:ays?)?|w(?:ks?|eeks?)?|y(?:rs?|ears?)?)\b")
+
+
+def resolve_time_ago(time_ago: str | None, fetched_at: float) -> float | None:
+    """
+    Turn a relative launch time from the listing into an absolute timestamp
+
+    Args:
+        time_ago: Text such as "2m ago", "3 hours ago", "an hour ago" or "just now"
+        fetched_at: Epoch seconds when the page was fetched
+
+    Returns:
+        float: Epoch seconds of the launch (as precise as the text's unit), or None if it can't be parsed
+    """
+    text = (time_ago or "").strip().casefold()
+    if text in ("just now", "now") or text.startswith("less than a minute"):
+        return fetched_at
+    match = _TIME_AGO.search(text)
+    if not match:
+        return None
+    amount = match.group("amount")
+    amount = int(amount) if amount.isdigit() else 1
+    unit = match.group("unit")
+    unit = "mo" if unit.startswith("mo") else unit[0]
+    return fetched_at - amount * TIME_AGO_UNITS[unit]
+
+
+def creator_details_from_token(token: Dict) -> Dict:
+    """Pull the creator_details row (username, addresses, followers, Neynar score) out of an enriched token dict"""
+    creator_data = token.get("creator", {}) or {}
+    user_data = (creator_data.get("neynar_data", {}) or {}).get("user", {}) or {}
+    return {
+        "username": creator_data.get("username"),
+        "eth_addresses": creator_data.get("eth_addresses") or token.get("eth_addresses") or [],
+        "follower_count": user_data.get("follower_count", 0),
+        "neynar_score": user_data.get("experimental", {}).get("neynar_user_score", 0),
+    }
 
 
 class ClankerScraper:
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, backend: str | FetchBackend = "selenium", persistent: bool = False, max_page_loads: int = 500, max_heap_mb: int = 512, neynar_timeout: float = 10, profile_cache: CreatorProfileCache | None = None, parser: str | HtmlParserBackend = "bs4"):
+        """
+        Args:
+            verbose: Enable verbose output
+            backend: Fetch backend name ("selenium", "http" or "auto") or a FetchBackend instance
+            persistent: Keep one Chrome session alive across calls to get_dynamic_page_content
+            max_page_loads: Restart the persistent browser after this many page loads
+            max_heap_mb: Restart the persistent browser when the page's JS heap grows past this size
+            neynar_timeout: Seconds before a single Neynar lookup is abandoned
+            profile_cache: Optional cache consulted before calling Neynar for creator profiles
+            parser: HTML parser backend name ("bs4", "lxml" or "selectolax") or a HtmlParserBackend instance
+        """
         self.verbose = verbose
-        self.neynar = NeynarAPIManager()
+        self.neynar = NeynarAPIManager(timeout=neynar_timeout)
+        self.profile_cache = profile_cache
+        self.parser = parser if isinstance(parser, HtmlParserBackend) else create_parser_backend(parser)
+        if isinstance(backend, FetchBackend):
+            self.fetch_backend = backend
+        else:
+            self.fetch_backend = create_fetch_backend(backend, verbose=verbose, persistent=persistent, max_page_loads=max_page_loads, max_heap_mb=max_heap_mb)
 
     def extract_warpcast_username(self, url: str | None) -> str | None:
         """Extract username from Warpcast URL"""
@@ -21,27 +86,44 @@ class ClankerScraper:
             return None
         return url.rstrip("/").split("/")[-1]
 
-    def format_token_dict(self, token: Token) -> Dict:
-        """Convert Token object to dictionary format and enrich with Neynar API data"""
+    def cached_creator_details(self, token: Token) -> Dict | None:
+        """The creator's details from a fresh cached profile, or None when only a lookup would tell"""
+        username = self.extract_warpcast_username(token.creator_link)
+        profile = self.profile_cache.peek(username) if self.profile_cache and username else None
+        if profile is None:
+            return None
+        return creator_details_from_token({"creator": {"username": username, "neynar_data": profile}})
+
+    def format_token_dict(self, token: Token, lookup: bool = True) -> Dict:
+        """Convert Token object to dictionary format and enrich with Neynar API data, unless `lookup` is False"""
         warpcast_username = self.extract_warpcast_username(token.creator_link)
         neynar_user_info = None
         cast_count = 0  # Initialize cast count
         eth_addresses = None
+        creator_lookup = LOOKUP_SKIPPED
 
-        if warpcast_username:
+        if warpcast_username and lookup:
+            creator_lookup = LOOKUP_FOUND
             try:
-                neynar_user_info = self.neynar.get_user_by_username(warpcast_username)
+                with metrics.span("enrich.creator_lookup"):
+                    if self.profile_cache:
+                        neynar_user_info = self.profile_cache.get(warpcast_username, self.neynar.get_user_by_username)
+                    else:
+                        neynar_user_info = self.neynar.get_user_by_username(warpcast_username)
                 # More defensive eth_address extraction
                 verified_addresses = neynar_user_info.get("user", {}).get("verified_addresses", {})
                 eth_addresses = verified_addresses.get("eth_addresses", [])
             except Exception as e:
                 click.echo(f"Error fetching Neynar data for {warpcast_username}: {e}", err=True)
+                metrics.increment("creator_lookup_errors")
+                creator_lookup = LOOKUP_FAILED
                 # Continue with default None values for neynar_user_info and eth_address
 
         return {
             "name": token.name,
             "symbol": token.symbol,
             "time_ago": token.time_ago,
+            "launched_at": token.launched_at,
             "creator": {"name": token.creator_name, "link": token.creator_link, "username": warpcast_username, "neynar_data": neynar_user_info},
             "contract_address": token.contract_address,
             "image_url": token.image_url,
@@ -52,73 +134,120 @@ class ClankerScraper:
             },
             "eth_addresses": eth_addresses,
             "cast_count": cast_count,
+            "creator_lookup": creator_lookup,
         }
 
-    def get_dynamic_page_content(self, url: str) -> str:
-        """Get page content after JavaScript execution"""
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Run in headless mode
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-
-        click.echo("Starting Chrome in headless mode...")
-
-        driver = webdriver.Chrome(options=chrome_options)
-        try:
-            if self.verbose:
-                click.echo(f"Loading URL: {url}")
-
-            driver.get(url)
-
-            # Wait for the tokens to load
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CLASS_NAME, "flex-1")))
-
-            # Wait specifically for the Warpcast links to be loaded
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, "//a[contains(@href, 'warpcast.com')]")))
+    def iter_token_dicts(self, tokens: Iterable[Token], max_workers: int = 8, should_lookup: Callable[[Token], bool] | None = None) -> Iterator[Dict]:
+        """
+        Lazily enrich tokens with Neynar data using a bounded thread pool.
+
+        Tokens are pulled from the input only as slots free up, so at most `max_workers`
+        lookups are in flight and each dict is yielded as soon as it and everything before
+        it is ready.
+
+        Args:
+            tokens: Tokens to format, in page order (may be a generator)
+            max_workers: Maximum number of Neynar lookups in flight at once
+            should_lookup: Decides per token whether its creator is looked up (e.g. AlertRuleEngine.needs_lookup); defaults to all
+
+        Yields:
+            dict: Token dictionaries in the same order as the input tokens
+        """
+        should_lookup = should_lookup or (lambda token: True)
+        if max_workers <= 1:
+            for token in tokens:
+                yield self.format_token_dict(token, should_lookup(token))
+            return
+
+        # format_token_dict never raises for lookup failures and each request carries its own
+        # timeout, so one slow creator can only hold up its own slot in the pool
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="neynar") as executor:
+            pending = deque()
+            for token in tokens:
+                pending.append(executor.submit(self.format_token_dict, token, should_lookup(token)))
+                if len(pending) >= max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def format_token_dicts(self, tokens: List[Token], max_workers: int = 8) -> List[Dict]:
+        """Enrich a batch of tokens concurrently, returning dicts in the same order as the input"""
+        return list(self.iter_token_dicts(tokens, max_workers=max_workers))
+
+    def close(self) -> None:
+        """Release the fetch backend's browser or connection pool and finish cache refreshes"""
+        self.fetch_backend.close()
+        if self.profile_cache:
+            self.profile_cache.close()
 
-            if self.verbose:
-                click.echo("Page loaded successfully with creator info")
-
-            return driver.page_source
-        finally:
-            driver.quit()
-
-    def parse_clanker_page(self, html_content: str) -> List[Token]:
+    def get_dynamic_page_content(self, url: str) -> str:
+        """Get page content using the configured fetch backend"""
+        with metrics.span("fetch"):
+            return self.fetch_backend.fetch(url)
+
+    def watch_new_tokens(self, url: str, reload_after: float = 60, wait: float = 5) -> Iterator[Tuple[List[Token], float]]:
+        """
+        Yield tokens as the live page adds them, instead of polling (selenium backend only)
+
+        The first batch, and the first after every reload, is the whole page; later batches are
+        only the cards the page has added since, parsed on their own.
+
+        Args:
+            url: Listing URL
+            reload_after: Seconds without new cards before the page is reloaded
+            wait: Longest a single wait for new cards lasts
+
+        Yields:
+            tuple: (tokens, epoch seconds they were seen)
+        """
+        for html_content in self.fetch_backend.watch(url, reload_after=reload_after, wait=wait):
+            fetched_at = time.time()
+            yield self.parse_clanker_page(html_content, fetched_at=fetched_at), fetched_at
+
+    def parse_clanker_page(self, html_content: str, fetched_at: float | None = None) -> List[Token]:
+        return list(self.iter_clanker_page(html_content, fetched_at=fetched_at))
+
+    def iter_clanker_page(self, html_content: str, fetched_at: float | None = None) -> Iterator[Token]:
+        """
+        Parse the listing page, yielding each Token as soon as its card has been parsed
+
+        Args:
+            html_content: The listing page's HTML
+            fetched_at: Epoch seconds when the page was fetched, used to resolve each card's launch time (defaults to now)
+        """
+        fetched_at = fetched_at if fetched_at is not None else time.time()
         if self.verbose:
-            click.echo(f"Starting HTML parsing...")
+            click.echo(f"Starting HTML parsing with the {self.parser.name} backend...")
 
-        soup = BeautifulSoup(html_content, "html.parser")
+        with metrics.span("parse.load"):
+            document = self.parser.load(html_content)
 
         if self.verbose:
-            click.echo(f"Page title: {soup.title.string if soup.title else 'No title found'}")
+            click.echo(f"Page title: {self.parser.title(document) or 'No title found'}")
 
-        token_cards = soup.find_all("div", class_=lambda x: x and "bg-white" in x and "rounded-lg" in x and "shadow-sm" in x)
+        with metrics.span("parse.cards"):
+            token_cards = self.parser.cards(document)
 
         if self.verbose:
             click.echo(f"Found {len(token_cards)} token cards")
 
-        tokens = []
-
         for idx, card in enumerate(token_cards, 1):
             try:
                 if self.verbose:
                     click.echo(f"\nProcessing card {idx}...")
 
-                # Extract basic token info
-                name_element = card.find("h2", class_=lambda x: x and "text-lg" in x)
-                name = name_element.text.strip() if name_element else "Unknown"
-
-                symbol_element = card.find("p", class_=lambda x: x and "text-sm" in x and "text-gray-500" in x)
-                symbol = symbol_element.text.strip() if symbol_element else "Unknown"
+                with metrics.span("parse.card"):
+                    fields = self.parser.card_fields(card)
 
-                time_element = card.find("span", class_=lambda x: x and "text-xs" in x and "text-gray-400" in x)
-                time_ago = time_element.text.strip() if time_element else "Unknown"
+                # Extract basic token info
+                name = fields["name"] if fields["name"] is not None else "Unknown"
+                symbol = fields["symbol"] if fields["symbol"] is not None else "Unknown"
+                time_ago = fields["time_ago"] if fields["time_ago"] is not None else "Unknown"
 
                 # Extract creator name and link
-                creator_a_tag = card.find("a", href=lambda x: x and "warpcast.com" in x)
-                if creator_a_tag:
-                    creator_name = creator_a_tag.text.strip()
-                    creator_link = creator_a_tag["href"]
+                if fields["creator_link"] is not None:
+                    creator_name = fields["creator_name"]
+                    creator_link = fields["creator_link"]
                     if self.verbose:
                         click.echo(f"Creator found: {repr(creator_name)} ({creator_link})")
                 else:
@@ -128,12 +257,10 @@ class ClankerScraper:
                         click.echo("Creator info not found.")
 
                 # Extract contract address
-                address_p = card.find("p", class_="break-all")
-                contract_address = address_p["title"] if address_p and "title" in address_p.attrs else "Unknown"
+                contract_address = fields["contract_address"] if fields["contract_address"] is not None else "Unknown"
 
                 # Extract image URL
-                img = card.find("img", class_=lambda x: x and "w-full" in x and "h-full" in x)
-                image_url = img["src"] if img and "src" in img.attrs else None
+                image_url = fields["image_url"]
 
                 # Extract external links
                 dexscreener_url = "https://dexscreener.com/base/" + contract_address
@@ -154,15 +281,16 @@ class ClankerScraper:
                     dexscreener_url=dexscreener_url,
                     basescan_url=basescan_url,
                     clanker_url=clanker_page_url,
+                    launched_at=resolve_time_ago(fields["time_ago"], fetched_at),
                 )
 
-                tokens.append(token)
-
                 if self.verbose:
                     click.echo(f"Successfully parsed token: {name} ({symbol})")
 
             except Exception as e:
                 click.echo(f"Error parsing token card {idx}: {e}", err=True)
+                metrics.increment("parse_errors")
                 continue
 
-        return tokens
+            metrics.increment("tokens_seen")
+            yield token
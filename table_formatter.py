@@ -1,60 +1,145 @@
+import json
+from functools import lru_cache
+import click
 from rich.console import Console
 from rich.table import Table
-from typing import List, Dict
+from typing import Iterable, Dict
 
+# How display_tokens renders tokens: a paginated Rich table, rows printed as they arrive, compact JSON lines, or nothing
+OUTPUT_MODES = ["table", "stream", "jsonl", "none"]
 
-def create_token_table(tokens: List[Dict]) -> Table:
+SEARCH_URL = "https://warpcast.com/~/search/recent?q={}"
+DEXCHECK_URL = "https://dexcheck.ai/app/wallet-analyzer/{}?tab=pnl-calculator&chain=base"
+
+# (header, column options), in display order
+COLUMNS = [
+    ("Name", {"style": "cyan", "overflow": "fold", "no_wrap": False}),
+    ("Symbol", {"style": "green", "no_wrap": True}),
+    ("Dexscreener Link", {"style": "blue", "no_wrap": True}),
+    ("BaseScan Link", {"style": "blue", "no_wrap": True}),
+    ("Clanker Link", {"style": "blue", "no_wrap": True}),
+    ("Warpcast Link", {"style": "yellow", "overflow": "ellipsis", "no_wrap": True}),
+    ("Power Badge", {"style": "red", "justify": "center"}),
+    ("Followers", {"style": "white", "justify": "right"}),
+    ("Cast Count", {"style": "magenta", "justify": "right"}),
+    ("Neynar Score", {"style": "cyan", "justify": "right"}),
+    ("Search Link", {"no_wrap": True}),
+    ("DEXCheck Links", {"style": "blue", "no_wrap": True}),
+]
+
+_console = None
+
+
+def get_console() -> Console:
+    """The shared wide console tables are printed on, created on first use"""
+    global _console
+    if _console is None:
+        _console = Console(width=800)
+    return _console
+
+
+@lru_cache(maxsize=4096)
+def search_link(name: str) -> str:
+    """Warpcast search link for a token name"""
+    return SEARCH_URL.format(name.replace(" ", "+"))
+
+
+@lru_cache(maxsize=4096)
+def dexcheck_link(address: str) -> str:
+    """DEXCheck wallet analyzer link for a creator address"""
+    return DEXCHECK_URL.format(address)
+
+
+def token_row(token: Dict) -> tuple:
+    """Build the table cells for one token"""
+    creator_data = token.get("creator", {}) or {}
+    neynar_data = creator_data.get("neynar_data", {}) or {}
+    user_data = neynar_data.get("user", {}) or {}
+    links = token.get("links", {})
+    eth_addresses = token.get("eth_addresses", [])
+
+    return (
+        token.get("name", "Unknown"),
+        token.get("symbol", "Unknown"),
+        links.get("dexscreener", "N/A"),
+        links.get("basescan", "N/A"),
+        links.get("clanker", "N/A"),
+        creator_data.get("link", "N/A"),
+        str(user_data.get("power_badge", False)),
+        str(user_data.get("follower_count", "N/A")),
+        str(token.get("cast_count", 0)),
+        str(user_data.get("experimental", {}).get("neynar_user_score", "N/A")),
+        search_link(token.get("name", "Unknown")),
+        ", ".join(dexcheck_link(addr) for addr in eth_addresses) if eth_addresses else "N/A",
+    )
+
+
+def create_token_table(tokens: Iterable[Dict], title: str | None = "Clanker Tokens") -> Table:
     """Create and populate a Rich table with token data."""
-    table = Table(title="Clanker Tokens", show_header=True, header_style="bold magenta", box=None)
-
-    # Add columns
-    table.add_column("Name", style="cyan", overflow="fold", no_wrap=False)
-    table.add_column("Symbol", style="green", no_wrap=True)
-    table.add_column("Dexscreener Link", style="blue", no_wrap=True)
-    table.add_column("BaseScan Link", style="blue", no_wrap=True)
-    table.add_column("Clanker Link", style="blue", no_wrap=True)
-    table.add_column("Warpcast Link", style="yellow", overflow="ellipsis", no_wrap=True)
-    table.add_column("Power Badge", style="red", justify="center")
-    table.add_column("Followers", style="white", justify="right")
-    table.add_column("Cast Count", style="magenta", justify="right")
-    table.add_column("Neynar Score", style="cyan", justify="right")
-    table.add_column("Search Link", no_wrap=True)
-    table.add_column("DEXCheck Links", style="blue", no_wrap=True)
-
-    # Add rows
+    table = Table(title=title, show_header=True, header_style="bold magenta", box=None)
+    for header, options in COLUMNS:
+        table.add_column(header, **options)
+
     for token in tokens:
-        creator_data = token.get("creator", {}) or {}
-        neynar_data = creator_data.get("neynar_data", {}) or {}
-        user_data = neynar_data.get("user", {}) or {}
-        neynar_score = user_data.get("experimental", {}).get("neynar_user_score", "N/A")
-
-        search_term = token.get("name", "Unknown").replace(" ", "+")
-        search_link = f"https://warpcast.com/~/search/recent?q={search_term}"
-
-        # Create DEXCheck links for all eth addresses
-        eth_addresses = token.get("eth_addresses", [])
-        dexcheck_links = [f"https://dexcheck.ai/app/wallet-analyzer/{addr}?tab=pnl-calculator&chain=base" for addr in eth_addresses] if eth_addresses else ["N/A"]
-
-        table.add_row(
-            token.get("name", "Unknown"),
-            token.get("symbol", "Unknown"),
-            token.get("links", {}).get("dexscreener", "N/A"),
-            token.get("links", {}).get("basescan", "N/A"),
-            token.get("links", {}).get("clanker", "N/A"),
-            creator_data.get("link", "N/A"),
-            str(user_data.get("power_badge", False)),
-            str(user_data.get("follower_count", "N/A")),
-            str(token.get("cast_count", 0)),
-            str(neynar_score),
-            search_link,
-            ", ".join(dexcheck_links),
-        )
+        table.add_row(*token_row(token))
 
     return table
 
 
-def display_tokens(tokens: List[Dict]) -> None:
-    """Display token data in a clean, colorized format."""
-    console = Console(width=800)
-    table = create_token_table(tokens)
-    console.print(table)
+class TokenTableStream:
+    """
+    Prints tokens as Rich tables of up to `page_size` rows, as soon as each page fills up.
+
+    Feed it tokens while they're still being produced (e.g. enriched) so a large result set
+    never has to be held in one table; close() prints whatever is left.
+    """
+
+    def __init__(self, page_size: int = 50, console: Console | None = None):
+        self.page_size = max(1, page_size)
+        self.console = console or get_console()
+        self.rows_printed = 0
+        self._page = []
+
+    def add(self, token: Dict) -> None:
+        self._page.append(token)
+        if len(self._page) >= self.page_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Print the rows buffered so far as one page"""
+        if not self._page:
+            return
+        first = self.rows_printed == 0
+        self.console.print(create_token_table(self._page, title="Clanker Tokens" if first else None))
+        self.rows_printed += len(self._page)
+        self._page = []
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def display_tokens(tokens: Iterable[Dict], mode: str = "table", page_size: int = 50) -> None:
+    """
+    Display token data in a clean, colorized format.
+
+    Args:
+        tokens: Token dictionaries (a list or any iterable, consumed once)
+        mode: One of OUTPUT_MODES. "table" and "stream" both print pages of `page_size` rows; "jsonl"
+            prints one compact JSON object per token; "none" prints nothing, for cron and daemons
+        page_size: Rows per printed table page
+    """
+    if mode == "none":
+        return
+    if mode == "jsonl":
+        for token in tokens:
+            click.echo(json.dumps(token, default=str, ensure_ascii=False, separators=(",", ":")))
+        return
+    with TokenTableStream(page_size) as stream:
+        for token in tokens:
+            stream.add(token)
@@ -0,0 +1,183 @@
+import random
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+# Names the scraper fills in when a card has no name or symbol
+PLACEHOLDER_VALUES = {"unknown"}
+
+_NON_WORD = re.compile(r"[^\w]+")
+_DIGITS = re.compile(r"\d+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize(value: Optional[str]) -> str:
+    """
+    Normalize a token name or symbol for comparison
+
+    Applies NFKC, casefolds, drops a leading "$" and turns runs of punctuation into single spaces.
+    Values made only of symbols (e.g. emoji) keep their casefolded form so they aren't all merged as "".
+    """
+    value = unicodedata.normalize("NFKC", value or "").strip().casefold()
+    normalized = " ".join(_NON_WORD.sub(" ", value.lstrip("$")).split())
+    return normalized or value
+
+
+def _compact(value: str) -> str:
+    return value.replace(" ", "")
+
+
+def _shingles(key: str, size: int = 3) -> set:
+    padded = f" {key} "
+    return {padded[i : i + size] for i in range(len(padded) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class TokenClusters:
+    """
+    Groups a window of tokens into clusters of near-duplicate names, for a compact LLM prompt.
+
+    Each token's name and symbol are linked into one entry ("Name (SYMBOL)"), and entries with the same
+    normalized name are merged. A remaining name joins an earlier cluster when its character 3-grams
+    overlap the cluster's first name by at least `threshold` (Jaccard) and both contain the same numbers,
+    so "Project 24" and "Project 25" stay apart. Candidates come from MinHash signatures bucketed by
+    LSH bands, so the cost grows with the number of distinct names rather than its square.
+    """
+
+    def __init__(self, tokens: Iterable[Dict], threshold: float = 0.7, num_perm: int = 32, bands: int = 8, min_length: int = 4):
+        """
+        Args:
+            tokens: Token dictionaries with name and symbol
+            threshold: Minimum 3-gram Jaccard similarity for two names to share a cluster
+            num_perm: MinHash signature length
+            bands: LSH bands; num_perm must be a multiple of it
+            min_length: Names shorter than this (once compacted) are only merged on an exact match
+        """
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.min_length = min_length
+
+        self.input_values = 0
+        self._display_counts = defaultdict(Counter)  # key -> Counter of "Name (SYMBOL)" entries
+        self._spellings = defaultdict(dict)  # key -> names and symbols in first-seen order
+        self._value_keys = {}  # name or symbol -> key of the entry it was linked into
+        for token in tokens:
+            self._add(token.get("name"), token.get("symbol"))
+
+        self.clusters = self._cluster()
+
+    def _add(self, name: Optional[str], symbol: Optional[str]) -> None:
+        name, symbol = (name or "").strip(), (symbol or "").strip()
+        name = "" if name.casefold() in PLACEHOLDER_VALUES else name
+        symbol = "" if symbol.casefold() in PLACEHOLDER_VALUES else symbol
+        self.input_values += bool(name) + bool(symbol)
+        if not name and not symbol:
+            return
+
+        key = _compact(normalize(name or symbol))
+        if name and symbol and _compact(normalize(symbol)) != key:
+            display = f"{name} ({symbol})"
+        else:
+            display = name or symbol
+
+        self._display_counts[key][display] += 1
+        for value in (name, symbol):
+            if value:
+                self._spellings[key].setdefault(value, None)
+                self._value_keys.setdefault(value, key)
+
+    def _signature(self, shingles: set, coefficients: List[tuple]) -> tuple:
+        hashed = [zlib.crc32(shingle.encode()) for shingle in shingles]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashed) for a, b in coefficients)
+
+    def _cluster(self) -> List[List[str]]:
+        rng = random.Random(0)  # Fixed seed so the same window always clusters the same way
+        coefficients = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(_MERSENNE_PRIME)) for _ in range(self.num_perm)]
+        rows = self.num_perm // self.bands
+
+        clusters = {}  # first key of each cluster -> its keys
+        shingles = {}
+        buckets = defaultdict(list)  # LSH band -> cluster leaders hashed into it
+        for key in self._display_counts:
+            if len(key) < self.min_length:
+                clusters[key] = [key]
+                continue
+
+            shingles[key] = _shingles(key)
+            signature = self._signature(shingles[key], coefficients)
+            bands = [(band, signature[band * rows : (band + 1) * rows]) for band in range(self.bands)]
+
+            leader = None
+            for band in bands:
+                for candidate in buckets[band]:
+                    if _DIGITS.findall(candidate) == _DIGITS.findall(key) and _jaccard(shingles[candidate], shingles[key]) >= self.threshold:
+                        leader = candidate
+                        break
+                if leader is not None:
+                    break
+
+            if leader is None:
+                clusters[key] = [key]
+                for band in bands:
+                    buckets[band].append(key)
+            else:
+                clusters[leader].append(key)
+
+        return list(clusters.values())
+
+    def representative(self, cluster: List[str]) -> str:
+        """The most common "Name (SYMBOL)" entry in a cluster, first seen on ties"""
+        counts = Counter()
+        for key in cluster:
+            counts.update(self._display_counts[key])
+        return counts.most_common(1)[0][0]
+
+    def representatives(self) -> List[str]:
+        """One prompt entry per cluster, in first-seen order"""
+        return [self.representative(cluster) for cluster in self.clusters]
+
+    def prompt_list(self, keys: Optional[Iterable[str]] = None) -> str:
+        """
+        Comma-joined representatives for the LLM prompt
+
+        Args:
+            keys: Only include clusters containing one of these normalized keys (see `keys_for`)
+        """
+        wanted = set(keys) if keys is not None else None
+        return ",".join(self.representative(cluster) for cluster in self.clusters if wanted is None or wanted.intersection(cluster))
+
+    def keys_for(self, values: Iterable[str]) -> set:
+        """Entry keys that a collection of token names or symbols were linked into"""
+        return {self._value_keys[value] for value in values if value in self._value_keys}
+
+    def expand(self, themes: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """
+        Replace each representative in an LLM theme dictionary with the names and symbols it stands for
+
+        Entries that don't match a representative (e.g. a bare name or symbol) are kept as they are.
+        """
+        members = {}
+        for cluster in self.clusters:
+            spellings = {}
+            for key in cluster:
+                spellings.update(self._spellings[key])
+            members[self.representative(cluster)] = list(spellings)
+
+        expanded = {}
+        for theme, entries in themes.items():
+            values = {}
+            for entry in entries:
+                for value in members.get(entry, [entry]):
+                    values.setdefault(value, None)
+            expanded[theme] = list(values)
+        return expanded
+
+    def summary(self) -> str:
+        """Describe how much the window shrank"""
+        return f"Clustered {self.input_values} names and symbols into {len(self.clusters)} entries"